@@ -34,6 +34,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tax_app.perf.PerformanceMiddleware',
+    'tax_app.slow_queries.SlowQueryMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -71,6 +73,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Concurrent writers wait this many seconds for SQLite's write lock
+        'OPTIONS': {'timeout': 20},
+        # A file test database, so the concurrency tests' threads share it
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -125,7 +131,7 @@ AUTH_USER_MODEL = 'tax_app.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'tax_app.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -144,6 +150,117 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Authenticated user cache (per process). Invalidation stamps are kept in the
+# default Django cache, which must be shared (e.g. Redis or Memcached) when
+# running more than one worker process; with the default per-process cache,
+# another worker can serve a changed user's old row for up to TTL seconds
+# (check tax_app.W001 warns about this outside DEBUG). TTL 0 turns it off.
+AUTH_USER_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 300,
+}
+
+# Number of control numbers each worker process reserves at a time
+CONTROL_NUMBER_BLOCK_SIZE = 100
+
+# Maximum number of payments accepted by the batch payment endpoint
+PAYMENT_BATCH_MAX_SIZE = 100
+
+# Payment providers called by the asynchronous gateway, keyed by payment
+# method. Methods without an entry get a simulated reference. For local work,
+# run `manage.py run_stub_provider` and use e.g.
+#   'Mobile Money': {'URL': 'http://127.0.0.1:8900/mobile-money', 'API_KEY': ''},
+# A provider with a CALLBACK_SECRET may post signed payment confirmations to
+# /api/payments/callbacks/<method slug>/ (e.g. mobile-money); they are
+# settled in batches by `manage.py settle_callbacks`.
+PAYMENT_PROVIDERS = {}
+
+# A callback that matches no payment yet (the gateway may still be storing
+# the provider's reference) is retried every RETRY_INTERVAL seconds and
+# marked Unmatched MATCH_GRACE seconds after it arrived
+PROVIDER_CALLBACKS = {
+    'MATCH_GRACE': 900,
+    'RETRY_INTERVAL': 15,
+}
+
+# Gateway defaults; TIMEOUT, RETRIES, BACKOFF and MAX_CONNECTIONS can also be
+# set per provider, as can IDEMPOTENCY_KEYS (False for a provider that ignores
+# the Idempotency-Key header: its calls are then only retried when the
+# connection could not be opened). Payments left Pending without a reference
+# for STALE_AFTER seconds are handed over again by
+# `manage.py requeue_stale_payments`.
+PAYMENT_GATEWAY = {
+    'MAX_CONNECTIONS': 100,
+    'TIMEOUT': 10,
+    'RETRIES': 2,
+    'BACKOFF': 0.5,
+    'STALE_AFTER': 300,
+}
+
+# Background job queue (see tax_app/jobs.py and `manage.py run_workers`).
+# BACKOFF doubles from this many seconds per failed attempt, up to
+# MAX_BACKOFF; Running jobs older than VISIBILITY_TIMEOUT seconds are
+# assumed abandoned and requeued, which each worker process checks every
+# REQUEUE_INTERVAL seconds.
+JOB_QUEUE = {
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 5,
+    'MAX_BACKOFF': 3600,
+    'VISIBILITY_TIMEOUT': 600,
+    'REQUEUE_INTERVAL': 60,
+}
+
+# Settle mark_paid calls on the job queue and answer 202 straight away
+DEFER_PAYMENT_SETTLEMENT = False
+
+# Email a receipt (through the job queue) when a payment completes
+PAYMENT_RECEIPTS = False
+
+# Per-endpoint performance histograms (see tax_app/perf.py), served at
+# /api/admin/perf/ and, to scrapers sending METRICS_TOKEN as a bearer token,
+# at /metrics. SAMPLE_RATE is the share of requests measured (0-1).
+PERF_METRICS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,
+    'METRICS_TOKEN': os.environ.get('METRICS_TOKEN', ''),
+}
+
+# Slow-query log (see tax_app/slow_queries.py): statements slower than
+# THRESHOLD_MS are logged to 'tax_app.slow_queries' and aggregated by SQL
+# fingerprint at /api/admin/slow-queries/. With EXPLAIN, the plan of each of
+# the EXPLAIN_TOP slowest fingerprints is captured once.
+SLOW_QUERY_LOG = {
+    'ENABLED': True,
+    'THRESHOLD_MS': 200,
+    'EXPLAIN': False,
+    'EXPLAIN_TOP': 10,
+    'MAX_FINGERPRINTS': 500,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'tax_app.slow_queries': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+# Idempotency-Key support on payment creation and registration (see
+# tax_app/idempotency.py). Responses are replayed for TTL seconds; a retry
+# that arrives while the original is running waits up to WAIT seconds, and
+# a claim older than PROCESSING_TIMEOUT seconds is assumed abandoned.
+IDEMPOTENCY = {
+    'TTL': 86400,
+    'WAIT': 10,
+    'PROCESSING_TIMEOUT': 60,
+}
+
+# Maximum number of sub-requests accepted by the batch endpoint
+BATCH_MAX_REQUESTS = 20
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:5173',
@@ -4,7 +4,10 @@ URL configuration for Municipal Tax System project.
 from django.contrib import admin
 from django.urls import path, include
 
+from tax_app.views import PrometheusMetricsView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('tax_app.urls')),
+    path('metrics', PrometheusMetricsView.as_view(), name='metrics'),
 ]
@@ -1,9 +1,17 @@
 """
 Admin configuration for tax_app
 """
-from django.contrib import admin
+from decimal import Decimal
+
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, TaxpayerProfile, TaxType, TaxAccount, PaymentRequest
+from django.db import transaction
+from django.db.models import Q, Sum
+from .ledger import record_adjustment, reverse_payment
+from .models import (
+    User, TaxpayerProfile, TaxType, TaxRateBand, TaxAccount, PaymentRequest, LedgerEntry, BalanceSnapshot,
+    Job, ProviderCallback, MetricsSummary
+)
 
 
 @admin.register(User)
@@ -26,6 +34,30 @@ class UserAdmin(BaseUserAdmin):
             'fields': ('email', 'password1', 'password2'),
         }),
     )
+    
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        # The user's profile, account and payments go with it; take them off the metrics summary
+        account = TaxAccount.objects.filter(user=obj).first()
+        before = account.metrics_snapshot() if account else None
+        profile = TaxpayerProfile.objects.filter(user=obj).first()
+        revenue = PaymentRequest.objects.filter(
+            Q(user=obj) | Q(tax_account__user=obj), status='Completed'
+        ).aggregate(total=Sum('amount'))['total'] or 0
+        super().delete_model(request, obj)
+        MetricsSummary.record_account_change(before, None)
+        MetricsSummary.apply(
+            total_registered_taxpayers=-1 if obj.role == 'Taxpayer' else 0,
+            total_properties_businesses=(
+                -1 if profile and profile.taxpayer_type in MetricsSummary.PROPERTY_TAXPAYER_TYPES else 0
+            ),
+            total_revenue_collected=-revenue,
+        )
+    
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            self.delete_model(request, user)
 
 
 @admin.register(TaxpayerProfile)
@@ -34,13 +66,20 @@ class TaxpayerProfileAdmin(admin.ModelAdmin):
     list_filter = ['taxpayer_type', 'gender']
     search_fields = ['first_name', 'last_name', 'national_id_number', 'user__email']
     raw_id_fields = ['user']
+    list_select_related = ['user']
+
+
+class TaxRateBandInline(admin.TabularInline):
+    model = TaxRateBand
+    extra = 1
 
 
 @admin.register(TaxType)
 class TaxTypeAdmin(admin.ModelAdmin):
-    list_display = ['name', 'is_active']
+    list_display = ['name', 'is_active', 'minimum_annual_due']
     list_filter = ['is_active']
     search_fields = ['name']
+    inlines = [TaxRateBandInline]
 
 
 @admin.register(TaxAccount)
@@ -49,6 +88,39 @@ class TaxAccountAdmin(admin.ModelAdmin):
     list_filter = ['status', 'tax_type']
     search_fields = ['user__email']
     raw_id_fields = ['user']
+    list_select_related = ['user', 'tax_type']
+    # Derived from the dues and payments when the account is saved
+    readonly_fields = ['outstanding_balance', 'status']
+    
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        # Like API edits, changes to the totals go through the ledger and the metrics summary
+        before = None
+        due = paid = Decimal('0')
+        if change:
+            current = TaxAccount.objects.select_for_update().get(pk=obj.pk)
+            before = current.metrics_snapshot()
+            due, paid = current.total_tax_due, current.paid_amount
+        obj.derive_balance()
+        super().save_model(request, obj, form, change)
+        if change:
+            record_adjustment(obj.pk, obj.total_tax_due - due, obj.paid_amount - paid)
+        else:
+            record_adjustment(obj.pk, obj.total_tax_due, obj.paid_amount, 'Opening balance')
+        MetricsSummary.record_account_change(before, obj.metrics_snapshot())
+    
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        before = obj.metrics_snapshot()
+        revenue = obj.payments.filter(status='Completed').aggregate(total=Sum('amount'))['total'] or 0
+        super().delete_model(request, obj)
+        MetricsSummary.record_account_change(before, None)
+        MetricsSummary.apply(total_revenue_collected=-revenue)
+    
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for account in queryset:
+            self.delete_model(request, account)
 
 
 @admin.register(PaymentRequest)
@@ -57,4 +129,82 @@ class PaymentRequestAdmin(admin.ModelAdmin):
     list_filter = ['status', 'payment_method']
     search_fields = ['user__email', 'control_number', 'provider_reference']
     raw_id_fields = ['user', 'tax_account']
-    readonly_fields = ['control_number', 'provider_reference', 'created_at', 'updated_at']
+    list_select_related = ['user']
+    # Status changes go through the actions, which settle or reverse the payment
+    readonly_fields = ['status', 'control_number', 'provider_reference', 'created_at', 'updated_at', 'completed_at']
+    actions = ['mark_paid', 'reverse']
+    
+    def get_readonly_fields(self, request, obj=None):
+        readonly = list(super().get_readonly_fields(request, obj))
+        if obj is not None and obj.status == 'Completed':
+            # Already applied to the account and the ledger
+            readonly += ['user', 'tax_account', 'amount']
+        return readonly
+    
+    def has_delete_permission(self, request, obj=None):
+        # A completed payment is reversed instead, so its ledger entry stays
+        if obj is not None and obj.status == 'Completed':
+            return False
+        return super().has_delete_permission(request, obj)
+    
+    def delete_queryset(self, request, queryset):
+        kept = queryset.filter(status='Completed').count()
+        if kept:
+            self.message_user(
+                request, f'{kept} completed payment(s) were not deleted; reverse them instead', messages.WARNING
+            )
+        super().delete_queryset(request, queryset.exclude(status='Completed'))
+    
+    @admin.action(description='Mark selected payments as paid')
+    def mark_paid(self, request, queryset):
+        settled = sum(payment.mark_as_paid() for payment in queryset.filter(status__in=PaymentRequest.SETTLEABLE_STATUSES))
+        self.message_user(request, f'{settled} payment(s) marked as paid')
+    
+    @admin.action(description='Reverse selected completed payments')
+    def reverse(self, request, queryset):
+        reversed_ = sum(reverse_payment(payment, 'Reversed in admin') for payment in queryset.filter(status='Completed'))
+        self.message_user(request, f'{reversed_} payment(s) reversed')
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tax_account', 'entry_type', 'amount', 'payment', 'created_at']
+    list_filter = ['entry_type']
+    search_fields = ['tax_account__user__email', 'description']
+    raw_id_fields = ['tax_account', 'payment']
+    
+    # The ledger is append-only
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(BalanceSnapshot)
+class BalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['tax_account', 'last_entry_id', 'total_tax_due', 'paid_amount', 'created_at']
+    raw_id_fields = ['tax_account']
+    readonly_fields = ['tax_account', 'last_entry_id', 'total_tax_due', 'paid_amount', 'created_at']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'job_type', 'status', 'attempts', 'run_after', 'locked_by', 'finished_at']
+    list_filter = ['status', 'job_type']
+    readonly_fields = ['attempts', 'locked_by', 'locked_at', 'last_error', 'created_at', 'finished_at']
+
+
+@admin.register(ProviderCallback)
+class ProviderCallbackAdmin(admin.ModelAdmin):
+    list_display = ['id', 'provider', 'provider_reference', 'outcome', 'amount', 'state', 'received_at', 'processed_at']
+    list_filter = ['state', 'provider', 'outcome']
+    search_fields = ['provider_reference']
+    raw_id_fields = ['payment']
+    readonly_fields = ['payload', 'received_at', 'processed_at']
+
+
+@admin.register(MetricsSummary)
+class MetricsSummaryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'total_registered_taxpayers', 'total_revenue_collected', 'outstanding_tax_amount', 'overdue_accounts', 'unpaid_accounts', 'updated_at']
+    readonly_fields = MetricsSummary.TOTAL_FIELDS + ['updated_at']
@@ -5,3 +5,17 @@ class TaxAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tax_app'
     verbose_name = 'Municipal Tax Application'
+
+    def ready(self):
+        from django.core import checks
+        from django.db.backends.signals import connection_created
+
+        from .authentication import check_shared_cache
+        from .perf import install_serializer_timing, perf_setting
+        from .slow_queries import install as install_slow_query_log, slow_query_setting
+
+        checks.register(check_shared_cache)
+        if perf_setting('ENABLED'):
+            install_serializer_timing()
+        if slow_query_setting('ENABLED'):
+            connection_created.connect(install_slow_query_log, dispatch_uid='tax_app.slow_queries')
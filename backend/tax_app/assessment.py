@@ -0,0 +1,185 @@
+"""
+Annual tax assessment from per-TaxType rate schedules
+
+Each TaxType carries rate bands keyed by ward and taxpayer type, a minimum
+annual due and exemptions (see TaxRateBand). An account's due depends only on
+its tax type and its profile's ward and taxpayer type, so accounts are loaded
+as columns in primary-key chunks, the due is resolved once per distinct key,
+and the changed accounts are written back with one UPDATE per distinct
+(due, status) pair in the chunk. Each change is appended to the account
+ledger as an Assessment entry.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Value
+from django.utils import timezone
+
+from .ledger import record_assessments
+from .models import TaxAccount, TaxRateBand, TaxType, MetricsSummary
+
+
+# Changed accounts kept in the report; counts and totals are always exact
+MAX_REPORTED_CHANGES = 100
+
+
+class RateSchedule:
+    """Rate bands of every tax type, indexed for lookup by account key"""
+
+    def __init__(self, tax_type_ids=None):
+        # Tax types without bands have no schedule and are not assessed
+        tax_types = TaxType.objects.filter(rate_bands__isnull=False).distinct()
+        if tax_type_ids:
+            tax_types = tax_types.filter(pk__in=tax_type_ids)
+        self.minimums = dict(tax_types.values_list('pk', 'minimum_annual_due'))
+
+        self.bands = {}
+        bands = TaxRateBand.objects.filter(tax_type_id__in=self.minimums)
+        for tax_type_id, ward, taxpayer_type, amount, exempt in bands.values_list(
+            'tax_type_id', 'ward', 'taxpayer_type', 'annual_amount', 'exempt'
+        ):
+            self.bands[(tax_type_id, ward, taxpayer_type)] = (amount, exempt)
+        self._dues = {}
+
+    @property
+    def tax_type_ids(self):
+        return list(self.minimums)
+
+    def due_for(self, tax_type_id, ward, taxpayer_type):
+        """
+        Annual due for an account key, or None when no band applies.
+
+        The most specific band wins: ward and type, then ward, then type, then
+        the tax type's catch-all band. Exempt accounts owe nothing; everyone
+        else owes at least the tax type's minimum.
+        """
+        key = (tax_type_id, ward, taxpayer_type)
+        if key not in self._dues:
+            self._dues[key] = self._resolve(tax_type_id, ward or '', taxpayer_type or '')
+        return self._dues[key]
+
+    def _resolve(self, tax_type_id, ward, taxpayer_type):
+        for band_key in ((ward, taxpayer_type), (ward, ''), ('', taxpayer_type), ('', '')):
+            band = self.bands.get((tax_type_id, *band_key))
+            if band is not None:
+                amount, exempt = band
+                if exempt:
+                    return Decimal('0.00')
+                return max(amount, self.minimums[tax_type_id])
+        return None
+
+
+class AssessmentReport:
+    """Counts, totals and sample changes produced by an assessment run"""
+
+    def __init__(self):
+        self.accounts = 0
+        self.changed = 0
+        self.unrated = 0
+        self.assessed_before = Decimal('0')
+        self.assessed_after = Decimal('0')
+        self.changes = []
+
+    def add_change(self, account_id, before, after):
+        self.changed += 1
+        if len(self.changes) < MAX_REPORTED_CHANGES:
+            self.changes.append({'account_id': account_id, 'before': str(before), 'after': str(after)})
+
+    def as_dict(self):
+        return {
+            'accounts': self.accounts,
+            'changed': self.changed,
+            'unrated': self.unrated,
+            'assessed_before': str(self.assessed_before),
+            'assessed_after': str(self.assessed_after),
+            'changes': self.changes,
+        }
+
+
+class Assessor:
+    """Reassess tax accounts chunk by chunk against a rate schedule"""
+
+    COLUMNS = [
+        'pk', 'tax_type_id', 'user__profile__ward', 'user__profile__taxpayer_type',
+        'total_tax_due', 'paid_amount', 'outstanding_balance', 'next_payment_due_date', 'status',
+    ]
+
+    def __init__(self, schedule, chunk_size=5000, dry_run=False, today=None):
+        self.schedule = schedule
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.today = today or timezone.localdate()
+        self.report = AssessmentReport()
+
+    def chunks(self):
+        """(start, end) primary-key ranges covering the accounts being assessed"""
+        accounts = TaxAccount.objects.filter(tax_type_id__in=self.schedule.tax_type_ids)
+        bounds = accounts.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            return []
+        return [
+            (start, min(start + self.chunk_size, bounds['last'] + 1))
+            for start in range(bounds['first'], bounds['last'] + 1, self.chunk_size)
+        ]
+
+    def run(self):
+        for start, end in self.chunks():
+            self.assess_chunk(start, end)
+        return self.report
+
+    def assess_chunk(self, start, end):
+        """Assess accounts with start <= id < end; returns the number changed"""
+        with transaction.atomic():
+            accounts = TaxAccount.objects.filter(
+                pk__gte=start, pk__lt=end, tax_type_id__in=self.schedule.tax_type_ids
+            )
+            if not self.dry_run:
+                # Lock the chunk so paid amounts cannot move under the new dues
+                accounts = accounts.select_for_update(of=('self',))
+            rows = list(accounts.order_by('pk').values_list(*self.COLUMNS))
+
+            groups = {}
+            changes = {}
+            deltas = {}
+            for pk, tax_type_id, ward, taxpayer_type, due, paid, outstanding, due_date, status in rows:
+                self.report.accounts += 1
+                self.report.assessed_before += due
+                new_due = self.schedule.due_for(tax_type_id, ward, taxpayer_type)
+                if new_due is None:
+                    self.report.unrated += 1
+                    new_due = due
+                self.report.assessed_after += new_due
+                if new_due == due:
+                    continue
+
+                new_outstanding = new_due - paid
+                new_status = status
+                if status != 'Suspended':
+                    new_status = TaxAccount.status_for(new_outstanding, due_date, self.today)
+                groups.setdefault((new_due, new_status), []).append(pk)
+                changes[pk] = (due, new_due)
+                account_deltas = MetricsSummary.account_deltas(
+                    TaxAccount.metrics_contribution(due, outstanding, status == 'Overdue'),
+                    TaxAccount.metrics_contribution(new_due, new_outstanding, new_status == 'Overdue'),
+                )
+                for field, value in account_deltas.items():
+                    deltas[field] = deltas.get(field, 0) + value
+                self.report.add_change(pk, due, new_due)
+
+            if self.dry_run or not changes:
+                return len(changes)
+
+            now = timezone.now()
+            for (new_due, new_status), ids in groups.items():
+                TaxAccount.objects.filter(pk__in=ids).update(
+                    total_tax_due=new_due,
+                    outstanding_balance=Value(new_due) - F('paid_amount'),
+                    status=new_status,
+                    updated_at=now,
+                )
+            record_assessments(
+                {pk: new_due - due for pk, (due, new_due) in changes.items()},
+                description=f'Annual assessment {self.today.year}', now=now,
+            )
+            MetricsSummary.apply(**deltas)
+        return len(changes)
@@ -0,0 +1,154 @@
+"""
+Custom authentication for Municipal Tax System
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+
+AUTH_USER_CACHE = getattr(settings, 'AUTH_USER_CACHE', {})
+
+VERSION_KEY = 'auth-user-version:{}'
+
+
+def user_auth_version(user_id):
+    """
+    Current version stamp for a user's authentication state.
+
+    Stamps live in the Django cache so every worker sees a bump; configure a
+    shared cache backend when running more than one process. A missing stamp
+    is replaced with a fresh one, so an evicted key can never resurrect a
+    stale cached user.
+    """
+    key = VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_user_auth_version(user_id):
+    """Invalidate every cached copy of a user"""
+    cache.set(VERSION_KEY.format(user_id), uuid.uuid4().hex, timeout=None)
+
+
+# Backends whose entries are private to one process
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def check_shared_cache(app_configs=None, **kwargs):
+    """System check: outside DEBUG the version stamps need a cache every worker shares"""
+    from django.core.checks import Warning
+
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if settings.DEBUG or AUTH_USER_CACHE.get('TTL', 300) <= 0 or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        f'The authenticated user cache keeps its invalidation stamps in {backend}, '
+        'which other worker processes cannot see.',
+        hint='Configure a shared default cache (Redis or Memcached), run a single worker '
+             'process, or set AUTH_USER_CACHE["TTL"] to 0 to turn the user cache off.',
+        id='tax_app.W001',
+    )]
+
+
+class UserCache:
+    """Bounded, thread-safe LRU of user field values with a time-to-live"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, values = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return values
+
+    def set(self, key, values):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(
+    max_size=AUTH_USER_CACHE.get('MAX_SIZE', 10000),
+    ttl=AUTH_USER_CACHE.get('TTL', 300),
+)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that resolves users from a local cache.
+
+    Entries are keyed by user id and the user's auth version stamp, which is
+    bumped whenever the user is saved or deleted (QuerySet.update() does not
+    bump it, so use save() to change users). The
+    cache stores field values rather than model instances, so each request
+    gets its own User object with no related objects cached from another one.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        if user_cache.ttl <= 0:
+            return super().get_user(validated_token)
+
+        # Read the version before the user so a concurrent change can only
+        # leave behind an entry under a version that is already outdated
+        key = (str(user_id), user_auth_version(user_id))
+        values = user_cache.get(key)
+        if values is None:
+            user = super().get_user(validated_token)
+            user_cache.set(key, self.dump_user(user))
+            return user
+
+        user = self.load_user(values)
+        self.check_user(validated_token, user)
+        return user
+
+    def dump_user(self, user):
+        return tuple(getattr(user, field.attname) for field in user._meta.concrete_fields)
+
+    def load_user(self, values):
+        field_names = [field.attname for field in self.user_model._meta.concrete_fields]
+        return self.user_model.from_db('default', field_names, values)
+
+    def check_user(self, validated_token, user):
+        """The checks simplejwt applies to users it loads from the database"""
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+            from rest_framework_simplejwt.utils import get_md5_hash_password
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
@@ -0,0 +1,76 @@
+"""
+Batched GET sub-requests for Municipal Tax System API
+
+A batch request is authenticated once; each sub-request is then dispatched
+straight to its view with the already loaded user, skipping middleware, JWT
+decoding and the user lookup.
+"""
+from urllib.parse import urlsplit
+
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+
+
+API_PREFIX = '/api/'
+
+# Request headers not passed on to sub-requests
+_DROPPED_META = {'CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE'}
+
+
+def parse_item(item):
+    """(path, ETag) of a batch item, given as a path or {"path", "etag"}"""
+    if isinstance(item, str):
+        return item, None
+    if isinstance(item, dict) and isinstance(item.get('path'), str):
+        etag = item.get('etag')
+        return item['path'], etag if isinstance(etag, str) else None
+    return None, None
+
+
+def build_subrequest(request, path, etag=None):
+    """GET request for `path` carrying the batch request's user and headers"""
+    split = urlsplit(path)
+    if not split.path.startswith('/'):
+        split = urlsplit(API_PREFIX + path)
+
+    subrequest = HttpRequest()
+    subrequest.method = 'GET'
+    subrequest.path = subrequest.path_info = split.path
+    subrequest.META = {key: value for key, value in request.META.items() if key not in _DROPPED_META}
+    subrequest.META.update(REQUEST_METHOD='GET', PATH_INFO=split.path, QUERY_STRING=split.query)
+    if etag:
+        subrequest.META['HTTP_IF_NONE_MATCH'] = etag
+    subrequest.GET = QueryDict(split.query)
+
+    # DRF authenticates requests carrying these with ForcedAuthentication
+    subrequest._force_auth_user = request.user
+    subrequest._force_auth_token = request.auth
+    return subrequest
+
+
+def run_subrequest(request, path, etag=None, excluded_views=()):
+    """Dispatch one sub-request and return its status, body and ETag"""
+    subrequest = build_subrequest(request, path, etag)
+    result = {'path': path}
+
+    try:
+        match = resolve(subrequest.path_info)
+    except Resolver404:
+        match = None
+    if match is None or not subrequest.path_info.startswith(API_PREFIX) or match.url_name in excluded_views:
+        result.update(status=404, body={'error': 'Not found'})
+        return result
+
+    response = match.func(subrequest, *match.args, **match.kwargs)
+    if response.status_code == 304:
+        body = None
+    elif hasattr(response, 'data'):
+        body = response.data
+    else:
+        result.update(status=400, body={'error': 'This endpoint cannot be batched'})
+        return result
+
+    result.update(status=response.status_code, body=body)
+    if response.has_header('ETag'):
+        result['etag'] = response['ETag']
+    return result
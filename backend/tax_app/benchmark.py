@@ -0,0 +1,293 @@
+"""
+Load-test and benchmark suite for the Municipal Tax System API
+
+Seeds a dataset of taxpayers, then drives the real URLconf through Django's
+test client from a pool of threads, one scenario at a time. Each scenario
+reports latency percentiles, throughput, queries per request and errors;
+`results_document` turns a run into JSON that can be compared across commits.
+"""
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User, TaxpayerProfile, TaxType, TaxAccount, PaymentRequest, MetricsSummary
+from .synthetic import national_id_prefix, seed_batch, synthetic_email_prefix
+
+
+PASSWORD = 'benchmark-password'
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class BenchmarkDataset:
+    """
+    Taxpayers, accounts and payments created for one benchmark run.
+
+    Taxpayers are generated by tax_app.synthetic under a seed of their own,
+    so the benchmark measures the same realistic data that seed_data loads.
+    """
+
+    def __init__(self, taxpayers, payments_per_taxpayer=5, pending_payments=0, batch_size=2000):
+        self.taxpayers = taxpayers
+        self.payments_per_taxpayer = payments_per_taxpayer
+        self.pending_payments = pending_payments
+        self.batch_size = batch_size
+        self.seed = None
+        self.user_ids = []
+        self.accounts = {}
+        self.pending = []
+        self.admin = None
+
+    @staticmethod
+    def free_seed():
+        """A seed whose synthetic national id numbers are not taken by an earlier dataset"""
+        seed = int(time.time())
+        while TaxpayerProfile.objects.filter(national_id_number__startswith=national_id_prefix(seed)).exists():
+            seed += 1
+        return seed
+
+    def create(self):
+        password = make_password(PASSWORD)
+        tax_type = TaxType.objects.first() or TaxType.objects.create(name='Benchmark Tax')
+        self.seed = self.free_seed()
+
+        with transaction.atomic():
+            self.admin = User.objects.create(
+                email=f'benchmark-{self.seed}-admin@example.com', password=password, role='Administrator'
+            )
+        for index, start in enumerate(range(0, self.taxpayers, self.batch_size)):
+            seed_batch({
+                'seed': self.seed,
+                'batch_index': index,
+                'start': start,
+                'end': min(start + self.batch_size, self.taxpayers),
+                'password_hash': password,
+                'tax_type_ids': [tax_type.pk],
+                'payments_per_account': self.payments_per_taxpayer,
+            })
+        self.finish()
+
+    @transaction.atomic
+    def finish(self):
+        """Load the dataset's ids, add the pending payments and count the dataset into the metrics summary"""
+        accounts = TaxAccount.objects.filter(user__email__startswith=synthetic_email_prefix(self.seed)).order_by('user_id')
+        owners = []
+        for user_id, account_id, outstanding in accounts.values_list('user_id', 'pk', 'outstanding_balance'):
+            self.user_ids.append(user_id)
+            self.accounts[user_id] = account_id
+            if outstanding > 0:
+                owners.append((user_id, account_id))
+
+        # Pending payments consumed by the mark_paid scenario
+        if self.pending_payments and owners:
+            self.pending = PaymentRequest.objects.bulk_create([
+                PaymentRequest(user_id=user_id, tax_account_id=account_id, amount=Decimal('10.00'),
+                               payment_method='Mobile Money')
+                for user_id, account_id in itertools.islice(itertools.cycle(owners), self.pending_payments)
+            ], batch_size=self.batch_size)
+
+        MetricsSummary.apply(**self.contribution())
+
+    def contribution(self):
+        """The dataset's share of every MetricsSummary total"""
+        totals = TaxAccount.objects.filter(user_id__in=self.user_ids).aggregate(
+            assessed=Sum('total_tax_due'),
+            outstanding=Sum('outstanding_balance'),
+            overdue=Count('pk', filter=Q(status='Overdue')),
+            unpaid=Count('pk', filter=Q(outstanding_balance__gt=0)),
+            unpaid_amount=Sum('outstanding_balance', filter=Q(outstanding_balance__gt=0)),
+        )
+        revenue = PaymentRequest.objects.filter(
+            user_id__in=self.user_ids, status='Completed'
+        ).aggregate(total=Sum('amount'))['total'] or 0
+        return {
+            # Synthetic taxpayers are all businesses or organizations
+            'total_registered_taxpayers': len(self.user_ids),
+            'total_properties_businesses': len(self.user_ids),
+            'total_tax_assessed': totals['assessed'] or 0,
+            'outstanding_tax_amount': totals['outstanding'] or 0,
+            'overdue_accounts': totals['overdue'],
+            'unpaid_accounts': totals['unpaid'],
+            'unpaid_amount': totals['unpaid_amount'] or 0,
+            'total_revenue_collected': revenue,
+        }
+
+    @transaction.atomic
+    def delete(self):
+        """Remove the dataset and take its remaining contribution off the metrics summary"""
+        contribution = self.contribution()
+
+        for start in range(0, len(self.user_ids), self.batch_size):
+            User.objects.filter(pk__in=self.user_ids[start:start + self.batch_size]).delete()
+        if self.admin is not None:
+            self.admin.delete()
+
+        MetricsSummary.apply(**{field: -value for field, value in contribution.items()})
+
+
+class BenchmarkRunner:
+    """Runs each scenario's requests on a thread pool and collects timings"""
+
+    SCENARIOS = [
+        'login', 'dashboard', 'create_payment', 'mark_paid', 'admin_metrics', 'unpaid_export', 'search',
+    ]
+
+    def __init__(self, dataset, concurrency=8, active_users=200):
+        self.dataset = dataset
+        self.concurrency = concurrency
+        users = User.objects.select_related('profile').in_bulk(dataset.user_ids[:active_users])
+        self.users = list(users.values())
+        self.tokens = {user.pk: str(RefreshToken.for_user(user).access_token) for user in self.users}
+        self.admin_token = str(RefreshToken.for_user(dataset.admin).access_token)
+        self.pending = list(dataset.pending)
+
+    def client(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def taxpayer(self, i):
+        return self.users[i % len(self.users)]
+
+    # Scenarios: each performs request number i and returns the response
+
+    def login(self, i):
+        user = self.taxpayer(i)
+        return APIClient().post('/api/auth/login/', {'email': user.email, 'password': PASSWORD}, format='json')
+
+    def dashboard(self, i):
+        return self.client(self.tokens[self.taxpayer(i).pk]).get('/api/dashboard/summary/')
+
+    def create_payment(self, i):
+        user = self.taxpayer(i)
+        return self.client(self.tokens[user.pk]).post('/api/payments/', {
+            'tax_account': self.dataset.accounts[user.pk],
+            'amount': '10.00',
+            'payment_method': 'Generate Control Number' if i % 2 else 'Mobile Money',
+        }, format='json')
+
+    def mark_paid(self, i):
+        payment = self.pending[i % len(self.pending)]
+        token = self.tokens.get(payment.user_id) or str(RefreshToken.for_user(payment.user).access_token)
+        return self.client(token).post(f'/api/payments/{payment.pk}/mark_paid/')
+
+    def admin_metrics(self, i):
+        return self.client(self.admin_token).get('/api/admin/metrics/')
+
+    def unpaid_export(self, i):
+        response = self.client(self.admin_token).get('/api/admin/exports/unpaid-accounts/')
+        # The export runs while its content is consumed
+        for _ in response.streaming_content:
+            pass
+        return response
+
+    def search(self, i):
+        profile = self.taxpayer(i * 7919).profile
+        term = f'{profile.first_name} {profile.last_name}'
+        return self.client(self.admin_token).get('/api/admin/users/', {'search': term})
+
+    def run(self, scenarios, requests):
+        return [self.run_scenario(name, requests) for name in scenarios]
+
+    def run_scenario(self, name, requests):
+        action = getattr(self, name)
+        samples = []
+        lock = threading.Lock()
+
+        def call(i):
+            try:
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    try:
+                        response = action(i)
+                        ok = response.status_code < 400
+                    except Exception:
+                        ok = False
+                    elapsed = time.perf_counter() - started
+                with lock:
+                    samples.append((elapsed, len(context.captured_queries), ok))
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            list(pool.map(call, range(requests)))
+        wall_time = time.perf_counter() - started
+
+        latencies = sorted(elapsed * 1000 for elapsed, _, _ in samples)
+        return {
+            'scenario': name,
+            'requests': len(samples),
+            'errors': sum(1 for _, _, ok in samples if not ok),
+            'requests_per_second': round(len(samples) / wall_time, 2) if wall_time else None,
+            'latency_ms': {
+                'mean': round(statistics.fmean(latencies), 2),
+                'p50': round(percentile(latencies, 50), 2),
+                'p95': round(percentile(latencies, 95), 2),
+                'p99': round(percentile(latencies, 99), 2),
+                'max': round(latencies[-1], 2),
+            },
+            'queries_per_request': round(statistics.fmean(queries for _, queries, _ in samples), 2),
+        }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def results_document(results, options):
+    """Machine-readable record of a benchmark run"""
+    return {
+        'revision': git_revision(),
+        'timestamp': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'options': options,
+        'scenarios': {result['scenario']: result for result in results},
+    }
+
+
+def compare(results, baseline_path):
+    """Rows of (scenario, metric, baseline, current, change %) against a saved run"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['scenarios']
+
+    rows = []
+    for result in results:
+        before = baseline.get(result['scenario'])
+        if not before:
+            continue
+        for metric, current, previous in [
+            ('p95 ms', result['latency_ms']['p95'], before['latency_ms']['p95']),
+            ('req/s', result['requests_per_second'], before['requests_per_second']),
+            ('queries', result['queries_per_request'], before['queries_per_request']),
+        ]:
+            change = round((current - previous) / previous * 100, 1) if previous else None
+            rows.append((result['scenario'], metric, previous, current, change))
+    return rows
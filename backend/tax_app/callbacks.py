@@ -0,0 +1,178 @@
+"""
+Provider payment callbacks (webhooks)
+
+Providers confirm payments by posting a signed JSON notification. The
+endpoint only verifies the signature and records the notification with a
+single INSERT (repeats of the same provider_reference and outcome are
+dropped by a unique constraint), then acknowledges. The settle_callbacks
+command applies pending callbacks in batches: payments are matched by
+provider reference and settled together, so each account is updated once per
+batch however many of its callbacks arrived.
+
+A provider may call back before the gateway has stored the reference it
+returned, so a callback that matches no payment is retried every
+RETRY_INTERVAL seconds and only marked Unmatched once MATCH_GRACE seconds
+have passed since it was received (settings.PROVIDER_CALLBACKS).
+
+Notification body: {"reference": "...", "status": "completed" | "failed",
+"amount": "1000.00"}, signed with HMAC-SHA256 of the raw body under the
+provider's CALLBACK_SECRET, sent as "X-Callback-Signature: sha256=<hex>".
+"""
+import hashlib
+import hmac
+import json
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import PaymentRequest, ProviderCallback
+from .settlement import settle_payments
+
+
+SIGNATURE_HEADER = 'HTTP_X_CALLBACK_SIGNATURE'
+
+DEFAULTS = {
+    'MATCH_GRACE': 900,
+    'RETRY_INTERVAL': 15,
+}
+
+OUTCOMES = {'completed': 'Completed', 'success': 'Completed', 'failed': 'Failed', 'cancelled': 'Failed'}
+
+
+class CallbackError(Exception):
+    """A callback that cannot be accepted; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def callback_setting(name):
+    return getattr(settings, 'PROVIDER_CALLBACKS', {}).get(name, DEFAULTS[name])
+
+
+def provider_for_slug(slug):
+    """Payment method whose slug (e.g. 'mobile-money') appears in the callback URL"""
+    for method in getattr(settings, 'PAYMENT_PROVIDERS', {}):
+        if slugify(method) == slug:
+            return method
+    return None
+
+
+def sign(secret, body):
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+def record_callback(slug, body, signature):
+    """Verify a raw callback body and store it; returns the provider's method name"""
+    provider = provider_for_slug(slug)
+    secret = getattr(settings, 'PAYMENT_PROVIDERS', {}).get(provider, {}).get('CALLBACK_SECRET')
+    if provider is None or not secret:
+        raise CallbackError('Unknown provider', status=404)
+    if not signature or not hmac.compare_digest(sign(secret, body), signature):
+        raise CallbackError('Invalid signature', status=403)
+
+    try:
+        payload = json.loads(body)
+        reference = str(payload['reference']).strip()
+        outcome = OUTCOMES[str(payload['status']).lower()]
+        amount = Decimal(str(payload['amount']))
+    except (ValueError, KeyError, TypeError, InvalidOperation):
+        raise CallbackError('Invalid callback body')
+    if not reference or not amount.is_finite():
+        raise CallbackError('Invalid callback body')
+
+    ProviderCallback.objects.bulk_create([
+        ProviderCallback(
+            provider=provider, provider_reference=reference[:100], outcome=outcome,
+            amount=amount, payload=payload,
+        )
+    ], ignore_conflicts=True)
+    return provider
+
+
+def settle_pending(batch_size=500):
+    """
+    Apply the oldest pending callbacks that are due; returns {state: count}
+    for the batch, where 'Waiting' counts unmatched callbacks left Pending to
+    be retried.
+
+    Payments are never settled twice. Where the database can skip locked
+    rows, concurrent settlers also take disjoint batches; elsewhere run one
+    settler at a time, or two may both record an outcome for a callback.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        pending = ProviderCallback.objects.filter(state='Pending', retry_after__lte=now).order_by('pk')
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        callbacks = list(
+            pending.values_list('pk', 'provider', 'provider_reference', 'outcome', 'amount', 'received_at')[:batch_size]
+        )
+        if not callbacks:
+            return {}
+
+        candidates = {}
+        payments = PaymentRequest.objects.filter(
+            provider_reference__in={reference for _, _, reference, _, _, _ in callbacks}
+        ).values_list('pk', 'payment_method', 'provider_reference', 'amount')
+        for pk, method, reference, amount in payments:
+            candidates.setdefault((method, reference), []).append((pk, amount))
+
+        states = {}
+        matched = {}
+        to_settle = {}
+        to_fail = set()
+        waiting = []
+        grace_start = now - timedelta(seconds=callback_setting('MATCH_GRACE'))
+        for pk, provider, reference, outcome, amount, received_at in callbacks:
+            found = candidates.get((provider, reference), [])
+            if not found and received_at > grace_start:
+                waiting.append(pk)
+                continue
+            if not found:
+                states[pk] = 'Unmatched'
+                continue
+            if len(found) > 1:
+                states[pk] = 'Ambiguous'
+                continue
+            payment_id, payment_amount = found[0]
+            matched[pk] = payment_id
+            if outcome == 'Failed':
+                to_fail.add(payment_id)
+                states[pk] = 'Failed'
+            elif payment_amount != amount:
+                states[pk] = 'Mismatch'
+            elif payment_id in to_settle:
+                states[pk] = 'Duplicate'
+            else:
+                to_settle[payment_id] = pk
+                states[pk] = 'Settled'
+
+        settled, _ = settle_payments(to_settle, now)
+        for payment_id in set(to_settle) - settled:
+            states[to_settle[payment_id]] = 'Duplicate'
+
+        # A failure report never undoes a completed payment
+        if to_fail:
+            PaymentRequest.objects.filter(pk__in=to_fail, status__in=['Pending', 'Processing']).update(
+                status='Failed', updated_at=now
+            )
+
+        ProviderCallback.objects.bulk_update([
+            ProviderCallback(pk=pk, state=state, processed_at=now, payment_id=matched.get(pk))
+            for pk, state in states.items()
+        ], ['state', 'processed_at', 'payment'], batch_size=batch_size)
+        if waiting:
+            ProviderCallback.objects.filter(pk__in=waiting).update(
+                retry_after=now + timedelta(seconds=callback_setting('RETRY_INTERVAL'))
+            )
+
+    counts = {'Waiting': len(waiting)} if waiting else {}
+    for state in states.values():
+        counts[state] = counts.get(state, 0) + 1
+    return counts
@@ -0,0 +1,65 @@
+"""
+Conditional GET support for Municipal Tax System API views
+
+Views compute validators from `updated_at` columns and ids they have already
+loaded, so a request whose If-None-Match / If-Modified-Since still matches is
+answered with 304 Not Modified before anything is serialized.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+def make_etag(*versions):
+    """Strong ETag built from the ids and timestamps a response depends on"""
+    key = ':'.join('' if version is None else str(version) for version in versions)
+    return quote_etag(hashlib.md5(key.encode('utf-8')).hexdigest())
+
+
+def validators_for(*instances):
+    """(ETag, Last-Modified) of a response built from the given model instances"""
+    versions = []
+    for instance in instances:
+        versions.extend([type(instance).__name__, instance.pk, instance.updated_at])
+    return make_etag(*versions), max(instance.updated_at for instance in instances)
+
+
+def conditional_get(request, validators, render):
+    """
+    Return 304 if the client's copy is current, otherwise `render()`.
+
+    `validators` is an (ETag, Last-Modified) pair, where Last-Modified is the
+    newest `updated_at` behind the response or None. Responses are private
+    to the requesting user and must be revalidated.
+    """
+    etag, last_modified = validators
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = render()
+
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+class ConditionalRetrieveMixin:
+    """Answer detail GETs with 304 when the object's `updated_at` is unchanged"""
+
+    def get_validators(self, instance):
+        """Override to include related objects the serializer reads"""
+        return validators_for(instance)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return conditional_get(
+            request,
+            self.get_validators(instance),
+            lambda: Response(self.get_serializer(instance).data),
+        )
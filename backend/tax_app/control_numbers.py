@@ -0,0 +1,151 @@
+"""
+Block-allocated control numbers for payment requests
+
+Each worker process reserves a block of sequence values with one short
+transaction on its own database connection, then hands out numbers from
+memory (a hi/lo scheme). Numbers are never reused, even if the caller's
+transaction rolls back, so creating a payment needs no retry loop and no
+second write.
+
+Format: "TXN" + 10-digit sequence value + Luhn check digit (14 characters).
+Legacy random control numbers are 13 characters and can never collide.
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connections
+
+from .models import ControlNumberSequence
+
+
+PREFIX = 'TXN'
+SEQUENCE_DIGITS = 10
+SEQUENCE_NAME = 'control_number'
+
+
+def luhn_check_digit(digits):
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if i % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+
+def format_control_number(value):
+    digits = str(value).zfill(SEQUENCE_DIGITS)
+    if len(digits) > SEQUENCE_DIGITS:
+        raise ValueError('Control number sequence exhausted')
+    return f'{PREFIX}{digits}{luhn_check_digit(digits)}'
+
+
+def is_valid_control_number(control_number):
+    """Check the prefix, length and check digit of a block-allocated number"""
+    body = control_number[len(PREFIX):]
+    return (
+        control_number.startswith(PREFIX)
+        and len(body) == SEQUENCE_DIGITS + 1
+        and body.isdigit()
+        and luhn_check_digit(body[:-1]) == body[-1]
+    )
+
+
+class ControlNumberAllocator:
+    """Hands out sequence values from blocks reserved in ControlNumberSequence"""
+
+    def __init__(self, name=SEQUENCE_NAME, block_size=None, using='default'):
+        self.name = name
+        self.block_size = block_size or getattr(settings, 'CONTROL_NUMBER_BLOCK_SIZE', 100)
+        self.using = using
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._pid = None
+
+    def allocate(self):
+        with self._lock:
+            # A forked child must not reuse the block inherited from its parent
+            if self._pid != os.getpid() or self._next >= self._end:
+                self._next, self._end = self.reserve_block()
+                self._pid = os.getpid()
+            value = self._next
+            self._next += 1
+        return format_control_number(value)
+
+    def drop_block(self):
+        """Forget the values held in memory, so the next allocation reserves a new block"""
+        with self._lock:
+            self._next = self._end = 0
+
+    def reserve(self, count=1):
+        """
+        Make sure at least `count` values are held in memory.
+
+        Call before opening a transaction that will allocate numbers: on
+        SQLite the reservation's own connection cannot commit while that
+        transaction holds its lock.
+        """
+        with self._lock:
+            if self._pid != os.getpid() or self._end - self._next < count:
+                self._next, self._end = self.reserve_block(max(count, self.block_size))
+                self._pid = os.getpid()
+
+    def reserve_block(self, size=None):
+        """Reserve `size` (default block_size) values and return the (start, end) range"""
+        size = size or self.block_size
+        main = connections[self.using]
+        if main.vendor == 'sqlite' and main.is_in_memory_db():
+            # A second connection would see a different in-memory database
+            return self._reserve(main, size, commit=False)
+
+        # A dedicated connection commits the reservation independently of
+        # any transaction the caller has open
+        conn = connections.create_connection(self.using)
+        try:
+            conn.set_autocommit(False)
+            block = self._reserve(conn, size, commit=True)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return block
+
+    def _reserve(self, conn, size, commit):
+        table = conn.ops.quote_name(ControlNumberSequence._meta.db_table)
+        with conn.cursor() as cursor:
+            for _ in range(2):
+                cursor.execute(
+                    f'UPDATE {table} SET next_value = next_value + %s WHERE name = %s',
+                    [size, self.name]
+                )
+                if cursor.rowcount:
+                    cursor.execute(f'SELECT next_value FROM {table} WHERE name = %s', [self.name])
+                    end = cursor.fetchone()[0]
+                    if commit:
+                        conn.commit()
+                    return end - size, end
+                try:
+                    cursor.execute(
+                        f'INSERT INTO {table} (name, next_value) VALUES (%s, %s)', [self.name, 1]
+                    )
+                except IntegrityError:
+                    # Another process created the row first
+                    if commit:
+                        conn.rollback()
+        raise RuntimeError(f'Could not reserve a block from sequence {self.name!r}')
+
+
+allocator = ControlNumberAllocator()
+
+
+def allocate_control_number():
+    return allocator.allocate()
+
+
+def reserve_control_numbers(count):
+    allocator.reserve(count)
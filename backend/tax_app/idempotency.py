@@ -0,0 +1,171 @@
+"""
+Idempotency-Key support for POST endpoints
+
+A client that may retry a POST sends a unique Idempotency-Key header. The
+first request claims the key by inserting an IdempotencyKey row, runs, and
+stores its response in the same transaction as the rows it created; any
+retry within the TTL gets that response back (with Idempotent-Replayed:
+true) after a single indexed read. A retry that arrives while the original
+is still running waits for it, and answers 409 if it takes too long.
+
+Keys are scoped to the authenticated user, or shared by anonymous callers;
+a key is only replayed for a byte-identical request to the same path, so an
+anonymous replay (registration) requires knowing the original body.
+"""
+import functools
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+
+DEFAULTS = {
+    'TTL': 86400,
+    'WAIT': 10,
+    'PROCESSING_TIMEOUT': 60,
+}
+
+POLL_INTERVAL = 0.1
+
+
+def idempotency_setting(name):
+    return getattr(settings, 'IDEMPOTENCY', {}).get(name, DEFAULTS[name])
+
+
+def fingerprint(request):
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode('utf-8'))
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def claim(owner, key, request_fingerprint):
+    """
+    Claim the key for this request, or find the earlier request that holds it.
+
+    Returns (None, None) once claimed, otherwise (stored row, None) or
+    (None, error response).
+    """
+    deadline = time.monotonic() + idempotency_setting('WAIT')
+    while True:
+        record = IdempotencyKey.objects.filter(owner=owner, key=key).first()
+        now = timezone.now()
+        abandoned = (
+            record is not None and record.status_code is None
+            and record.created_at < now - timedelta(seconds=idempotency_setting('PROCESSING_TIMEOUT'))
+        )
+        if record is None or record.expires_at <= now or abandoned:
+            if record is not None:
+                # Conditional, so only one of several retries takes the key over
+                IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).delete()
+            try:
+                with transaction.atomic():
+                    IdempotencyKey.objects.create(
+                        owner=owner, key=key, fingerprint=request_fingerprint, created_at=now,
+                        expires_at=now + timedelta(seconds=idempotency_setting('TTL')),
+                    )
+            except IntegrityError:
+                # Another request claimed the key first
+                continue
+            return None, None
+
+        if record.fingerprint != request_fingerprint:
+            return None, Response(
+                {'error': f'{HEADER} was already used for a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        if record.status_code is not None:
+            return record, None
+        if time.monotonic() >= deadline:
+            response = Response(
+                {'error': 'The original request with this key is still in progress'},
+                status=status.HTTP_409_CONFLICT
+            )
+            response['Retry-After'] = '1'
+            return None, response
+        time.sleep(POLL_INTERVAL)
+
+
+def idempotent(view_method):
+    """
+    Make a POST handler honour the Idempotency-Key header.
+
+    Responses below 500 are stored and replayed; after an error response or
+    an exception (validation errors included) the key is released, so the
+    client can retry with it. A view may define
+    before_idempotent_transaction(request) for work that must happen before
+    the transaction opens, such as reserving control numbers, and a pair of
+    idempotent_stored_data(data) / idempotent_replayed_data(data) to keep
+    secrets such as tokens out of the stored response and add fresh ones
+    when it is replayed.
+    """
+    @functools.wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view_method(view, request, *args, **kwargs)
+        if not key or len(key) > 255:
+            return Response(
+                {'error': f'{HEADER} must be between 1 and 255 characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        owner = f'user:{request.user.pk}' if request.user.is_authenticated else 'anonymous'
+        record, error = claim(owner, key, fingerprint(request))
+        if error is not None:
+            return error
+        if record is not None:
+            data = record.response
+            replayed = getattr(view, 'idempotent_replayed_data', None)
+            if replayed is not None and record.status_code < 400:
+                data = replayed(data)
+            response = Response(data, status=record.status_code)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        released = True
+        try:
+            prepare = getattr(view, 'before_idempotent_transaction', None)
+            if prepare is not None:
+                prepare(request)
+            # The stored response commits together with what the view created
+            with transaction.atomic():
+                response = view_method(view, request, *args, **kwargs)
+                if response.status_code < 500:
+                    data = response.data
+                    stored = getattr(view, 'idempotent_stored_data', None)
+                    if stored is not None and response.status_code < 400:
+                        data = stored(data)
+                    IdempotencyKey.objects.filter(owner=owner, key=key).update(
+                        status_code=response.status_code, response=data
+                    )
+                    released = False
+                else:
+                    transaction.set_rollback(True)
+        finally:
+            if released:
+                IdempotencyKey.objects.filter(owner=owner, key=key, status_code__isnull=True).delete()
+        return response
+
+    return wrapper
+
+
+def purge_expired(chunk_size=10000):
+    """Delete expired keys, one chunk per statement; returns the number deleted"""
+    deleted = 0
+    while True:
+        pks = list(
+            IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+            .values_list('pk', flat=True)[:chunk_size]
+        )
+        if not pks:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
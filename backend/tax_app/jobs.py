@@ -0,0 +1,309 @@
+"""
+Database-backed job queue for work that should not run in the request cycle
+
+Jobs are rows in the Job table, so enqueueing is one INSERT in the caller's
+transaction and no broker is needed. Workers (see the run_workers command)
+claim due jobs in batches: with SELECT ... FOR UPDATE SKIP LOCKED where the
+database supports it, so concurrent workers never wait on each other, and
+otherwise (SQLite) with a conditional UPDATE stamped with a claim token.
+Failed jobs are retried with exponential backoff until max_attempts, and jobs
+left Running by a crashed worker are requeued after a visibility timeout.
+
+Handlers are registered with @handler('job_type') and take the payload dict.
+"""
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Job, PaymentRequest
+
+
+DEFAULTS = {
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 5,
+    'MAX_BACKOFF': 3600,
+    'VISIBILITY_TIMEOUT': 600,
+    'REQUEUE_INTERVAL': 60,
+}
+
+HANDLERS = {}
+
+
+def queue_setting(name):
+    return getattr(settings, 'JOB_QUEUE', {}).get(name, DEFAULTS[name])
+
+
+def handler(job_type):
+    """Register a function as the handler of a job type"""
+    def register(func):
+        HANDLERS[job_type] = func
+        return func
+    return register
+
+
+def enqueue(job_type, payload=None, delay=0, max_attempts=None):
+    """Queue a job; it is visible to workers once the caller's transaction commits"""
+    if job_type not in HANDLERS:
+        raise ValueError(f'Unknown job type: {job_type}')
+    return Job.objects.create(
+        job_type=job_type,
+        payload=payload or {},
+        max_attempts=max_attempts or queue_setting('MAX_ATTEMPTS'),
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_many(job_type, payloads, max_attempts=None):
+    """Queue one job per payload with a single bulk INSERT"""
+    if job_type not in HANDLERS:
+        raise ValueError(f'Unknown job type: {job_type}')
+    now = timezone.now()
+    return Job.objects.bulk_create([
+        Job(
+            job_type=job_type, payload=payload, run_after=now,
+            max_attempts=max_attempts or queue_setting('MAX_ATTEMPTS'),
+        )
+        for payload in payloads
+    ], batch_size=1000)
+
+
+def claim(worker_id, limit=10, job_types=None):
+    """Mark up to `limit` due jobs Running for this worker and return them"""
+    now = timezone.now()
+    due = Job.objects.filter(status='Queued', run_after__lte=now)
+    if job_types:
+        due = due.filter(job_type__in=job_types)
+    due = due.order_by('run_after', 'pk')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            jobs = list(due.select_for_update(skip_locked=True)[:limit])
+            if jobs:
+                Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                    status='Running', locked_by=worker_id, locked_at=now
+                )
+        for job in jobs:
+            job.status, job.locked_by, job.locked_at = 'Running', worker_id, now
+        return jobs
+
+    # No row locks to skip: claim with a conditional UPDATE and read back the
+    # rows that carry this claim's token
+    token = f'{worker_id}:{uuid.uuid4().hex[:12]}'
+    candidates = list(due.values_list('pk', flat=True)[:limit])
+    if not candidates:
+        return []
+    Job.objects.filter(pk__in=candidates, status='Queued').update(
+        status='Running', locked_by=token, locked_at=now
+    )
+    return list(Job.objects.filter(pk__in=candidates, locked_by=token).order_by('run_after', 'pk'))
+
+
+def backoff_seconds(attempts):
+    return min(queue_setting('BACKOFF') * 2 ** (attempts - 1), queue_setting('MAX_BACKOFF'))
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome; returns True on success"""
+    func = HANDLERS.get(job.job_type)
+    attempts = job.attempts + 1
+    try:
+        if func is None:
+            raise LookupError(f'No handler for job type {job.job_type!r}')
+        func(job.payload)
+    except Exception:
+        now = timezone.now()
+        error = traceback.format_exc(limit=5)[-4000:]
+        if attempts < job.max_attempts and func is not None:
+            Job.objects.filter(pk=job.pk).update(
+                status='Queued', attempts=attempts, last_error=error, locked_by='', locked_at=None,
+                run_after=now + timedelta(seconds=backoff_seconds(attempts)),
+            )
+        else:
+            Job.objects.filter(pk=job.pk).update(
+                status='Failed', attempts=attempts, last_error=error, finished_at=now
+            )
+        return False
+
+    Job.objects.filter(pk=job.pk).update(status='Done', attempts=attempts, finished_at=timezone.now())
+    return True
+
+
+def requeue_stale(timeout=None):
+    """Requeue jobs whose worker stopped without finishing them"""
+    timeout = timeout if timeout is not None else queue_setting('VISIBILITY_TIMEOUT')
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Job.objects.filter(status='Running', locked_at__lt=cutoff).update(
+        status='Queued', locked_by='', locked_at=None
+    )
+
+
+def queue_stats(window=60):
+    """Per job type: jobs by status, plus jobs finished in the last `window` seconds"""
+    since = timezone.now() - timedelta(seconds=window)
+    rows = Job.objects.values('job_type').annotate(
+        queued=Count('pk', filter=Q(status='Queued')),
+        running=Count('pk', filter=Q(status='Running')),
+        failed=Count('pk', filter=Q(status='Failed')),
+        recent_done=Count('pk', filter=Q(status='Done', finished_at__gte=since)),
+        recent_failed=Count('pk', filter=Q(status='Failed', finished_at__gte=since)),
+    ).order_by('job_type')
+    return {row.pop('job_type'): row for row in rows}
+
+
+class JobMetrics:
+    """Per-job-type counts and run times collected by a worker process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.by_type = {}
+
+    def record(self, job_type, succeeded, seconds):
+        with self._lock:
+            stats = self.by_type.setdefault(job_type, {'done': 0, 'failed': 0, 'seconds': 0.0})
+            stats['done' if succeeded else 'failed'] += 1
+            stats['seconds'] += seconds
+
+    def snapshot(self):
+        """{job type: {done, failed, per_second, avg_ms}} since the worker started"""
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            return {
+                job_type: {
+                    'done': stats['done'],
+                    'failed': stats['failed'],
+                    'per_second': round((stats['done'] + stats['failed']) / elapsed, 2),
+                    'avg_ms': round(stats['seconds'] * 1000 / max(stats['done'] + stats['failed'], 1), 1),
+                }
+                for job_type, stats in self.by_type.items()
+            }
+
+
+class WorkerPool:
+    """
+    Threads in one process that claim and run jobs until stopped.
+
+    With `burst`, each thread exits once no job is due instead of polling.
+    While the threads run, jobs left Running by a dead worker are requeued
+    every REQUEUE_INTERVAL seconds.
+    """
+
+    def __init__(self, threads=4, batch_size=10, poll_interval=1.0, job_types=None, burst=False, name=None):
+        self.threads = threads
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.job_types = job_types
+        self.burst = burst
+        self.name = name or f'worker-{uuid.uuid4().hex[:8]}'
+        self.metrics = JobMetrics()
+        self.stopping = threading.Event()
+        self.next_requeue = 0
+
+    def requeue_due(self):
+        """Requeue stale jobs if REQUEUE_INTERVAL has passed since the last time"""
+        now = time.monotonic()
+        if now < self.next_requeue:
+            return 0
+        self.next_requeue = now + queue_setting('REQUEUE_INTERVAL')
+        return requeue_stale()
+
+    def run(self, report=None, report_interval=10):
+        """Run the threads until stopped (or drained, in burst mode)"""
+        self.requeue_due()
+        workers = [
+            threading.Thread(target=self.work, args=(f'{self.name}-{index}',), name=f'{self.name}-{index}')
+            for index in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        last_report = time.monotonic()
+        try:
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(timeout=0.5)
+                self.requeue_due()
+                if report and time.monotonic() - last_report >= report_interval:
+                    report(self.metrics.snapshot())
+                    last_report = time.monotonic()
+        except KeyboardInterrupt:
+            # Let every thread finish the job in hand
+            self.stop()
+            for worker in workers:
+                worker.join()
+        if report:
+            report(self.metrics.snapshot())
+
+    def stop(self):
+        self.stopping.set()
+
+    def work(self, worker_id):
+        try:
+            while not self.stopping.is_set():
+                jobs = claim(worker_id, self.batch_size, self.job_types)
+                if not jobs:
+                    if self.burst:
+                        return
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                for job in jobs:
+                    started = time.monotonic()
+                    succeeded = run_job(job)
+                    self.metrics.record(job.job_type, succeeded, time.monotonic() - started)
+        finally:
+            connection.close()
+
+
+@handler('settle_payment')
+def settle_payment(payload):
+    """Settle a payment that was marked as paid with deferred settlement on"""
+    payment = PaymentRequest.objects.filter(pk=payload['payment_id']).first()
+    if payment is not None:
+        payment.mark_as_paid()
+
+
+@handler('initiate_payment')
+def initiate_payment(payload):
+    """Start the provider call of a payment whose hand-over to the gateway was lost"""
+    from .provider_gateway import gateway
+
+    payment = PaymentRequest.objects.filter(
+        pk=payload['payment_id'], status='Pending', provider_reference=''
+    ).values('pk', 'amount', 'payment_method').first()
+    if payment is not None and gateway.handles(payment['payment_method']):
+        # The Idempotency-Key makes this safe if the first call did reach the provider
+        gateway.initiate([payment])[0].result()
+
+
+@handler('send_payment_receipt')
+def send_payment_receipt(payload):
+    """Email the taxpayer a receipt for a completed payment"""
+    from django.core.mail import send_mail
+
+    payment = PaymentRequest.objects.select_related('user').filter(
+        pk=payload['payment_id'], status='Completed'
+    ).first()
+    if payment is None:
+        return
+    reference = payment.control_number or payment.provider_reference or payment.pk
+    send_mail(
+        subject=f'Payment receipt {reference}',
+        message=(
+            f'We have received your payment of TZS {payment.amount} '
+            f'({payment.payment_method}, reference {reference}) on {payment.completed_at:%Y-%m-%d}.'
+        ),
+        from_email=None,
+        recipient_list=[payment.user.email],
+    )
+
+
+def payments_settled(payment_ids):
+    """Queue the follow-up work for newly completed payments"""
+    if payment_ids and getattr(settings, 'PAYMENT_RECEIPTS', False):
+        enqueue_many('send_payment_receipt', [{'payment_id': pk} for pk in payment_ids])
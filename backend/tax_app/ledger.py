@@ -0,0 +1,225 @@
+"""
+Append-only ledger of tax account movements
+
+Assessments, penalties, payments and reversals are recorded as LedgerEntry
+rows that are never changed. An account's balance is its latest
+BalanceSnapshot plus the entries recorded after it, and the totals on
+TaxAccount are a cache of that balance which can be verified and rebuilt.
+
+Writers lock the account row (through TaxAccount.apply_payments() and
+friends) before inserting its entries, so a snapshot taken while holding the
+same locks sees every entry that will ever be recorded below its watermark.
+
+The totals on TaxAccount are kept current in the same transaction as the
+entries rather than folded in later: the unpaid list, the overdue sweep and
+every balance shown to a taxpayer read them, and must not lag behind a
+payment that was acknowledged. Writes therefore still update the one account
+row they concern; bursts on a single account are coalesced by the batched
+settlement paths (settlement files and provider callbacks).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import TaxAccount, PaymentRequest, LedgerEntry, BalanceSnapshot, MetricsSummary
+
+
+def record_payments(payments, now=None):
+    """Append Payment entries for (payment id, account id, amount) tuples"""
+    now = now or timezone.now()
+    LedgerEntry.objects.bulk_create([
+        LedgerEntry(
+            tax_account_id=account_id, entry_type='Payment', amount=amount,
+            payment_id=payment_id, created_at=now,
+        )
+        for payment_id, account_id, amount in payments
+    ])
+
+
+def record_assessments(changes, description='', now=None):
+    """Append Assessment entries for a {account id: change in total_tax_due} mapping"""
+    now = now or timezone.now()
+    LedgerEntry.objects.bulk_create([
+        LedgerEntry(
+            tax_account_id=account_id, entry_type='Assessment', amount=amount,
+            description=description, created_at=now,
+        )
+        for account_id, amount in changes.items()
+        if amount
+    ], batch_size=5000)
+
+
+def record_adjustment(account_id, due_change, paid_change, description='Manual adjustment', now=None):
+    """Append the entries behind a direct edit of an account's totals"""
+    now = now or timezone.now()
+    entries = []
+    if due_change:
+        entries.append(LedgerEntry(
+            tax_account_id=account_id, entry_type='Assessment', amount=due_change,
+            description=description, created_at=now,
+        ))
+    if paid_change:
+        # Money taken back off an account is journalled as reverse_payment() does
+        entries.append(LedgerEntry(
+            tax_account_id=account_id, entry_type='Payment' if paid_change > 0 else 'Reversal',
+            amount=paid_change, description=description, created_at=now,
+        ))
+    LedgerEntry.objects.bulk_create(entries)
+
+
+def charge_penalty(account_id, amount, description=''):
+    """Add a penalty to an account's dues"""
+    with transaction.atomic():
+        now = timezone.now()
+        deltas = TaxAccount.apply_charges({account_id: amount}, now)
+        LedgerEntry.objects.create(
+            tax_account_id=account_id, entry_type='Penalty', amount=amount,
+            description=description, created_at=now,
+        )
+        MetricsSummary.apply(**deltas)
+
+
+def reverse_payment(payment, description=''):
+    """
+    Undo a completed payment: cancel it and take its amount off the account.
+
+    Returns False, changing nothing, if the payment is not completed.
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        reversed_ = PaymentRequest.objects.filter(pk=payment.pk, status='Completed').update(
+            status='Cancelled', updated_at=now
+        )
+        if not reversed_:
+            return False
+
+        deltas = TaxAccount.apply_payments({payment.tax_account_id: -payment.amount}, now)
+        LedgerEntry.objects.create(
+            tax_account_id=payment.tax_account_id, entry_type='Reversal', amount=-payment.amount,
+            payment_id=payment.pk, description=description, created_at=now,
+        )
+        MetricsSummary.apply(total_revenue_collected=-payment.amount, **deltas)
+
+    payment.status = 'Cancelled'
+    payment.updated_at = now
+    return True
+
+
+def balances(account_ids):
+    """
+    Ledger balances of accounts as {account id: (total_tax_due, paid_amount, last entry id)}.
+
+    Each balance is the account's latest snapshot plus the entries after it;
+    accounts without a snapshot start from zero.
+    """
+    latest = BalanceSnapshot.objects.filter(tax_account=OuterRef('pk')).order_by('-last_entry_id', '-pk')
+    snapshot_ids = list(TaxAccount.objects.filter(pk__in=account_ids).annotate(
+        snapshot_id=Subquery(latest.values('pk')[:1])
+    ).values_list('pk', 'snapshot_id'))
+
+    result = {pk: (Decimal('0'), Decimal('0'), 0) for pk, _ in snapshot_ids}
+    snapshots = BalanceSnapshot.objects.filter(
+        pk__in=[snapshot_id for _, snapshot_id in snapshot_ids if snapshot_id is not None]
+    ).values_list('tax_account_id', 'total_tax_due', 'paid_amount', 'last_entry_id')
+    for account_id, due, paid, last_entry_id in snapshots:
+        result[account_id] = (due, paid, last_entry_id)
+    if not result:
+        return result
+
+    tail = LedgerEntry.objects.filter(
+        tax_account_id__in=result, pk__gt=min(last for _, _, last in result.values())
+    ).order_by('pk').values_list('pk', 'tax_account_id', 'entry_type', 'amount')
+    for pk, account_id, entry_type, amount in tail:
+        due, paid, last_entry_id = result[account_id]
+        if pk <= last_entry_id:
+            continue
+        if entry_type in LedgerEntry.DUE_TYPES:
+            due += amount
+        else:
+            paid += amount
+        result[account_id] = (due, paid, pk)
+    return result
+
+
+def account_chunks(chunk_size):
+    """(start, end) primary-key ranges covering every tax account"""
+    bounds = TaxAccount.objects.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return []
+    return [
+        (start, min(start + chunk_size, bounds['last'] + 1))
+        for start in range(bounds['first'], bounds['last'] + 1, chunk_size)
+    ]
+
+
+def take_snapshots(start, end):
+    """
+    Snapshot the balances of accounts with start <= id < end.
+
+    Only accounts with entries since their last snapshot get a new one.
+    Returns the number of snapshots written.
+    """
+    with transaction.atomic():
+        account_ids = list(
+            TaxAccount.objects.select_for_update()
+            .filter(pk__gte=start, pk__lt=end)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        latest = dict(
+            BalanceSnapshot.objects.filter(tax_account_id__in=account_ids)
+            .values('tax_account_id')
+            .annotate(last=Max('last_entry_id'))
+            .values_list('tax_account_id', 'last')
+        )
+        now = timezone.now()
+        snapshots = [
+            BalanceSnapshot(
+                tax_account_id=account_id, last_entry_id=last_entry_id,
+                total_tax_due=due, paid_amount=paid, created_at=now,
+            )
+            for account_id, (due, paid, last_entry_id) in balances(account_ids).items()
+            if last_entry_id > latest.get(account_id, 0)
+        ]
+        BalanceSnapshot.objects.bulk_create(snapshots)
+    return len(snapshots)
+
+
+def verify_accounts(start, end, repair=False):
+    """
+    Compare the cached totals of accounts with start <= id < end to the ledger.
+
+    Returns [(account id, cached (due, paid), ledger (due, paid))] for each
+    account that differs. With `repair`, those accounts are rewritten from the
+    ledger; rebuild the MetricsSummary afterwards.
+    """
+    with transaction.atomic():
+        accounts = TaxAccount.objects.filter(pk__gte=start, pk__lt=end)
+        if repair:
+            accounts = accounts.select_for_update()
+        rows = {
+            pk: (due, paid, due_date, status)
+            for pk, due, paid, due_date, status in accounts.order_by('pk').values_list(
+                'pk', 'total_tax_due', 'paid_amount', 'next_payment_due_date', 'status'
+            )
+        }
+        drift = [
+            (account_id, rows[account_id][:2], (due, paid))
+            for account_id, (due, paid, _) in balances(list(rows)).items()
+            if rows[account_id][:2] != (due, paid)
+        ]
+
+        if repair:
+            today = timezone.localdate()
+            now = timezone.now()
+            for account_id, _, (due, paid) in drift:
+                _, _, due_date, status = rows[account_id]
+                if status != 'Suspended':
+                    status = TaxAccount.status_for(due - paid, due_date, today)
+                TaxAccount.objects.filter(pk=account_id).update(
+                    total_tax_due=due, paid_amount=paid, outstanding_balance=due - paid,
+                    status=status, updated_at=now,
+                )
+    return drift
@@ -0,0 +1,73 @@
+"""
+Management command to run the annual tax assessment
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from tax_app.assessment import Assessor, RateSchedule
+
+
+class Command(BaseCommand):
+    help = 'Set total_tax_due on every tax account from the rate bands of its tax type'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tax-type', type=int, action='append', dest='tax_types',
+            help='Only assess accounts of this tax type id (repeatable)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Number of primary keys assessed per transaction'
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Seconds to sleep between chunks, to leave room for other writers'
+        )
+        parser.add_argument('--date', help='Derive overdue status as of this date (YYYY-MM-DD) instead of today')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report the dues that would change without updating them'
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['date']:
+            today = parse_date(options['date'])
+            if today is None:
+                raise CommandError('Use the YYYY-MM-DD format for --date.')
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        schedule = RateSchedule(options['tax_types'])
+        if not schedule.bands:
+            raise CommandError('No rate bands are defined for the selected tax types.')
+
+        assessor = Assessor(schedule, chunk_size=chunk_size, dry_run=options['dry_run'], today=today)
+        chunks = assessor.chunks()
+        if not chunks:
+            self.stdout.write('No tax accounts to assess')
+            return
+
+        started = time.monotonic()
+        for index, (start, end) in enumerate(chunks, start=1):
+            changed = assessor.assess_chunk(start, end)
+            self.stdout.write(f'Ids {start}-{end - 1}: {changed} changed ({index * 100 // len(chunks)}%)')
+            if options['pause'] and index < len(chunks):
+                time.sleep(options['pause'])
+
+        summary = assessor.report.as_dict()
+        verb = 'Would change' if options['dry_run'] else 'Changed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {summary['changed']} of {summary['accounts']} account(s) in "
+            f"{time.monotonic() - started:.1f}s; total assessed TZS {summary['assessed_before']} "
+            f"-> TZS {summary['assessed_after']}"
+        ))
+        if summary['unrated']:
+            self.stdout.write(self.style.WARNING(f"unrated (no matching band, left as is): {summary['unrated']}"))
+        if options['dry_run'] and summary['changes']:
+            self.stdout.write(json.dumps(summary['changes'], indent=2))
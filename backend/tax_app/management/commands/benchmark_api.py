@@ -0,0 +1,76 @@
+"""
+Management command to load-test the tax API and record benchmark results
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tax_app.benchmark import BenchmarkDataset, BenchmarkRunner, compare, results_document
+
+
+class Command(BaseCommand):
+    help = 'Seed a benchmark dataset, drive the API with concurrent clients and report latency and throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taxpayers', type=int, default=2000, help='Number of taxpayers to seed')
+        parser.add_argument('--payments-per-taxpayer', type=int, default=5, help='Historical payments per taxpayer')
+        parser.add_argument('--requests', type=int, default=200, help='Requests sent per scenario')
+        parser.add_argument('--concurrency', type=int, default=8, help='Number of concurrent clients')
+        parser.add_argument(
+            '--scenarios', nargs='+', choices=BenchmarkRunner.SCENARIOS, default=BenchmarkRunner.SCENARIOS,
+            help='Scenarios to run, in order'
+        )
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark dataset instead of deleting it')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] in ('', ':memory:'):
+            raise CommandError('Concurrent clients need a file or server database, not in-memory SQLite.')
+
+        dataset = BenchmarkDataset(
+            options['taxpayers'],
+            payments_per_taxpayer=options['payments_per_taxpayer'],
+            pending_payments=options['requests'] if 'mark_paid' in options['scenarios'] else 0,
+        )
+        self.stdout.write(f"Seeding {options['taxpayers']} taxpayers...")
+        dataset.create()
+
+        try:
+            runner = BenchmarkRunner(dataset, concurrency=options['concurrency'])
+            results = []
+            for name in options['scenarios']:
+                self.stdout.write(f"Running {name} ({options['requests']} requests, {options['concurrency']} clients)...")
+                results.append(runner.run_scenario(name, options['requests']))
+        finally:
+            if not options['keep']:
+                dataset.delete()
+
+        self.stdout.write('')
+        self.stdout.write(f"{'scenario':<16}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'errors':>8}")
+        for result in results:
+            latency = result['latency_ms']
+            self.stdout.write(
+                f"{result['scenario']:<16}{result['requests_per_second']:>9}{latency['p50']:>10}"
+                f"{latency['p95']:>10}{latency['p99']:>10}{result['queries_per_request']:>9}{result['errors']:>8}"
+            )
+
+        if options['compare']:
+            self.stdout.write('')
+            self.stdout.write(f"Compared with {options['compare']}:")
+            for scenario, metric, previous, current, change in compare(results, options['compare']):
+                change = 'n/a' if change is None else f'{change:+}%'
+                self.stdout.write(f'{scenario:<16}{metric:<9}{previous:>10} -> {current:<10} {change}')
+
+        if options['output']:
+            settings = {key: options[key] for key in ('taxpayers', 'payments_per_taxpayer', 'requests', 'concurrency')}
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results_document(results, settings), f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        errors = sum(result['errors'] for result in results)
+        if errors:
+            self.stdout.write(self.style.WARNING(f'{errors} request(s) failed'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Benchmark finished without errors'))
@@ -0,0 +1,166 @@
+"""
+Management command to bulk import taxpayers from a CSV file
+"""
+import csv
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tax_app.models import User, TaxpayerProfile, TaxType, TaxAccount, MetricsSummary
+from tax_app.password_hashing import PasswordHasherPool
+from tax_app.search import index_users
+from tax_app.serializers import TaxpayerImportSerializer
+
+
+PROFILE_FIELDS = [
+    field for field in TaxpayerImportSerializer.Meta.fields
+    if field not in ('email', 'password')
+]
+
+
+class Command(BaseCommand):
+    help = 'Bulk import taxpayers (user, profile and tax account) from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with one taxpayer per row, using the registration field names')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows created per transaction')
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Password hashing processes (default: number of CPUs, 1 hashes inline)'
+        )
+        parser.add_argument(
+            '--unusable-passwords', action='store_true',
+            help='Ignore the password column and create users that must reset their password'
+        )
+        parser.add_argument('--tax-type', help='Name of the tax type for new accounts (default: the first one)')
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording the last committed line, used to resume (default: <path>.checkpoint)'
+        )
+        parser.add_argument('--errors', help='Write rejected rows to this JSON-lines file')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.unusable_passwords = options['unusable_passwords']
+        self.checkpoint_path = options['checkpoint'] or f"{options['path']}.checkpoint"
+        self.tax_type = self.get_tax_type(options['tax_type'])
+
+        resume_after = self.read_checkpoint()
+        if resume_after:
+            self.stdout.write(f'Resuming after line {resume_after}')
+
+        self.stdout.write('Loading existing emails and national IDs...')
+        self.emails = set(User.objects.values_list('email', flat=True).iterator(chunk_size=10000))
+        self.national_ids = set(
+            TaxpayerProfile.objects.values_list('national_id_number', flat=True).iterator(chunk_size=10000)
+        )
+
+        self.created = 0
+        self.rejected = 0
+        errors_file = open(options['errors'], 'a', encoding='utf-8') if options['errors'] else None
+
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as csv_file, \
+                    PasswordHasherPool(options['workers']) as hasher:
+                self.hasher = hasher
+                batch = []
+                last_line = resume_after
+                for line_number, row in enumerate(csv.DictReader(csv_file), start=2):
+                    if line_number <= resume_after:
+                        continue
+                    last_line = line_number
+
+                    data, errors = self.validate_row(row)
+                    if errors:
+                        self.rejected += 1
+                        if errors_file:
+                            errors_file.write(json.dumps({'line': line_number, 'errors': errors, 'row': row}) + '\n')
+                        continue
+
+                    batch.append(data)
+                    if len(batch) >= self.batch_size:
+                        self.create_batch(batch, last_line)
+                        batch = []
+
+                self.create_batch(batch, last_line)
+        except OSError as e:
+            raise CommandError(f'Cannot read taxpayer file: {e}')
+        finally:
+            if errors_file:
+                errors_file.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Import finished: {self.created} taxpayers created, {self.rejected} rows rejected'
+        ))
+
+    def get_tax_type(self, name):
+        if name:
+            try:
+                return TaxType.objects.get(name=name)
+            except TaxType.DoesNotExist:
+                raise CommandError(f'Tax type "{name}" does not exist')
+        return TaxType.objects.first()
+
+    def read_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path, encoding='utf-8') as f:
+            return json.load(f)['line']
+
+    def write_checkpoint(self, line_number):
+        # Written to a temporary file first so a crash never leaves it truncated
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'line': line_number}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def validate_row(self, row):
+        row = {key: value for key, value in row.items() if key is not None}
+        if self.unusable_passwords:
+            row['password'] = ''
+
+        serializer = TaxpayerImportSerializer(data=row)
+        if not serializer.is_valid():
+            return None, serializer.errors
+
+        data = serializer.validated_data
+        email = User.objects.normalize_email(data['email'])
+        if email in self.emails:
+            return None, {'email': ['This email is already registered.']}
+        if data['national_id_number'] in self.national_ids:
+            return None, {'national_id_number': ['This national ID number is already registered.']}
+
+        self.emails.add(email)
+        self.national_ids.add(data['national_id_number'])
+        return dict(data, email=email), None
+
+    def create_batch(self, batch, last_line):
+        if batch:
+            hashes = self.hasher.hash([data.get('password', '') for data in batch])
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(email=data['email'], password=password, role='Taxpayer')
+                    for data, password in zip(batch, hashes)
+                ])
+                profiles = TaxpayerProfile.objects.bulk_create([
+                    TaxpayerProfile(user=user, **{field: data[field] for field in PROFILE_FIELDS if field in data})
+                    for user, data in zip(users, batch)
+                ])
+                index_users([user.pk for user in users])
+                if self.tax_type:
+                    TaxAccount.objects.bulk_create([
+                        TaxAccount(user=user, tax_type=self.tax_type) for user in users
+                    ])
+                MetricsSummary.apply(
+                    total_registered_taxpayers=len(users),
+                    total_properties_businesses=sum(
+                        1 for profile in profiles
+                        if profile.taxpayer_type in MetricsSummary.PROPERTY_TAXPAYER_TYPES
+                    )
+                )
+            self.created += len(users)
+            self.stdout.write(f'Created {self.created} taxpayers (line {last_line})')
+
+        self.write_checkpoint(last_line)
@@ -0,0 +1,22 @@
+"""
+Management command to delete expired idempotency keys
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from tax_app.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses past their TTL; run daily'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Number of keys deleted per statement'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+        deleted = purge_expired(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency key(s)'))
@@ -0,0 +1,39 @@
+"""
+Management command to rebuild the taxpayer search index
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tax_app.models import User, TaxpayerSearchEntry
+from tax_app.search import index_users
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search entries of every user, e.g. after bulk changes made outside the ORM'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Users indexed per transaction')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        # Entries of users deleted with raw SQL
+        stale, _ = TaxpayerSearchEntry.objects.exclude(user__in=User.objects.all()).delete()
+
+        indexed = 0
+        last_pk = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+            )
+            if not user_ids:
+                break
+            with transaction.atomic():
+                index_users(user_ids)
+            indexed += len(user_ids)
+            last_pk = user_ids[-1]
+            self.stdout.write(f'Indexed {indexed} users')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Search index rebuilt: {indexed} users indexed, {stale} stale entries removed'
+        ))
@@ -0,0 +1,57 @@
+"""
+Management command to rebuild the admin metrics summary and report drift
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tax_app.models import MetricsSummary
+
+
+class Command(BaseCommand):
+    help = 'Recompute the admin metrics summary from scratch and report any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Number of primary keys aggregated per query'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drift without updating the summary'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        self.stdout.write(f'Recomputing metrics in chunks of {chunk_size}...')
+        totals = MetricsSummary.calculate(chunk_size=chunk_size)
+
+        with transaction.atomic():
+            # Lock every shard so no delta lands between the check and the fix
+            shards = list(MetricsSummary.objects.select_for_update().order_by('pk').values_list('pk', flat=True))
+            stored = MetricsSummary.current() if shards else None
+            if stored is None:
+                self.stdout.write(self.style.WARNING('No metrics summary stored yet'))
+                drift = {}
+            else:
+                drift = {
+                    field: (getattr(stored, field), totals[field])
+                    for field in MetricsSummary.TOTAL_FIELDS
+                    if getattr(stored, field) != totals[field]
+                }
+
+            for field, (stored_value, actual_value) in drift.items():
+                self.stdout.write(self.style.WARNING(
+                    f'{field}: stored {stored_value}, actual {actual_value} '
+                    f'(drift {actual_value - stored_value})'
+                ))
+
+            if options['dry_run']:
+                self.stdout.write(f'Dry run: {len(drift)} field(s) drifted, summary not updated')
+                return
+
+            MetricsSummary.store(totals)
+
+        if drift:
+            self.stdout.write(self.style.SUCCESS(f'Corrected {len(drift)} drifted field(s)'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Metrics summary is up to date'))
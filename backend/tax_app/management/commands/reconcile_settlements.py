@@ -0,0 +1,44 @@
+"""
+Management command to reconcile a provider settlement file
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tax_app.settlement import FORMATS, SettlementFileError, detect_format, reconcile_file
+
+
+class Command(BaseCommand):
+    help = 'Settle payments listed in a Mobile Money / Pesapal settlement file (CSV or JSON lines)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the settlement file')
+        parser.add_argument('--format', choices=FORMATS, help='File format (detected from the extension by default)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows matched and settled per batch')
+        parser.add_argument('--encoding', default='utf-8', help='Text encoding of the file')
+        parser.add_argument('--dry-run', action='store_true', help='Match and report without settling anything')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or detect_format(options['path'])
+
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                report = reconcile_file(
+                    fileobj, file_format,
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                    encoding=options['encoding'],
+                )
+        except (OSError, SettlementFileError) as e:
+            raise CommandError(f'Cannot read settlement file: {e}')
+
+        summary = report.as_dict()
+        verb = 'Would settle' if options['dry_run'] else 'Settled'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {summary['settled']} of {summary['rows']} rows (TZS {summary['settled_amount']})"
+        ))
+        for category, count in summary['counts'].items():
+            if count:
+                self.stdout.write(self.style.WARNING(f'{category}: {count}'))
+        if summary['samples']:
+            self.stdout.write(json.dumps(summary['samples'], indent=2, default=str))
@@ -0,0 +1,26 @@
+"""
+Management command to hand stale provider payments to the gateway again
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from tax_app.provider_gateway import requeue_stale_payments
+
+
+class Command(BaseCommand):
+    help = (
+        'Queue provider calls for Pending payments that never got a provider reference '
+        '(e.g. the process exited before handing them over); run from cron next to run_workers'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-after', type=int,
+            help="Seconds without a reference before a payment is retried (PAYMENT_GATEWAY['STALE_AFTER'])"
+        )
+        parser.add_argument('--limit', type=int, default=1000, help='Payments queued per run')
+
+    def handle(self, *args, **options):
+        if options['limit'] < 1:
+            raise CommandError('--limit must be at least 1.')
+        queued = requeue_stale_payments(options['stale_after'], options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Queued {queued} stale payment(s) for the provider gateway'))
@@ -0,0 +1,39 @@
+"""
+Management command to run the local stub payment provider
+"""
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tax_app.stub_provider import StubProvider
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve a stand-in Mobile Money / Pesapal API for development; point PAYMENT_PROVIDERS '
+        'at http://<host>:<port>/<anything>'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+        parser.add_argument('--port', type=int, default=8900, help='Port to listen on')
+        parser.add_argument('--latency', type=float, default=0.2, help='Seconds each call takes')
+        parser.add_argument(
+            '--failure-rate', type=float, default=0.0,
+            help='Share of calls (0-1) answered with 503'
+        )
+        parser.add_argument('--seed', type=int, help='Random seed for references and failures')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['failure_rate'] <= 1:
+            raise CommandError('--failure-rate must be between 0 and 1.')
+
+        provider = StubProvider(options['latency'], options['failure_rate'], options['seed'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Stub provider listening on http://{options['host']}:{options['port']} "
+            f"({options['latency']}s latency, {options['failure_rate']:.0%} failures)"
+        ))
+        try:
+            asyncio.run(provider.serve_forever(options['host'], options['port']))
+        except KeyboardInterrupt:
+            self.stdout.write(f'Stopped after {provider.calls} call(s)')
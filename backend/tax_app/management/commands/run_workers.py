@@ -0,0 +1,113 @@
+"""
+Management command to run background job workers
+"""
+import json
+import multiprocessing
+import os
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from tax_app.jobs import HANDLERS, WorkerPool, queue_stats
+from tax_app.password_hashing import setup_worker
+
+
+def run_pool(settings_module, pool_options, report_interval):
+    """Entry point of a worker process"""
+    setup_worker(settings_module)
+    pool = WorkerPool(**pool_options)
+    signal.signal(signal.SIGTERM, lambda *args: pool.stop())
+    pool.run(
+        report=lambda metrics: print(f'[{pool.name}] {json.dumps(metrics)}', flush=True),
+        report_interval=report_interval,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Claim and run queued jobs (payment settlement, receipts) with a pool of processes and threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes (server databases only)')
+        parser.add_argument('--threads', type=int, default=4, help='Threads per worker process')
+        parser.add_argument('--batch-size', type=int, default=10, help='Jobs claimed per query')
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds an idle thread waits before looking for jobs again'
+        )
+        parser.add_argument(
+            '--job-type', action='append', dest='job_types', choices=sorted(HANDLERS),
+            help='Only run jobs of this type (repeatable)'
+        )
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due instead of polling')
+        parser.add_argument(
+            '--report-interval', type=float, default=30,
+            help='Seconds between per-job-type throughput reports'
+        )
+        parser.add_argument('--stats', action='store_true', help='Print queue statistics and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(queue_stats(), indent=2))
+            return
+        if options['processes'] < 1 or options['threads'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--processes, --threads and --batch-size must be at least 1.')
+
+        processes = options['processes']
+        if processes > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite allows one writer at a time; running one process'))
+            processes = 1
+
+        pool_options = {
+            'threads': options['threads'],
+            'batch_size': options['batch_size'],
+            'poll_interval': options['poll_interval'],
+            'job_types': options['job_types'],
+            'burst': options['burst'],
+        }
+        self.stdout.write(
+            f"Starting {processes} process(es) x {options['threads']} thread(s)"
+            f"{' in burst mode' if options['burst'] else ''}..."
+        )
+
+        if processes == 1:
+            pool_options['name'] = f'worker-{os.getpid()}'
+            pool = WorkerPool(**pool_options)
+            signal.signal(signal.SIGTERM, lambda *args: pool.stop())
+            pool.run(
+                report=lambda metrics: self.stdout.write(f'[{pool.name}] {json.dumps(metrics)}'),
+                report_interval=options['report_interval'],
+            )
+        else:
+            # Children must not share the parent's database connections
+            connections.close_all()
+            context = multiprocessing.get_context('spawn')
+            children = [
+                context.Process(
+                    target=run_pool,
+                    args=(settings.SETTINGS_MODULE, dict(pool_options, name=f'worker-{index}'),
+                          options['report_interval']),
+                )
+                for index in range(processes)
+            ]
+            for child in children:
+                child.start()
+
+            def forward_sigterm(*args):
+                # Each child stops after the jobs in hand, as on SIGTERM to a single process
+                for child in children:
+                    if child.is_alive():
+                        child.terminate()
+
+            signal.signal(signal.SIGTERM, forward_sigterm)
+            try:
+                for child in children:
+                    child.join()
+            except KeyboardInterrupt:
+                # The children got the interrupt too and finish the jobs in hand
+                self.stdout.write('Stopping after the jobs in hand...')
+                for child in children:
+                    child.join()
+
+        self.stdout.write(self.style.SUCCESS(f'Workers stopped. Queue: {json.dumps(queue_stats())}'))
@@ -1,14 +1,39 @@
 """
 Management command to seed initial data
 """
-from django.core.management.base import BaseCommand
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
 from django.utils import timezone
 from datetime import timedelta
-from tax_app.models import User, TaxpayerProfile, TaxType, TaxAccount, PaymentRequest
+from tax_app.models import User, TaxpayerProfile, TaxType, TaxAccount, PaymentRequest, BalanceSnapshot, MetricsSummary
+from tax_app.password_hashing import setup_worker
+from tax_app.synthetic import seed_batch, synthetic_email
 
 
 class Command(BaseCommand):
-    help = 'Seed the database with initial data'
+    help = 'Seed the database with initial data, optionally plus a synthetic dataset of any size'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--taxpayers', type=int, default=0, help='Number of synthetic taxpayers to generate')
+        parser.add_argument(
+            '--payments-per-account', type=int, default=5,
+            help='Average number of payments per synthetic account (0 to twice this many)'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Taxpayers created per transaction')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Worker processes creating batches in parallel (server databases only)'
+        )
+        parser.add_argument(
+            '--password', default='Taxpayer123!',
+            help='Password of every synthetic taxpayer (hashed once)'
+        )
     
     def handle(self, *args, **options):
         self.stdout.write('Seeding database...')
@@ -79,6 +104,7 @@ class Command(BaseCommand):
                 next_payment_due_date=timezone.now().date() + timedelta(days=30),
                 status='Active'
             )
+            BalanceSnapshot.open_accounts([tax_account])
             
             self.stdout.write(self.style.SUCCESS(f'Created demo taxpayer: {taxpayer_user.email}'))
             
@@ -153,15 +179,72 @@ class Command(BaseCommand):
                 )
                 
                 tax_type = TaxType.objects.first()
-                TaxAccount.objects.create(
+                tax_account = TaxAccount.objects.create(
                     user=user,
                     tax_type=tax_type,
                     total_tax_due=data['tax_due'],
                     paid_amount=data['paid'],
                     outstanding_balance=data['tax_due'] - data['paid'],
+                    next_payment_due_date=timezone.now().date() + timedelta(days=-15 if data['paid'] == 0 else 45),
                     status='Overdue' if data['paid'] == 0 else 'Active'
                 )
+                BalanceSnapshot.open_accounts([tax_account])
                 
                 self.stdout.write(self.style.SUCCESS(f'Created demo taxpayer: {user.email}'))
         
+        if options['taxpayers'] > 0:
+            self.seed_synthetic(options)
+        
+        # Seeded rows bypass the incremental updates, so rebuild the totals
+        MetricsSummary.rebuild()
+        
         self.stdout.write(self.style.SUCCESS('Database seeding completed!'))
+    
+    def seed_synthetic(self, options):
+        seed = options['seed']
+        if User.objects.filter(email=synthetic_email(seed, 0)).exists():
+            raise CommandError(f'Synthetic taxpayers for seed {seed} already exist; choose another --seed.')
+        
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite allows one writer at a time; seeding without workers'))
+            workers = 1
+        
+        total = options['taxpayers']
+        batch_size = options['batch_size']
+        base_task = {
+            'seed': seed,
+            'password_hash': make_password(options['password']),
+            'tax_type_ids': list(TaxType.objects.order_by('pk').values_list('pk', flat=True)),
+            'payments_per_account': options['payments_per_account'],
+        }
+        tasks = [
+            dict(base_task, batch_index=index, start=start, end=min(start + batch_size, total))
+            for index, start in enumerate(range(0, total, batch_size))
+        ]
+        
+        self.stdout.write(f'Generating {total} synthetic taxpayers in {len(tasks)} batches (seed {seed})...')
+        started = time.monotonic()
+        taxpayers = payments = 0
+        if workers > 1:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=setup_worker, initargs=(settings.SETTINGS_MODULE,)
+            ) as pool:
+                results = pool.map(seed_batch, tasks)
+                for created, created_payments in results:
+                    taxpayers += created
+                    payments += created_payments
+                    self.stdout.write(f'Created {taxpayers} taxpayers, {payments} payments')
+        else:
+            for task in tasks:
+                created, created_payments = seed_batch(task)
+                taxpayers += created
+                payments += created_payments
+                self.stdout.write(f'Created {taxpayers} taxpayers, {payments} payments')
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {taxpayers} synthetic taxpayers and {payments} payments '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
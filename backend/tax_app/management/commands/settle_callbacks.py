@@ -0,0 +1,51 @@
+"""
+Management command to settle payments confirmed by provider callbacks
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tax_app.callbacks import settle_pending
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply pending provider callbacks in batches; run one instance, '
+        'from cron or with --follow'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Callbacks settled per transaction')
+        parser.add_argument(
+            '--follow', action='store_true',
+            help='Keep running and settle new callbacks as they arrive'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds to wait when no callback is pending (with --follow)'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        started = time.monotonic()
+        totals = {}
+        try:
+            while True:
+                counts = settle_pending(options['batch_size'])
+                if counts:
+                    for state, count in counts.items():
+                        totals[state] = totals.get(state, 0) + count
+                    self.stdout.write(', '.join(f'{count} {state.lower()}' for state, count in sorted(counts.items())))
+                    continue
+                if not options['follow']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        summary = ', '.join(f'{count} {state.lower()}' for state, count in sorted(totals.items())) or 'nothing'
+        self.stdout.write(self.style.SUCCESS(
+            f'Callbacks processed: {summary} in {time.monotonic() - started:.1f}s'
+        ))
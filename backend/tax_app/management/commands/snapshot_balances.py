@@ -0,0 +1,75 @@
+"""
+Management command to snapshot account balances from the payment ledger
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tax_app.ledger import account_chunks, take_snapshots, verify_accounts
+from tax_app.models import MetricsSummary
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold new ledger entries into per-account balance snapshots, or check the cached '
+        'TaxAccount totals against the ledger'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Number of primary keys processed per transaction'
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Seconds to sleep between chunks, to leave room for other writers'
+        )
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Report accounts whose cached totals differ from the ledger instead of snapshotting'
+        )
+        parser.add_argument(
+            '--repair', action='store_true',
+            help='With --verify, rewrite differing accounts from the ledger and rebuild the metrics summary'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+        if options['repair'] and not options['verify']:
+            raise CommandError('--repair needs --verify.')
+
+        chunks = account_chunks(chunk_size)
+        if not chunks:
+            self.stdout.write('No tax accounts')
+            return
+
+        started = time.monotonic()
+        total = 0
+        for index, (start, end) in enumerate(chunks, start=1):
+            if options['verify']:
+                drift = verify_accounts(start, end, repair=options['repair'])
+                for account_id, cached, ledger in drift:
+                    self.stdout.write(self.style.WARNING(
+                        f'Account {account_id}: cached due/paid {cached[0]}/{cached[1]}, '
+                        f'ledger {ledger[0]}/{ledger[1]}'
+                    ))
+                total += len(drift)
+            else:
+                written = take_snapshots(start, end)
+                self.stdout.write(f'Ids {start}-{end - 1}: {written} snapshot(s) ({index * 100 // len(chunks)}%)')
+                total += written
+            if options['pause'] and index < len(chunks):
+                time.sleep(options['pause'])
+
+        elapsed = time.monotonic() - started
+        if not options['verify']:
+            self.stdout.write(self.style.SUCCESS(f'Wrote {total} snapshot(s) in {elapsed:.1f}s'))
+        elif not total:
+            self.stdout.write(self.style.SUCCESS(f'Every account matches the ledger ({elapsed:.1f}s)'))
+        elif options['repair']:
+            MetricsSummary.rebuild(chunk_size)
+            self.stdout.write(self.style.SUCCESS(f'Rewrote {total} account(s) from the ledger'))
+        else:
+            raise CommandError(f'{total} account(s) differ from the ledger; rerun with --repair to rewrite them')
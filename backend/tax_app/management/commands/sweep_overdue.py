@@ -0,0 +1,79 @@
+"""
+Management command to move tax accounts between Active and Overdue by due date
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from tax_app.models import TaxAccount
+
+
+class Command(BaseCommand):
+    help = (
+        'Mark accounts with a balance left past next_payment_due_date as Overdue and reactivate '
+        'the rest; run nightly'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Number of primary keys updated per transaction'
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Seconds to sleep between chunks, to leave room for other writers'
+        )
+        parser.add_argument('--date', help='Sweep as of this date (YYYY-MM-DD) instead of today')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Count the accounts that would change without updating them'
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['date']:
+            today = parse_date(options['date'])
+            if today is None:
+                raise CommandError('Use the YYYY-MM-DD format for --date.')
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        if options['dry_run']:
+            overdue = TaxAccount.overdue_q(today)
+            marked = TaxAccount.objects.filter(overdue, status='Active').count()
+            reactivated = TaxAccount.objects.filter(status='Overdue').exclude(overdue).count()
+            self.stdout.write(
+                f'Dry run as of {today}: {marked} account(s) would become Overdue, '
+                f'{reactivated} would become Active'
+            )
+            return
+
+        bounds = TaxAccount.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            self.stdout.write('No tax accounts to sweep')
+            return
+
+        self.stdout.write(f'Sweeping account statuses as of {today} in chunks of {chunk_size}...')
+        started = time.monotonic()
+        now = timezone.now()
+        marked = reactivated = 0
+        for start in range(bounds['first'], bounds['last'] + 1, chunk_size):
+            end = min(start + chunk_size, bounds['last'] + 1)
+            chunk_marked, chunk_reactivated = TaxAccount.sweep_statuses(start, end, today, now)
+            marked += chunk_marked
+            reactivated += chunk_reactivated
+            self.stdout.write(
+                f'Ids {start}-{end - 1}: {chunk_marked} overdue, {chunk_reactivated} reactivated '
+                f'({(end - bounds["first"]) * 100 // (bounds["last"] + 1 - bounds["first"])}%)'
+            )
+            if options['pause'] and end <= bounds['last']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Marked {marked} account(s) Overdue and {reactivated} Active '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-16 20:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tax_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricsSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_registered_taxpayers', models.IntegerField(default=0)),
+                ('total_properties_businesses', models.IntegerField(default=0)),
+                ('total_tax_assessed', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_revenue_collected', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('outstanding_tax_amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('overdue_accounts', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'metrics summary',
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-16 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tax_app', '0002_metricssummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ControlNumberSequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('next_value', models.BigIntegerField(default=1)),
+            ],
+        ),
+    ]
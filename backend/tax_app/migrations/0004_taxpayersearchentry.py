@@ -0,0 +1,133 @@
+# Generated by Django 4.2.30 on 2026-10-16 21:07
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+FTS_TABLE = 'tax_app_taxpayersearch_fts'
+ENTRY_TABLE = 'tax_app_taxpayersearchentry'
+
+SQLITE_INDEX = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"document, content='{ENTRY_TABLE}', content_rowid='user_id', tokenize='unicode61')",
+    f"CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {ENTRY_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, document) VALUES (new.user_id, new.document); END",
+    f"CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {ENTRY_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, document) VALUES ('delete', old.user_id, old.document); END",
+    f"CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE ON {ENTRY_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, document) VALUES ('delete', old.user_id, old.document); "
+    f"INSERT INTO {FTS_TABLE}(rowid, document) VALUES (new.user_id, new.document); END",
+]
+
+SQLITE_DROP_INDEX = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+# CREATE EXTENSION needs a role allowed to install pg_trgm
+POSTGRESQL_INDEX = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX {ENTRY_TABLE}_document_trgm ON {ENTRY_TABLE} USING gin (document gin_trgm_ops)",
+]
+
+POSTGRESQL_DROP_INDEX = [
+    f"DROP INDEX IF EXISTS {ENTRY_TABLE}_document_trgm",
+]
+
+
+def sqlite_has_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite' and sqlite_has_fts5(schema_editor):
+        statements = SQLITE_INDEX
+    elif vendor == 'postgresql':
+        statements = POSTGRESQL_INDEX
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_DROP_INDEX, 'postgresql': POSTGRESQL_DROP_INDEX}.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+# Frozen copies of tax_app.search as of this migration, so later changes to
+# the search document cannot alter what this migration builds
+PROFILE_FIELDS = [
+    'first_name', 'middle_name', 'last_name', 'national_id_number',
+    'business_name', 'mobile_phone', 'ward',
+]
+
+
+def phone_variants(phone):
+    digits = re.sub(r'\D', '', phone or '')
+    variants = [digits] if digits else []
+    if len(digits) > 9:
+        variants.append('0' + digits[-9:])
+    return variants
+
+
+def build_document(email, profile=None):
+    parts = [email]
+    if profile:
+        parts.extend(profile.get(field) or '' for field in PROFILE_FIELDS)
+        parts.extend(phone_variants(profile.get('mobile_phone')))
+    return ' '.join(part for part in parts if part).lower()
+
+
+def populate_search_entries(apps, schema_editor):
+    User = apps.get_model('tax_app', 'User')
+    TaxpayerSearchEntry = apps.get_model('tax_app', 'TaxpayerSearchEntry')
+    rows = User.objects.values(
+        'pk', 'email', 'role', *[f'profile__{field}' for field in PROFILE_FIELDS]
+    ).order_by('pk').iterator(chunk_size=5000)
+
+    entries = []
+    for row in rows:
+        profile = None
+        if row['profile__national_id_number'] is not None:
+            profile = {field: row[f'profile__{field}'] for field in PROFILE_FIELDS}
+        entries.append(TaxpayerSearchEntry(
+            user_id=row['pk'], role=row['role'], document=build_document(row['email'], profile)
+        ))
+        if len(entries) >= 5000:
+            TaxpayerSearchEntry.objects.bulk_create(entries)
+            entries = []
+    TaxpayerSearchEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tax_app', '0003_controlnumbersequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaxpayerSearchEntry',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('role', models.CharField(db_index=True, max_length=20)),
+                ('document', models.TextField()),
+            ],
+            options={
+                'verbose_name_plural': 'taxpayer search entries',
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_search_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-16 21:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tax_app', '0004_taxpayersearchentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymentrequest',
+            index=models.Index(fields=['created_at', 'id'], name='payment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentrequest',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='payment_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentrequest',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='payment_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentrequest',
+            index=models.Index(fields=['provider_reference'], name='payment_provider_ref_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taxaccount',
+            index=models.Index(fields=['created_at', 'id'], name='account_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taxaccount',
+            index=models.Index(fields=['outstanding_balance', 'id'], name='account_outstanding_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taxpayerprofile',
+            index=models.Index(fields=['taxpayer_type'], name='profile_taxpayer_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['date_joined', 'id'], name='user_joined_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'date_joined', 'id'], name='user_role_joined_idx'),
+        ),
+    ]
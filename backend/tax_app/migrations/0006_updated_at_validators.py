@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-16 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tax_app', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taxpayerprofile',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='taxtype',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
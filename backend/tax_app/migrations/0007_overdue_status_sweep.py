@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-16 21:19
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def sweep_statuses(apps, schema_editor):
+    """Derive Active/Overdue from the due date and recount the overdue accounts"""
+    TaxAccount = apps.get_model('tax_app', 'TaxAccount')
+    MetricsSummary = apps.get_model('tax_app', 'MetricsSummary')
+    overdue = Q(outstanding_balance__gt=0, next_payment_due_date__lt=timezone.localdate())
+
+    TaxAccount.objects.filter(overdue, status='Active').update(status='Overdue')
+    TaxAccount.objects.filter(status='Overdue').exclude(overdue).update(status='Active')
+    MetricsSummary.objects.update(overdue_accounts=TaxAccount.objects.filter(status='Overdue').count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tax_app', '0006_updated_at_validators'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='taxaccount',
+            index=models.Index(fields=['status', 'outstanding_balance', 'id'], name='account_status_outstanding_idx'),
+        ),
+        migrations.RunPython(sweep_statuses, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-16 21:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tax_app', '0007_overdue_status_sweep'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taxtype',
+            name='minimum_annual_due',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.CreateModel(
+            name='TaxRateBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ward', models.CharField(blank=True, max_length=100)),
+                ('taxpayer_type', models.CharField(blank=True, choices=[('Business', 'Business'), ('Organization', 'Organization')], max_length=20)),
+                ('annual_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('exempt', models.BooleanField(default=False)),
+                ('tax_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rate_bands', to='tax_app.taxtype')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='taxrateband',
+            constraint=models.UniqueConstraint(fields=('tax_type', 'ward', 'taxpayer_type'), name='unique_rate_band'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def open_balances(apps, schema_editor):
+    """Record every existing account's totals as its opening snapshot"""
+    TaxAccount = apps.get_model('tax_app', 'TaxAccount')
+    BalanceSnapshot = apps.get_model('tax_app', 'BalanceSnapshot')
+    accounts = (
+        TaxAccount.objects.exclude(total_tax_due=0, paid_amount=0)
+        .values_list('pk', 'total_tax_due', 'paid_amount')
+        .iterator(chunk_size=5000)
+    )
+    batch = []
+    for pk, due, paid in accounts:
+        batch.append(BalanceSnapshot(tax_account_id=pk, total_tax_due=due, paid_amount=paid))
+        if len(batch) >= 5000:
+            BalanceSnapshot.objects.bulk_create(batch)
+            batch = []
+    BalanceSnapshot.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tax_app', '0008_tax_rate_bands'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('Assessment', 'Assessment'), ('Penalty', 'Penalty'), ('Payment', 'Payment'), ('Reversal', 'Reversal')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('description', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='tax_app.paymentrequest')),
+                ('tax_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='tax_app.taxaccount')),
+            ],
+            options={
+                'verbose_name_plural': 'ledger entries',
+                'indexes': [models.Index(fields=['tax_account', 'id'], name='ledger_account_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_entry_id', models.BigIntegerField(default=0)),
+                ('total_tax_due', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('tax_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='tax_app.taxaccount')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tax_account', 'last_entry_id'], name='snapshot_account_idx')],
+            },
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
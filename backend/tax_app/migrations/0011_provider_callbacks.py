@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tax_app', '0010_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderCallback',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(choices=[('Mobile Money', 'Mobile Money'), ('Pesapal', 'Pesapal'), ('Generate Control Number', 'Generate Control Number')], max_length=50)),
+                ('provider_reference', models.CharField(max_length=100)),
+                ('outcome', models.CharField(choices=[('Completed', 'Completed'), ('Failed', 'Failed')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('payload', models.JSONField(default=dict)),
+                ('state', models.CharField(choices=[('Pending', 'Pending'), ('Settled', 'Settled'), ('Failed', 'Failed'), ('Duplicate', 'Duplicate'), ('Unmatched', 'Unmatched'), ('Ambiguous', 'Ambiguous'), ('Mismatch', 'Mismatch')], default='Pending', max_length=20)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='callbacks', to='tax_app.paymentrequest')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['state', 'id'], name='callback_state_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='providercallback',
+            constraint=models.UniqueConstraint(fields=('provider', 'provider_reference', 'outcome'), name='unique_provider_callback'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:54
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def count_unpaid(apps, schema_editor):
+    """Total the accounts with a balance left and what they owe"""
+    TaxAccount = apps.get_model('tax_app', 'TaxAccount')
+    MetricsSummary = apps.get_model('tax_app', 'MetricsSummary')
+    totals = TaxAccount.objects.filter(outstanding_balance__gt=0).aggregate(
+        accounts=Count('pk'), amount=Sum('outstanding_balance'),
+    )
+    MetricsSummary.objects.update(unpaid_accounts=totals['accounts'], unpaid_amount=totals['amount'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tax_app', '0012_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metricssummary',
+            name='unpaid_accounts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='metricssummary',
+            name='unpaid_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=16),
+        ),
+        migrations.RunPython(count_unpaid, migrations.RunPython.noop),
+    ]
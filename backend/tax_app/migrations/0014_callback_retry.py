@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tax_app', '0013_unpaid_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='providercallback',
+            name='retry_after',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
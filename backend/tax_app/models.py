@@ -1,9 +1,16 @@
 """
 Data models for Municipal Tax System
 """
+import random
 import uuid
-from django.db import models
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import F, Q, Sum, Count, Case, When, Value
+from django.db.models.lookups import GreaterThan
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 
 
@@ -46,20 +53,82 @@ class User(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='Taxpayer')
     account_status = models.CharField(max_length=20, default='Active')
     last_login_time = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     objects = UserManager()
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
     
+    # Fields copied into the taxpayer search index
+    SEARCH_STATE_FIELDS = ['email', 'role']
+    
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Admin user list, newest first, optionally filtered by role
+            models.Index(fields=['date_joined', 'id'], name='user_joined_idx'),
+            models.Index(fields=['role', 'date_joined', 'id'], name='user_role_joined_idx'),
+        ]
+    
     def __str__(self):
         return self.email
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_state = instance.tracked_state()
+        return instance
+    
+    def tracked_state(self):
+        """Current values of the tracked fields that are not deferred"""
+        deferred = self.get_deferred_fields()
+        return {
+            field: getattr(self, field)
+            for field in self.SEARCH_STATE_FIELDS
+            if field not in deferred
+        }
+    
+    def changed_fields(self, fields):
+        """Tracked fields changed since the user was loaded (all of them for new users)"""
+        loaded = getattr(self, '_loaded_state', {})
+        deferred = self.get_deferred_fields()
+        return {
+            field for field in fields
+            if field in deferred or field not in loaded or getattr(self, field) != loaded[field]
+        }
+    
+    def save(self, *args, **kwargs):
+        # Partial saves still move updated_at, which conditional GETs rely on
+        if kwargs.get('update_fields'):
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_at'}
+        super().save(*args, **kwargs)
+        # The authentication cache holds the whole row, and every save moves
+        # updated_at at least
+        self._invalidate_cached_auth()
+        if self.changed_fields(self.SEARCH_STATE_FIELDS):
+            from .search import index_users
+            index_users([self.pk])
+        self._loaded_state = self.tracked_state()
+    
+    def _invalidate_cached_auth(self):
+        from .authentication import bump_user_auth_version
+        user_id = self.pk
+        # Bump now and again on commit, so no request can cache the
+        # pre-commit row under the new version
+        bump_user_auth_version(user_id)
+        transaction.on_commit(lambda: bump_user_auth_version(user_id))
+    
     def update_last_login(self):
         self.last_login_time = timezone.now()
         self.save(update_fields=['last_login_time'])
 
 
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    # Also runs for queryset and admin bulk deletes, which skip User.delete()
+    instance._invalidate_cached_auth()
+
+
 class TaxpayerProfile(models.Model):
     """Profile model for taxpayer details"""
     
@@ -98,10 +167,21 @@ class TaxpayerProfile(models.Model):
     
     # System assigned fields
     registration_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['taxpayer_type'], name='profile_taxpayer_type_idx'),
+        ]
     
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.user.email}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from .search import index_users
+        index_users([self.user_id])
+    
     @property
     def full_name(self):
         return f"{self.first_name} {self.middle_name} {self.last_name}".strip()
@@ -113,11 +193,37 @@ class TaxType(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
+    # Least an assessed, non-exempt account owes for a year
+    minimum_annual_due = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.name
 
 
+class TaxRateBand(models.Model):
+    """
+    Annual amount due under a tax type for one ward and taxpayer type.
+    
+    A blank ward or taxpayer type matches any; the assessment uses the most
+    specific band that matches an account.
+    """
+    
+    tax_type = models.ForeignKey(TaxType, on_delete=models.CASCADE, related_name='rate_bands')
+    ward = models.CharField(max_length=100, blank=True)
+    taxpayer_type = models.CharField(max_length=20, choices=TaxpayerProfile.TAXPAYER_TYPE_CHOICES, blank=True)
+    annual_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    exempt = models.BooleanField(default=False)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tax_type', 'ward', 'taxpayer_type'], name='unique_rate_band'),
+        ]
+    
+    def __str__(self):
+        return f"{self.tax_type.name} - {self.ward or 'Any ward'} - {self.taxpayer_type or 'Any type'}"
+
+
 class TaxAccount(models.Model):
     """Tax account for each taxpayer"""
     
@@ -141,15 +247,147 @@ class TaxAccount(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Admin account list, newest first
+            models.Index(fields=['created_at', 'id'], name='account_created_idx'),
+            # Unpaid list and exports, largest balance first
+            models.Index(fields=['outstanding_balance', 'id'], name='account_outstanding_idx'),
+            # Overdue accounts, largest balance first; kept current by sweep_overdue
+            models.Index(fields=['status', 'outstanding_balance', 'id'], name='account_status_outstanding_idx'),
+        ]
+    
     def __str__(self):
         return f"Tax Account - {self.user.email} - {self.tax_type.name}"
     
+    @property
+    def is_overdue(self):
+        return self.status == 'Overdue'
+    
+    @staticmethod
+    def status_for(outstanding_balance, next_payment_due_date, today=None):
+        """Active/Overdue status of an account: overdue once a balance is left past its due date"""
+        today = today or timezone.localdate()
+        if outstanding_balance > 0 and next_payment_due_date is not None and next_payment_due_date < today:
+            return 'Overdue'
+        return 'Active'
+    
+    @staticmethod
+    def overdue_q(today=None):
+        """Filter matching the accounts status_for() considers overdue"""
+        today = today or timezone.localdate()
+        return Q(outstanding_balance__gt=0, next_payment_due_date__lt=today)
+    
+    @classmethod
+    def sweep_statuses(cls, start, end, today=None, now=None):
+        """
+        Bring the Active/Overdue status of accounts with start <= id < end up to date.
+        
+        Runs two set-based UPDATEs in one short transaction, so only the rows of
+        this id range are locked, and applies the change in overdue accounts to
+        the MetricsSummary. Suspended accounts are left alone. Returns
+        (accounts marked overdue, accounts reactivated).
+        """
+        today = today or timezone.localdate()
+        now = now or timezone.now()
+        overdue = cls.overdue_q(today)
+        accounts = cls.objects.filter(pk__gte=start, pk__lt=end)
+        
+        with transaction.atomic():
+            marked = accounts.filter(overdue, status='Active').update(status='Overdue', updated_at=now)
+            reactivated = accounts.filter(status='Overdue').exclude(overdue).update(status='Active', updated_at=now)
+            if marked != reactivated:
+                MetricsSummary.apply(overdue_accounts=marked - reactivated)
+        return marked, reactivated
+    
+    def metrics_snapshot(self):
+        """Contribution of this account to the admin metrics summary"""
+        return self.metrics_contribution(self.total_tax_due, self.outstanding_balance, self.is_overdue)
+    
+    @staticmethod
+    def metrics_contribution(total_tax_due, outstanding_balance, overdue):
+        return {
+            'total_tax_assessed': total_tax_due,
+            'outstanding_tax_amount': outstanding_balance,
+            'overdue_accounts': 1 if overdue else 0,
+            'unpaid_accounts': 1 if outstanding_balance > 0 else 0,
+            'unpaid_amount': max(outstanding_balance, 0),
+        }
+    
+    @classmethod
+    def apply_payments(cls, amounts, now=None):
+        """
+        Add settled amounts to accounts with DB-side arithmetic.
+        
+        `amounts` maps account ids to the total being settled on each. Must run
+        inside a transaction; the account rows stay locked until it commits.
+        Returns the resulting MetricsSummary deltas.
+        """
+        return cls._apply_amounts('paid_amount', amounts, now)
+    
+    @classmethod
+    def apply_charges(cls, amounts, now=None):
+        """Add charges such as penalties to total_tax_due, like apply_payments()"""
+        return cls._apply_amounts('total_tax_due', amounts, now)
+    
+    @classmethod
+    def _apply_amounts(cls, field, amounts, now=None):
+        if not amounts:
+            return {}
+        now = now or timezone.now()
+        
+        today = timezone.localdate()
+        # Payments reduce the balance, charges raise it
+        sign = -1 if field == 'paid_amount' else 1
+        
+        before = list(
+            cls.objects.select_for_update()
+            .filter(pk__in=amounts)
+            .order_by('pk')
+            .only('total_tax_due', 'paid_amount', 'outstanding_balance', 'next_payment_due_date', 'status')
+        )
+        
+        # All expressions see each row as it was before this UPDATE
+        applied = Case(
+            *[When(pk=pk, then=Value(amount)) for pk, amount in amounts.items()],
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+        outstanding = F('total_tax_due') - F('paid_amount')
+        outstanding = outstanding - applied if sign < 0 else outstanding + applied
+        cls.objects.filter(pk__in=amounts).update(
+            **{field: F(field) + applied},
+            outstanding_balance=outstanding,
+            status=Case(
+                When(GreaterThan(outstanding, 0), next_payment_due_date__lt=today, then=Value('Overdue')),
+                default=Value('Active'),
+            ),
+            updated_at=now,
+        )
+        
+        deltas = {}
+        for account in before:
+            amount = amounts[account.pk]
+            after = cls(
+                total_tax_due=account.total_tax_due,
+                paid_amount=account.paid_amount,
+                outstanding_balance=account.total_tax_due - account.paid_amount + sign * amount,
+            )
+            setattr(after, field, getattr(account, field) + amount)
+            after.status = cls.status_for(after.outstanding_balance, account.next_payment_due_date, today)
+            changes = MetricsSummary.account_deltas(account.metrics_snapshot(), after.metrics_snapshot())
+            for field_name, value in changes.items():
+                deltas[field_name] = deltas.get(field_name, 0) + value
+        return deltas
+    
+    def derive_balance(self):
+        """Set outstanding_balance and the Active/Overdue status from the dues and payments; Suspended is kept"""
+        self.outstanding_balance = self.total_tax_due - self.paid_amount
+        if self.status != 'Suspended':
+            self.status = self.status_for(self.outstanding_balance, self.next_payment_due_date)
+    
     def calculate_outstanding(self):
         self.outstanding_balance = self.total_tax_due - self.paid_amount
-        if self.outstanding_balance > 0:
-            self.status = 'Overdue'
-        else:
-            self.status = 'Active'
+        self.status = self.status_for(self.outstanding_balance, self.next_payment_due_date)
         self.save()
 
 
@@ -164,6 +402,11 @@ class PaymentRequest(models.Model):
         ('Cancelled', 'Cancelled'),
     ]
     
+    # Statuses a payment can be settled from. Failed is included so a provider
+    # success reported after the gateway gave up still settles; Cancelled
+    # (including reversed payments) and Completed are final.
+    SETTLEABLE_STATUSES = ['Pending', 'Processing', 'Failed']
+    
     METHOD_CHOICES = [
         ('Mobile Money', 'Mobile Money'),
         ('Pesapal', 'Pesapal'),
@@ -187,26 +430,443 @@ class PaymentRequest(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     
+    class Meta:
+        indexes = [
+            # Payment lists (all, a taxpayer's own, or by status), newest first
+            models.Index(fields=['created_at', 'id'], name='payment_created_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='payment_user_created_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='payment_status_created_idx'),
+            # Settlement files matched by provider reference
+            models.Index(fields=['provider_reference'], name='payment_provider_ref_idx'),
+        ]
+    
     def __str__(self):
         return f"Payment {self.id} - {self.user.email} - {self.amount}"
     
     def generate_control_number(self):
-        """Generate a unique control number"""
-        import random
-        import string
-        prefix = "TXN"
-        random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
-        self.control_number = f"{prefix}{random_str}"
-        self.save()
+        """
+        Assign the next control number from this process's reserved block.
+        
+        Set it before the first save so creation is a single INSERT; an
+        already saved payment only has its control number column updated.
+        """
+        from .control_numbers import allocate_control_number
+        self.control_number = allocate_control_number()
+        if self.pk is not None:
+            self.save(update_fields=['control_number', 'updated_at'])
         return self.control_number
     
     def mark_as_paid(self):
-        """Mark payment as completed and update tax account"""
+        """
+        Mark payment as completed and update tax account.
+        
+        Settlement runs in one transaction with DB-side arithmetic: the payment
+        row is claimed with a conditional UPDATE, the account balance is
+        adjusted with F() expressions while its row is locked, so concurrent
+        settlements against the same account cannot lose updates, and the
+        payment is appended to the account's ledger. Settling a
+        payment that is already completed or was cancelled (or reversed) is a
+        no-op and returns False.
+        """
+        with transaction.atomic():
+            now = timezone.now()
+            claimed = PaymentRequest.objects.filter(pk=self.pk, status__in=self.SETTLEABLE_STATUSES).update(
+                status='Completed', completed_at=now, updated_at=now
+            )
+            if not claimed:
+                self.refresh_from_db(fields=['status', 'completed_at', 'updated_at'])
+                return False
+            
+            deltas = TaxAccount.apply_payments({self.tax_account_id: self.amount}, now)
+            from .ledger import record_payments
+            from .jobs import payments_settled
+            record_payments([(self.pk, self.tax_account_id, self.amount)], now)
+            MetricsSummary.apply(total_revenue_collected=self.amount, **deltas)
+            payments_settled([self.pk])
+        
         self.status = 'Completed'
-        self.completed_at = timezone.now()
-        self.save()
+        self.completed_at = now
+        self.updated_at = now
+        # Drop any cached account so callers re-read the settled balance
+        if PaymentRequest.tax_account.is_cached(self):
+            PaymentRequest.tax_account.field.delete_cached_value(self)
+        return True
+
+
+class LedgerEntry(models.Model):
+    """
+    One movement on a tax account; the ledger is only ever appended to.
+    
+    `amount` is the signed change to the account's total_tax_due (assessments
+    and penalties) or paid_amount (payments and reversals).
+    """
+    
+    ENTRY_TYPE_CHOICES = [
+        ('Assessment', 'Assessment'),
+        ('Penalty', 'Penalty'),
+        ('Payment', 'Payment'),
+        ('Reversal', 'Reversal'),
+    ]
+    DUE_TYPES = ['Assessment', 'Penalty']
+    PAID_TYPES = ['Payment', 'Reversal']
+    
+    tax_account = models.ForeignKey(TaxAccount, on_delete=models.CASCADE, related_name='ledger_entries')
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPE_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    payment = models.ForeignKey(
+        PaymentRequest, on_delete=models.CASCADE, null=True, blank=True, related_name='ledger_entries'
+    )
+    description = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        verbose_name_plural = 'ledger entries'
+        indexes = [
+            # Ledger tail of an account after its latest snapshot
+            models.Index(fields=['tax_account', 'id'], name='ledger_account_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.entry_type} {self.amount} on account {self.tax_account_id}"
+    
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError('Ledger entries cannot be changed once recorded')
+        super().save(*args, **kwargs)
+
+
+class BalanceSnapshot(models.Model):
+    """Totals of an account's ledger entries up to and including `last_entry_id`"""
+    
+    tax_account = models.ForeignKey(TaxAccount, on_delete=models.CASCADE, related_name='balance_snapshots')
+    last_entry_id = models.BigIntegerField(default=0)
+    total_tax_due = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    paid_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            # Latest snapshot of an account
+            models.Index(fields=['tax_account', 'last_entry_id'], name='snapshot_account_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Balance of account {self.tax_account_id} at entry {self.last_entry_id}"
+    
+    @classmethod
+    def open_accounts(cls, accounts):
+        """
+        Record the totals of accounts created with a balance as their opening snapshot.
+    
+        For rows written straight to the table (seeding, fixtures) rather than
+        through the ledger.
+        """
+        cls.objects.bulk_create([
+            cls(tax_account_id=account.pk, total_tax_due=account.total_tax_due, paid_amount=account.paid_amount)
+            for account in accounts
+            if account.total_tax_due or account.paid_amount
+        ], batch_size=5000)
+
+
+class Job(models.Model):
+    """
+    Deferred unit of work, claimed and run by the run_workers command.
+    
+    `job_type` names a handler registered in tax_app.jobs and `payload` holds
+    its JSON arguments.
+    """
+    
+    STATUS_CHOICES = [
+        ('Queued', 'Queued'),
+        ('Running', 'Running'),
+        ('Done', 'Done'),
+        ('Failed', 'Failed'),
+    ]
+    
+    job_type = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            # Workers claim the oldest due jobs
+            models.Index(fields=['status', 'run_after', 'id'], name='job_claim_idx'),
+            # Throughput per job type
+            models.Index(fields=['job_type', 'status', 'finished_at'], name='job_type_finished_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Job {self.pk} - {self.job_type} - {self.status}"
+
+
+class ProviderCallback(models.Model):
+    """
+    Payment notification received from a provider, recorded before it is acted on.
+    
+    Callbacks are settled in batches by the settle_callbacks command; `state`
+    records what became of each one. One that matches no payment yet stays
+    Pending and is retried from `retry_after` on, since the gateway may not
+    have stored the provider's reference when the provider calls back.
+    """
+    
+    OUTCOME_CHOICES = [
+        ('Completed', 'Completed'),
+        ('Failed', 'Failed'),
+    ]
+    
+    STATE_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Settled', 'Settled'),
+        ('Failed', 'Failed'),
+        ('Duplicate', 'Duplicate'),
+        ('Unmatched', 'Unmatched'),
+        ('Ambiguous', 'Ambiguous'),
+        ('Mismatch', 'Mismatch'),
+    ]
+    
+    provider = models.CharField(max_length=50, choices=PaymentRequest.METHOD_CHOICES)
+    provider_reference = models.CharField(max_length=100)
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    payload = models.JSONField(default=dict)
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default='Pending')
+    payment = models.ForeignKey(
+        PaymentRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='callbacks'
+    )
+    received_at = models.DateTimeField(default=timezone.now)
+    retry_after = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            # Providers resend callbacks; repeats are dropped on INSERT
+            models.UniqueConstraint(
+                fields=['provider', 'provider_reference', 'outcome'], name='unique_provider_callback'
+            ),
+        ]
+        indexes = [
+            # Pending callbacks, oldest first
+            models.Index(fields=['state', 'id'], name='callback_state_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.provider} callback {self.provider_reference} - {self.outcome}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    First response to a POST sent with an Idempotency-Key header.
+    
+    `owner` is 'user:<id>', or 'anonymous' for endpoints such as registration.
+    A row without a status code belongs to a request still in progress.
+    """
+    
+    owner = models.CharField(max_length=64)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        constraints = [
+            # Also the index behind the one-read lookup of a retry
+            models.UniqueConstraint(fields=['owner', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Idempotency key {self.key} ({self.owner})"
+
+
+class TaxpayerSearchEntry(models.Model):
+    """
+    Denormalized search document for a user.
+    
+    The document holds the user's email and profile details, lower-cased. On
+    SQLite it is mirrored into an FTS5 table and on PostgreSQL it carries a
+    trigram index; elsewhere it is searched directly.
+    """
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='search_entry')
+    role = models.CharField(max_length=20, db_index=True)
+    document = models.TextField()
+    
+    class Meta:
+        verbose_name_plural = 'taxpayer search entries'
+    
+    def __str__(self):
+        return f"Search entry for user {self.user_id}"
+
+
+class ControlNumberSequence(models.Model):
+    """High-water mark of the control number blocks reserved by worker processes"""
+    
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField(default=1)
+    
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
+def _money(value):
+    # SQLite sums decimals as floats, which leaves stray digits on big totals
+    if isinstance(value, Decimal):
+        return value.quantize(Decimal('0.01'))
+    return value or 0
+
+
+def _chunked_aggregate(queryset, chunk_size, **aggregates):
+    """Aggregate a queryset in primary-key ranges of `chunk_size` rows"""
+    if not chunk_size:
+        result = queryset.aggregate(**aggregates)
+        return {key: _money(value) for key, value in result.items()}
+    
+    totals = {key: 0 for key in aggregates}
+    bounds = queryset.model.objects.aggregate(low=models.Min('pk'), high=models.Max('pk'))
+    if bounds['low'] is None:
+        return totals
+    
+    start = bounds['low']
+    while start <= bounds['high']:
+        chunk = queryset.filter(pk__gte=start, pk__lt=start + chunk_size).aggregate(**aggregates)
+        for key, value in chunk.items():
+            totals[key] += _money(value)
+        start += chunk_size
+    return totals
+
+
+class MetricsSummary(models.Model):
+    """
+    Running totals behind the admin dashboard.
+    
+    The totals are spread over SHARDS rows (primary keys 1 to SHARDS) that
+    are summed on read: each writer adds its deltas to a random row, so
+    concurrent transactions rarely wait on each other's row lock.
+    """
+    
+    SHARDS = 16
+    PROPERTY_TAXPAYER_TYPES = ['Business', 'Organization']
+    
+    total_registered_taxpayers = models.IntegerField(default=0)
+    total_properties_businesses = models.IntegerField(default=0)
+    total_tax_assessed = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_revenue_collected = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    outstanding_tax_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    overdue_accounts = models.IntegerField(default=0)
+    # Accounts with a balance left (the admin unpaid list) and what they owe;
+    # unlike outstanding_tax_amount, credit balances do not net against it
+    unpaid_accounts = models.IntegerField(default=0)
+    unpaid_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    TOTAL_FIELDS = [
+        'total_registered_taxpayers', 'total_properties_businesses', 'total_tax_assessed',
+        'total_revenue_collected', 'outstanding_tax_amount', 'overdue_accounts',
+        'unpaid_accounts', 'unpaid_amount',
+    ]
+    
+    class Meta:
+        verbose_name_plural = 'metrics summary'
+    
+    def __str__(self):
+        return f"Metrics summary shard {self.pk} (updated {self.updated_at})"
+    
+    @classmethod
+    def current(cls):
+        """Return the totals of all shards as an unsaved summary, building them on first use"""
+        totals = cls.objects.aggregate(
+            shards=Count('pk'), updated_at=models.Max('updated_at'),
+            **{field: Sum(field) for field in cls.TOTAL_FIELDS}
+        )
+        if not totals.pop('shards'):
+            cls.rebuild()
+            return cls.current()
+        return cls(**totals)
+    
+    @classmethod
+    def apply(cls, **deltas):
+        """
+        Add deltas to the running totals with DB-side arithmetic.
+        
+        Call this after the change it describes has been saved: if the summary
+        shard does not exist yet the summary is rebuilt from the tables instead.
+        """
+        deltas = {field: value for field, value in deltas.items() if value}
+        if not deltas:
+            return
         
-        # Update tax account
-        tax_account = self.tax_account
-        tax_account.paid_amount += self.amount
-        tax_account.calculate_outstanding()
+        updated = cls.objects.filter(pk=random.randint(1, cls.SHARDS)).update(
+            updated_at=timezone.now(),
+            **{field: F(field) + value for field, value in deltas.items()}
+        )
+        if not updated:
+            cls.rebuild()
+    
+    @staticmethod
+    def account_deltas(before, after):
+        """Difference between two TaxAccount.metrics_snapshot() values"""
+        before = before or {}
+        after = after or {}
+        return {
+            field: after.get(field, 0) - before.get(field, 0)
+            for field in set(before) | set(after)
+        }
+    
+    @classmethod
+    def record_account_change(cls, before, after):
+        """Apply the difference between two TaxAccount.metrics_snapshot() values"""
+        cls.apply(**cls.account_deltas(before, after))
+    
+    @classmethod
+    def calculate(cls, chunk_size=None):
+        """Compute every total from scratch, optionally in primary-key chunks"""
+        totals = {}
+        totals.update(_chunked_aggregate(
+            User.objects.filter(role='Taxpayer'), chunk_size,
+            total_registered_taxpayers=Count('pk'),
+        ))
+        totals.update(_chunked_aggregate(
+            TaxpayerProfile.objects.filter(taxpayer_type__in=cls.PROPERTY_TAXPAYER_TYPES), chunk_size,
+            total_properties_businesses=Count('pk'),
+        ))
+        totals.update(_chunked_aggregate(
+            TaxAccount.objects.all(), chunk_size,
+            total_tax_assessed=Sum('total_tax_due'),
+            outstanding_tax_amount=Sum('outstanding_balance'),
+            overdue_accounts=Count('pk', filter=Q(status='Overdue')),
+            unpaid_accounts=Count('pk', filter=Q(outstanding_balance__gt=0)),
+            unpaid_amount=Sum('outstanding_balance', filter=Q(outstanding_balance__gt=0)),
+        ))
+        totals.update(_chunked_aggregate(
+            PaymentRequest.objects.filter(status='Completed'), chunk_size,
+            total_revenue_collected=Sum('amount'),
+        ))
+        return totals
+    
+    @classmethod
+    def store(cls, totals):
+        """Replace the stored totals: the first shard holds them and the others are reset to zero"""
+        with transaction.atomic():
+            for shard in range(1, cls.SHARDS + 1):
+                cls.objects.update_or_create(
+                    pk=shard, defaults=totals if shard == 1 else dict.fromkeys(cls.TOTAL_FIELDS, 0)
+                )
+            cls.objects.filter(pk__gt=cls.SHARDS).delete()
+    
+    @classmethod
+    def rebuild(cls, chunk_size=None):
+        """Recompute the summary from the tables and store it"""
+        cls.store(cls.calculate(chunk_size))
+        return cls.current()
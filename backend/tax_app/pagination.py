@@ -0,0 +1,218 @@
+"""
+Keyset (cursor) pagination for Municipal Tax System list endpoints
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from decimal import InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ListPagination(BasePagination):
+    """Page size handling and the {next, previous, results} response shape"""
+
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class KeysetPagination(ListPagination):
+    """
+    Paginate on (ordering field, primary key) so every page is an index range
+    scan starting after the last row of the previous page, no matter how deep.
+
+    The cursor is an opaque token holding the sort value and id of the row
+    the page starts after. Clients may ask for larger pages with `page_size`,
+    which is capped at `max_page_size`.
+    """
+
+    ordering = '-created_at'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field = self.ordering.lstrip('-')
+        self.model_field = queryset.model._meta.get_field(self.field)
+
+        cursor = self.decode_cursor(request)
+        self.cursor = cursor
+        reverse = bool(cursor and cursor['reverse'])
+        descending = self.ordering.startswith('-') != reverse
+
+        if cursor is not None:
+            queryset = queryset.filter(self.after_cursor(cursor, descending))
+
+        prefix = '-' if descending else ''
+        rows = list(queryset.order_by(f'{prefix}{self.field}', f'{prefix}pk')[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = rows
+        return rows
+
+    def after_cursor(self, cursor, descending):
+        lookup = 'lt' if descending else 'gt'
+        return (
+            Q(**{f'{self.field}__{lookup}': cursor['value']}) |
+            Q(**{self.field: cursor['value'], f'pk__{lookup}': cursor['pk']})
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            cursor = {
+                'value': self.model_field.to_python(payload['v']),
+                'pk': int(payload['pk']),
+                'reverse': bool(payload.get('r', False)),
+            }
+        except (TypeError, ValueError, KeyError, binascii.Error, UnicodeError, ValidationError, InvalidOperation):
+            raise NotFound(self.invalid_cursor_message)
+        # Values a row could never have had, which the database would reject
+        if cursor['value'] is None or not 0 <= cursor['pk'] < 2 ** 63:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, row, reverse):
+        value = getattr(row, self.field)
+        payload = {'v': value.isoformat() if hasattr(value, 'isoformat') else str(value), 'pk': row.pk}
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+class PaymentPagination(KeysetPagination):
+    """Payments, newest first"""
+
+    ordering = '-created_at'
+
+
+class TaxAccountPagination(KeysetPagination):
+    """Tax accounts, newest first"""
+
+    ordering = '-created_at'
+
+
+class UserPagination(KeysetPagination):
+    """Users, most recently joined first"""
+
+    ordering = '-date_joined'
+
+
+class UnpaidAccountPagination(KeysetPagination):
+    """Unpaid accounts, largest outstanding balance first"""
+
+    ordering = '-outstanding_balance'
+
+
+class LedgerPagination(KeysetPagination):
+    """Ledger entries, most recent first"""
+
+    ordering = '-id'
+
+
+class RankedPagination(ListPagination):
+    """
+    Offset pagination for ranked search results.
+
+    Ranked results have no stable sort key to build a keyset cursor on, so
+    pages are addressed by offset; search indexes answer offset queries
+    without touching the base tables. `paginate_ranked` takes a callable
+    returning the ranked primary keys for (offset, limit) and loads only the
+    rows of the requested page.
+    """
+
+    offset_query_param = 'offset'
+
+    def paginate_ranked(self, ranked_ids, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.offset = _positive_int(request.query_params[self.offset_query_param])
+        except (KeyError, ValueError):
+            self.offset = 0
+
+        ids = list(ranked_ids(self.offset, self.page_size + 1))
+        self.has_next = len(ids) > self.page_size
+        ids = ids[:self.page_size]
+
+        rows = queryset.in_bulk(ids)
+        self.page = [rows[pk] for pk in ids if pk in rows]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.offset_query_param, self.offset + self.page_size)
+
+    def get_previous_link(self):
+        if self.offset <= 0:
+            return None
+        url = self.request.build_absolute_uri()
+        previous = self.offset - self.page_size
+        if previous <= 0:
+            return remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.offset_query_param, previous)
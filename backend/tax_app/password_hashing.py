@@ -0,0 +1,61 @@
+"""
+Parallel password hashing for bulk imports
+
+PBKDF2 dominates the cost of creating users in bulk, so hashes are computed
+in a process pool. Worker processes only import Django settings and hashers.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+
+def setup_worker(settings_module):
+    # Needed when workers are spawned rather than forked
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def _hash_chunk(passwords):
+    return [make_password(password) for password in passwords]
+
+
+class PasswordHasherPool:
+    """Hash lists of passwords across `workers` processes (inline when workers <= 1)"""
+
+    def __init__(self, workers=None):
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.executor = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=setup_worker,
+                initargs=(settings.SETTINGS_MODULE,),
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def hash(self, passwords):
+        """Return hashes in input order; empty passwords become unusable"""
+        hashes = [make_password(None) for _ in passwords]
+        positions = [i for i, password in enumerate(passwords) if password]
+        to_hash = [passwords[i] for i in positions]
+
+        if self.executor is None:
+            results = _hash_chunk(to_hash)
+        else:
+            size = max(1, -(-len(to_hash) // (self.workers * 4)))
+            chunks = [to_hash[i:i + size] for i in range(0, len(to_hash), size)]
+            results = [hashed for chunk in self.executor.map(_hash_chunk, chunks) for hashed in chunk]
+
+        for i, hashed in zip(positions, results):
+            hashes[i] = hashed
+        return hashes
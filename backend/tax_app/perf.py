@@ -0,0 +1,260 @@
+"""
+Per-endpoint performance metrics
+
+PerformanceMiddleware times a sample of requests and records, per URL name
+(e.g. 'payments-list'): wall time, number and total time of database
+queries, time spent in serializers (validation and representation,
+including any queries they trigger) and response size. Observations go into fixed-bucket histograms held in the
+process, so recording costs a few additions under a lock and nothing is
+written anywhere; each worker process reports its own requests.
+
+Read them as JSON at /api/admin/perf/ (admins) or in the Prometheus text
+format at /metrics. Tuned with the PERF_METRICS setting.
+"""
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,
+    'METRICS_TOKEN': '',
+}
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Metric name, Prometheus help text and buckets of each histogram
+METRICS = {
+    'wall_seconds': ('http_request_duration_seconds', 'Time to produce the response', SECONDS_BUCKETS),
+    'db_queries': ('http_db_queries', 'Database queries per request', QUERY_BUCKETS),
+    'db_seconds': ('http_db_duration_seconds', 'Database time per request', SECONDS_BUCKETS),
+    'serializer_seconds': ('http_serializer_duration_seconds', 'Serializer time per request', SECONDS_BUCKETS),
+    'response_bytes': ('http_response_size_bytes', 'Response body size (streamed responses excluded)', BYTES_BUCKETS),
+}
+
+PROMETHEUS_PREFIX = 'municipal_tax_'
+
+UNRESOLVED = '<unresolved>'
+
+
+def perf_setting(name):
+    return getattr(settings, 'PERF_METRICS', {}).get(name, DEFAULTS[name])
+
+
+class Histogram:
+    """Counts of observations per bucket upper bound, plus their sum and range"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # The last slot counts observations above the largest bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.min = self.max = None
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if self.count == 1:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Estimate, interpolating inside the bucket that holds it and kept within the observed range"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        estimate = self.max
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index < len(self.buckets):
+                    lower = self.buckets[index - 1] if index else 0
+                    estimate = lower + (self.buckets[index] - lower) * (rank - seen) / count
+                break
+            seen += count
+        return min(max(estimate, self.min), self.max)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+
+class EndpointStats:
+    def __init__(self):
+        self.histograms = {name: Histogram(buckets) for name, (_, _, buckets) in METRICS.items()}
+        self.statuses = {}
+
+
+class PerfRegistry:
+    """Histograms for every endpoint seen by this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = timezone.now()
+        self.endpoints = {}
+
+    def record(self, endpoint, status_code, observations):
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            for name, value in observations.items():
+                if value is not None:
+                    stats.histograms[name].observe(value)
+            stats.statuses[status_code] = stats.statuses.get(status_code, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+            self.started = timezone.now()
+
+    def summary(self):
+        """{endpoint: {requests, statuses, metric: {count, mean, p50, p95, p99}}}"""
+        with self._lock:
+            return {
+                endpoint: {
+                    'requests': sum(stats.statuses.values()),
+                    'statuses': {str(code): count for code, count in sorted(stats.statuses.items())},
+                    **{name: histogram.summary() for name, histogram in stats.histograms.items()},
+                }
+                for endpoint, stats in sorted(self.endpoints.items())
+            }
+
+    def prometheus(self):
+        """The histograms in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            name = f'{PROMETHEUS_PREFIX}http_requests_total'
+            lines += [f'# HELP {name} Sampled requests by endpoint and status', f'# TYPE {name} counter']
+            for endpoint, stats in endpoints:
+                for code, count in sorted(stats.statuses.items()):
+                    lines.append(f'{name}{{endpoint="{_label(endpoint)}",status="{code}"}} {count}')
+
+            for key, (metric, help_text, buckets) in METRICS.items():
+                name = PROMETHEUS_PREFIX + metric
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for endpoint, stats in endpoints:
+                    histogram = stats.histograms[key]
+                    label = _label(endpoint)
+                    cumulative = 0
+                    for bound, count in zip(buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{endpoint="{label}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{endpoint="{label}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{endpoint="{label}"}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{endpoint="{label}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = PerfRegistry()
+
+# Measurements of the request being sampled on this thread, if any
+_active = threading.local()
+
+
+class RequestMeasurement:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+def _timed(func):
+    """Count the time spent in `func` as serializer time of the sampled request"""
+    def wrapper(*args, **kwargs):
+        measurement = getattr(_active, 'measurement', None)
+        if measurement is None or measurement.serializer_depth:
+            return func(*args, **kwargs)
+        measurement.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            measurement.serializer_seconds += time.perf_counter() - started
+            measurement.serializer_depth -= 1
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def install_serializer_timing():
+    """
+    Time DRF serializers' is_valid() and .data; called once at startup.
+
+    Nested serializers run inside the outer call and are not counted twice.
+    """
+    from rest_framework.serializers import BaseSerializer
+
+    if hasattr(BaseSerializer.is_valid, '__wrapped__'):
+        return
+    BaseSerializer.is_valid = _timed(BaseSerializer.is_valid)
+    BaseSerializer.data = property(_timed(BaseSerializer.data.fget))
+
+
+class PerformanceMiddleware:
+    """Record per-endpoint metrics for a PERF_METRICS['SAMPLE_RATE'] share of requests"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = perf_setting('SAMPLE_RATE')
+        if not perf_setting('ENABLED') or rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        measurement = RequestMeasurement()
+        _active.measurement = measurement
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(measurement))
+                response = self.get_response(request)
+        finally:
+            _active.measurement = None
+        wall = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match.view_name if match is not None else None) or UNRESOLVED
+        registry.record(endpoint, response.status_code, {
+            'wall_seconds': wall,
+            'db_queries': measurement.queries,
+            'db_seconds': measurement.db_seconds,
+            'serializer_seconds': measurement.serializer_seconds,
+            'response_bytes': None if response.streaming else len(response.content),
+        })
+        return response
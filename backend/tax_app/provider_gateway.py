@@ -0,0 +1,332 @@
+"""
+Asynchronous gateway to the Mobile Money and Pesapal payment providers
+
+Payment initiation is an outbound HTTP call that can take seconds, so request
+threads never make it themselves. They hand payment ids to the process-wide
+gateway, which runs an asyncio event loop in a background thread. The loop
+keeps a pool of keep-alive connections per provider, so hundreds of calls can
+be in flight at once, and applies a timeout and retries with backoff to each
+call. Results are written back on a small thread pool: the provider reference
+and status 'Processing' on success, status 'Failed' once retries run out.
+
+Each call carries an Idempotency-Key derived from the payment id, so a retry
+after a timeout cannot open a second payment at the provider. For a provider
+configured with IDEMPOTENCY_KEYS False, only calls that never reached it
+(the connection could not be opened) are retried.
+
+Payments are handed to the gateway after their transaction commits; if the
+process exits first they stay Pending without a reference, and
+requeue_stale_payments() (the requeue_stale_payments command) hands them
+over again through the job queue.
+
+Providers are configured in settings.PAYMENT_PROVIDERS, keyed by payment
+method. Methods without a provider keep the simulated reference.
+"""
+import asyncio
+import json
+import os
+import random
+import ssl
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import PaymentRequest
+
+
+DEFAULTS = {
+    'MAX_CONNECTIONS': 100,
+    'TIMEOUT': 10,
+    'RETRIES': 2,
+    'BACKOFF': 0.5,
+    'STALE_AFTER': 300,
+}
+
+
+class ProviderError(Exception):
+    """A provider call failed; `retryable` says whether trying again may help"""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class ConnectError(Exception):
+    """The connection could not be opened, so the request was never sent"""
+
+
+def gateway_setting(name):
+    return getattr(settings, 'PAYMENT_GATEWAY', {}).get(name, DEFAULTS[name])
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections to one origin, at most `max_connections` open"""
+
+    def __init__(self, url, max_connections):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.tls = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.tls else 80)
+        self.idle = deque()
+        self.slots = asyncio.Semaphore(max_connections)
+
+    async def request(self, method, path, body, headers, timeout):
+        """Send one request and return (status, body bytes)"""
+        async with self.slots:
+            try:
+                reader, writer = await self._connect(timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                raise ConnectError(str(e) or type(e).__name__) from e
+            try:
+                status, data, reusable = await asyncio.wait_for(
+                    self._exchange(reader, writer, method, path, body, headers), timeout
+                )
+            except BaseException:
+                writer.close()
+                raise
+            if reusable:
+                self.idle.append((reader, writer))
+            else:
+                writer.close()
+            return status, data
+
+    async def _connect(self, timeout):
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer
+            writer.close()
+        context = ssl.create_default_context() if self.tls else None
+        return await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=context), timeout)
+
+    async def _exchange(self, reader, writer, method, path, body, headers):
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(body)}']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed before the response')
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        reusable = response_headers.get('connection', '').lower() != 'close'
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = b''
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if not size:
+                    await reader.readline()
+                    break
+                data += await reader.readexactly(size)
+                await reader.readline()
+        elif 'content-length' in response_headers:
+            data = await reader.readexactly(int(response_headers['content-length']))
+        else:
+            data = await reader.read()
+            reusable = False
+        return status, data, reusable
+
+    def close(self):
+        while self.idle:
+            _, writer = self.idle.pop()
+            writer.close()
+
+
+class ProviderClient:
+    """Initiates payments with one provider over a connection pool"""
+
+    def __init__(self, method, config):
+        self.method = method
+        self.url = config['URL'].rstrip('/')
+        self.api_key = config.get('API_KEY', '')
+        self.timeout = config.get('TIMEOUT', gateway_setting('TIMEOUT'))
+        self.retries = config.get('RETRIES', gateway_setting('RETRIES'))
+        self.backoff = config.get('BACKOFF', gateway_setting('BACKOFF'))
+        # Whether the provider honours Idempotency-Key, making a resent POST safe
+        self.idempotency_keys = config.get('IDEMPOTENCY_KEYS', True)
+        self.path = urlsplit(self.url).path
+        self.pool = ConnectionPool(self.url, config.get('MAX_CONNECTIONS', gateway_setting('MAX_CONNECTIONS')))
+
+    async def initiate(self, payment):
+        """Start a payment with the provider and return its reference"""
+        body = json.dumps({
+            'payment_id': payment['pk'],
+            'amount': str(payment['amount']),
+            'method': self.method,
+        }).encode('utf-8')
+        headers = {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'Idempotency-Key': f'payment-{payment["pk"]}',
+        }
+        if self.api_key:
+            headers['Authorization'] = f'Bearer {self.api_key}'
+
+        for attempt in range(self.retries + 1):
+            try:
+                return await self._call(body, headers)
+            except ProviderError as e:
+                if not e.retryable or attempt == self.retries:
+                    raise
+            # Exponential backoff with jitter, so retries from a burst spread out
+            await asyncio.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    async def _call(self, body, headers):
+        try:
+            status, data = await self.pool.request('POST', f'{self.path}/payments', body, headers, self.timeout)
+        except ConnectError as e:
+            raise ProviderError(f'{self.method} connection failed: {e}', retryable=True)
+        except asyncio.TimeoutError:
+            # The provider may have taken the payment before the answer was lost
+            raise ProviderError(f'{self.method} timed out', retryable=self.idempotency_keys)
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+            raise ProviderError(f'{self.method} connection failed: {e}', retryable=self.idempotency_keys)
+
+        if status in (429, 503):
+            # Refused without being processed
+            raise ProviderError(f'{self.method} answered {status}', retryable=True)
+        if status >= 500:
+            raise ProviderError(f'{self.method} answered {status}', retryable=self.idempotency_keys)
+        if status >= 400:
+            raise ProviderError(f'{self.method} rejected the payment ({status})')
+        try:
+            return str(json.loads(data)['reference'])
+        except (ValueError, KeyError, TypeError):
+            raise ProviderError(f'{self.method} sent an unreadable response')
+
+    def close(self):
+        self.pool.close()
+
+
+class ProviderGateway:
+    """Background event loop that initiates payments with their providers"""
+
+    def __init__(self, providers=None):
+        self.providers = providers if providers is not None else getattr(settings, 'PAYMENT_PROVIDERS', {})
+        self._lock = threading.Lock()
+        self._loop = None
+        self._clients = {}
+        self._writer = None
+        self._pid = None
+
+    def handles(self, method):
+        # A provider may be configured for callbacks only, without a URL to call
+        return 'URL' in self.providers.get(method, {})
+
+    def _ensure_started(self):
+        with self._lock:
+            # A forked worker does not inherit the parent's loop thread
+            if self._loop is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._clients = {}
+                self._loop = asyncio.new_event_loop()
+                self._writer = ThreadPoolExecutor(max_workers=4, thread_name_prefix='provider-results')
+                threading.Thread(target=self._loop.run_forever, name='provider-gateway', daemon=True).start()
+        return self._loop
+
+    def initiate(self, payments):
+        """
+        Start provider calls for payments without waiting for them.
+
+        `payments` are dicts with pk, amount and payment_method. Returns a
+        concurrent.futures.Future per payment, resolving to its reference or
+        to None once the payment has been marked Failed.
+        """
+        loop = self._ensure_started()
+        return [
+            asyncio.run_coroutine_threadsafe(self._initiate(payment), loop)
+            for payment in payments
+        ]
+
+    def initiate_after_commit(self, payments):
+        """Start provider calls once the current transaction has committed"""
+        payments = [
+            {'pk': payment.pk, 'amount': payment.amount, 'payment_method': payment.payment_method}
+            for payment in payments
+            if self.handles(payment.payment_method)
+        ]
+        if payments:
+            transaction.on_commit(lambda: self.initiate(payments))
+
+    async def _initiate(self, payment):
+        client = self._clients.get(payment['payment_method'])
+        if client is None:
+            client = self._clients[payment['payment_method']] = ProviderClient(
+                payment['payment_method'], self.providers[payment['payment_method']]
+            )
+        try:
+            reference = await client.initiate(payment)
+        except ProviderError:
+            reference = None
+        await asyncio.get_running_loop().run_in_executor(self._writer, record_result, payment['pk'], reference)
+        return reference
+
+    def close(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            loop, self._loop = self._loop, None
+        for client in self._clients.values():
+            loop.call_soon_threadsafe(client.close)
+        loop.call_soon_threadsafe(loop.stop)
+        self._writer.shutdown(wait=True)
+        self._clients = {}
+
+
+def record_result(payment_id, reference):
+    """Store a provider's answer on a payment that is still Pending"""
+    # Writer threads live outside the request cycle, so expire connections here
+    close_old_connections()
+    now = timezone.now()
+    if reference is None:
+        PaymentRequest.objects.filter(pk=payment_id, status='Pending').update(status='Failed', updated_at=now)
+    else:
+        PaymentRequest.objects.filter(pk=payment_id, status='Pending').update(
+            status='Processing', provider_reference=reference, updated_at=now
+        )
+
+
+def requeue_stale_payments(stale_after=None, limit=1000):
+    """
+    Queue another provider call for payments the gateway never got to.
+
+    Picks Pending payments of methods with a provider that have had no
+    reference for `stale_after` seconds, marks them updated so the next run
+    leaves them alone for as long again, and queues an initiate_payment job
+    for each. Returns the number queued.
+    """
+    from .jobs import enqueue_many
+
+    methods = [method for method in gateway.providers if gateway.handles(method)]
+    if not methods:
+        return 0
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=stale_after if stale_after is not None else gateway_setting('STALE_AFTER'))
+    with transaction.atomic():
+        stale = list(
+            PaymentRequest.objects.filter(
+                status='Pending', provider_reference='', payment_method__in=methods, updated_at__lt=cutoff
+            ).order_by('created_at', 'id').values_list('pk', flat=True)[:limit]
+        )
+        if stale:
+            PaymentRequest.objects.filter(pk__in=stale, status='Pending').update(updated_at=now)
+            enqueue_many('initiate_payment', [{'payment_id': pk} for pk in stale])
+    return len(stale)
+
+
+gateway = ProviderGateway()
@@ -0,0 +1,138 @@
+"""
+Indexed taxpayer search
+
+Each user has a TaxpayerSearchEntry whose document holds their email and
+profile details. Searches run against the best index the database offers:
+
+- SQLite: an FTS5 table kept in sync with the entries by triggers, ranked
+  with bm25 and matching word prefixes.
+- PostgreSQL: a pg_trgm GIN index on the document, ranked by similarity and
+  matching substrings.
+- Anything else: substring filters on the entry table alone.
+"""
+import re
+
+from django.db import connections
+
+from .models import User, TaxpayerSearchEntry
+
+
+FTS_TABLE = 'tax_app_taxpayersearch_fts'
+
+PROFILE_FIELDS = [
+    'first_name', 'middle_name', 'last_name', 'national_id_number',
+    'business_name', 'mobile_phone', 'ward',
+]
+
+_backends = {}
+
+
+def phone_variants(phone):
+    """The phone number's digits plus its local 0XXXXXXXXX form"""
+    digits = re.sub(r'\D', '', phone or '')
+    variants = [digits] if digits else []
+    if len(digits) > 9:
+        variants.append('0' + digits[-9:])
+    return variants
+
+
+def build_document(email, profile=None):
+    """Search document for a user; `profile` maps PROFILE_FIELDS to values"""
+    parts = [email]
+    if profile:
+        parts.extend(profile.get(field) or '' for field in PROFILE_FIELDS)
+        parts.extend(phone_variants(profile.get('mobile_phone')))
+    return ' '.join(part for part in parts if part).lower()
+
+
+def index_users(user_ids):
+    """Create or refresh the search entries of the given users"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    rows = User.objects.filter(pk__in=user_ids).values(
+        'pk', 'email', 'role', *[f'profile__{field}' for field in PROFILE_FIELDS]
+    )
+    entries = []
+    for row in rows:
+        profile = None
+        if row['profile__national_id_number'] is not None:
+            profile = {field: row[f'profile__{field}'] for field in PROFILE_FIELDS}
+        entries.append(TaxpayerSearchEntry(
+            user_id=row['pk'],
+            role=row['role'],
+            document=build_document(row['email'], profile),
+        ))
+
+    TaxpayerSearchEntry.objects.bulk_create(
+        entries,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['role', 'document'],
+    )
+
+
+def search_backend(using='default'):
+    if using not in _backends:
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            _backends[using] = 'trigram'
+        elif connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+            _backends[using] = 'fts5'
+        else:
+            _backends[using] = 'basic'
+    return _backends[using]
+
+
+def tokenize(query):
+    return re.findall(r'\w+', (query or '').lower())
+
+
+def search_user_ids(query, role=None, offset=0, limit=50, using='default'):
+    """Ids of users matching every word of `query`, best match first"""
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    backend = search_backend(using)
+    if backend == 'fts5':
+        return _search_fts5(tokens, role, offset, limit, using)
+
+    queryset = TaxpayerSearchEntry.objects.using(using)
+    if role:
+        queryset = queryset.filter(role=role)
+    for token in tokens:
+        queryset = queryset.filter(document__contains=token)
+
+    if backend == 'trigram':
+        from django.contrib.postgres.search import TrigramSimilarity
+        queryset = queryset.annotate(
+            rank=TrigramSimilarity('document', ' '.join(tokens))
+        ).order_by('-rank', '-user_id')
+    else:
+        queryset = queryset.order_by('-user_id')
+
+    return list(queryset.values_list('user_id', flat=True)[offset:offset + limit])
+
+
+def _search_fts5(tokens, role, offset, limit, using):
+    connection = connections[using]
+    entries = connection.ops.quote_name(TaxpayerSearchEntry._meta.db_table)
+    match = ' '.join(f'"{token}"*' for token in tokens)
+
+    sql = (
+        f'SELECT e.user_id FROM {FTS_TABLE} f '
+        f'JOIN {entries} e ON e.user_id = f.rowid '
+        f'WHERE {FTS_TABLE} MATCH %s'
+    )
+    params = [match]
+    if role:
+        sql += ' AND e.role = %s'
+        params.append(role)
+    sql += ' ORDER BY f.rank, e.user_id DESC LIMIT %s OFFSET %s'
+    params.extend([limit, offset])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
@@ -3,7 +3,8 @@ Serializers for Municipal Tax System API
 """
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from .models import User, TaxpayerProfile, TaxType, TaxAccount, PaymentRequest
+from django.db import transaction
+from .models import User, TaxpayerProfile, TaxType, TaxAccount, PaymentRequest, LedgerEntry, MetricsSummary
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -82,8 +83,7 @@ class TaxpayerProfileCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({'declaration': 'You must confirm that the information provided is true and correct.'})
         
         # Check business name for Business/Organization types
-        if data.get('taxpayer_type') in ['Business', 'Organization'] and not data.get('business_name'):
-            raise serializers.ValidationError({'business_name': 'Business name is required for Business or Organization type.'})
+        self.validate_business_details(data)
         
         # Check email uniqueness
         if User.objects.filter(email=data['email']).exists():
@@ -95,6 +95,11 @@ class TaxpayerProfileCreateSerializer(serializers.ModelSerializer):
         
         return data
     
+    def validate_business_details(self, data):
+        if data.get('taxpayer_type') in ['Business', 'Organization'] and not data.get('business_name'):
+            raise serializers.ValidationError({'business_name': 'Business name is required for Business or Organization type.'})
+    
+    @transaction.atomic
     def create(self, validated_data):
         # Extract user data
         email = validated_data.pop('email')
@@ -123,9 +128,37 @@ class TaxpayerProfileCreateSerializer(serializers.ModelSerializer):
                 outstanding_balance=0
             )
         
+        MetricsSummary.apply(
+            total_registered_taxpayers=1,
+            total_properties_businesses=1 if profile.taxpayer_type in MetricsSummary.PROPERTY_TAXPAYER_TYPES else 0
+        )
+        
         return profile
 
 
+class TaxpayerImportSerializer(TaxpayerProfileCreateSerializer):
+    """
+    Validates one row of a bulk taxpayer import.
+    
+    Applies the registration field rules, but uniqueness of email and national
+    ID is checked by the importer against preloaded sets instead of per-row
+    queries. A blank password gives the user an unusable password.
+    """
+    
+    national_id_number = serializers.CharField(max_length=50)
+    password = serializers.CharField(write_only=True, min_length=8, required=False, allow_blank=True)
+    
+    class Meta(TaxpayerProfileCreateSerializer.Meta):
+        fields = [
+            field for field in TaxpayerProfileCreateSerializer.Meta.fields
+            if field not in ('password_confirm', 'declaration')
+        ]
+    
+    def validate(self, data):
+        self.validate_business_details(data)
+        return data
+
+
 class TaxTypeSerializer(serializers.ModelSerializer):
     """Serializer for TaxType model"""
     
@@ -147,7 +180,21 @@ class TaxAccountSerializer(serializers.ModelSerializer):
             'total_tax_due', 'paid_amount', 'outstanding_balance',
             'next_payment_due_date', 'status', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        # Derived from the dues and payments on every save, so they always match the ledger
+        read_only_fields = ['id', 'outstanding_balance', 'status', 'created_at', 'updated_at']
+    
+    def create(self, validated_data):
+        account = TaxAccount(**validated_data)
+        account.derive_balance()
+        account.save()
+        return account
+    
+    def update(self, instance, validated_data):
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.derive_balance()
+        instance.save()
+        return instance
 
 
 class PaymentRequestSerializer(serializers.ModelSerializer):
@@ -166,6 +213,10 @@ class PaymentRequestSerializer(serializers.ModelSerializer):
 class PaymentRequestCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating PaymentRequest"""
     
+    # Ownership is checked by the view, so only the id is needed here; the
+    # bounds keep ids the database cannot store from reaching the query
+    tax_account = serializers.IntegerField(min_value=1, max_value=2**63 - 1)
+    
     class Meta:
         model = PaymentRequest
         fields = ['amount', 'payment_method', 'tax_account']
@@ -176,6 +227,27 @@ class PaymentRequestCreateSerializer(serializers.ModelSerializer):
         return data
 
 
+class LedgerEntrySerializer(serializers.ModelSerializer):
+    """Serializer for LedgerEntry model"""
+    
+    class Meta:
+        model = LedgerEntry
+        fields = ['id', 'tax_account', 'entry_type', 'amount', 'payment', 'description', 'created_at']
+        read_only_fields = fields
+
+
+class PenaltySerializer(serializers.Serializer):
+    """Serializer for charging a penalty"""
+    
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    description = serializers.CharField(max_length=200, required=False, allow_blank=True, default='')
+    
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('Amount must be greater than 0.')
+        return value
+
+
 class LoginSerializer(serializers.Serializer):
     """Serializer for login"""
     
@@ -214,7 +286,9 @@ class AdminMetricsSerializer(serializers.Serializer):
     
     total_registered_taxpayers = serializers.IntegerField()
     total_properties_businesses = serializers.IntegerField()
-    total_tax_assessed = serializers.DecimalField(max_digits=12, decimal_places=2)
-    total_revenue_collected = serializers.DecimalField(max_digits=12, decimal_places=2)
-    outstanding_tax_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    total_tax_assessed = serializers.DecimalField(max_digits=16, decimal_places=2)
+    total_revenue_collected = serializers.DecimalField(max_digits=16, decimal_places=2)
+    outstanding_tax_amount = serializers.DecimalField(max_digits=16, decimal_places=2)
     overdue_accounts = serializers.IntegerField()
+    unpaid_accounts = serializers.IntegerField()
+    unpaid_amount = serializers.DecimalField(max_digits=16, decimal_places=2)
@@ -0,0 +1,282 @@
+"""
+Bulk reconciliation of payment provider settlement files
+
+Settlement files list payments a provider has collected, one per CSV row or
+JSON line, identified by `control_number` or `provider_reference` and carrying
+the collected `amount`. Rows are streamed, matched to PaymentRequest rows in
+batches and applied with set-based updates, so memory stays bounded by the
+batch size rather than the file size. The file is decoded through once
+first, so one that is not valid text is rejected before anything is settled.
+"""
+import codecs
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .jobs import payments_settled
+from .ledger import record_payments
+from .models import TaxAccount, PaymentRequest, MetricsSummary
+
+
+FORMATS = ['csv', 'jsonl']
+
+# Problem rows kept per category in the report; counts are always exact
+MAX_REPORTED_ROWS = 100
+
+# Bytes read at a time when checking a file's encoding
+CHUNK_SIZE = 64 * 1024
+
+
+class SettlementFileError(ValueError):
+    """A settlement file that cannot be read at all, so nothing in it is settled"""
+
+
+def detect_format(filename):
+    if filename and filename.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(stream, file_format):
+    """Yield (line number, row dict) from a text stream without loading it whole"""
+    if file_format == 'csv':
+        for line_number, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_number, row
+    elif file_format == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f'Unsupported settlement format: {file_format}')
+
+
+class SettlementReport:
+    """Counts and sample rows produced by a reconciliation run"""
+
+    CATEGORIES = ['invalid', 'unmatched', 'ambiguous', 'duplicate', 'cancelled', 'amount_mismatch']
+
+    def __init__(self):
+        self.rows = 0
+        self.settled = 0
+        self.settled_amount = Decimal('0')
+        self.counts = {category: 0 for category in self.CATEGORIES}
+        self.samples = {category: [] for category in self.CATEGORIES}
+
+    def add_problem(self, category, line_number, row, **details):
+        self.counts[category] += 1
+        if len(self.samples[category]) < MAX_REPORTED_ROWS:
+            self.samples[category].append({'line': line_number, 'row': row, **details})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'settled': self.settled,
+            'settled_amount': str(self.settled_amount),
+            'counts': dict(self.counts),
+            'samples': {category: rows for category, rows in self.samples.items() if rows},
+        }
+
+
+class SettlementReconciler:
+    """Match settlement rows to payments and settle them batch by batch"""
+
+    def __init__(self, batch_size=1000, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.report = SettlementReport()
+        # Payments settled by earlier rows of this file, to spot repeats
+        self.seen_payment_ids = set()
+
+    def run(self, stream, file_format):
+        batch = []
+        for line_number, row in read_rows(stream, file_format):
+            self.report.rows += 1
+            parsed = self.parse_row(line_number, row)
+            if parsed is not None:
+                batch.append(parsed)
+            if len(batch) >= self.batch_size:
+                self.process_batch(batch)
+                batch = []
+        if batch:
+            self.process_batch(batch)
+        return self.report
+
+    def parse_row(self, line_number, row):
+        if row is None:
+            self.report.add_problem('invalid', line_number, None, reason='Unreadable row')
+            return None
+
+        control_number = str(row.get('control_number') or '').strip()
+        provider_reference = str(row.get('provider_reference') or '').strip()
+        if not control_number and not provider_reference:
+            self.report.add_problem('invalid', line_number, row, reason='Missing control_number and provider_reference')
+            return None
+
+        try:
+            amount = Decimal(str(row.get('amount', '')).strip())
+        except InvalidOperation:
+            self.report.add_problem('invalid', line_number, row, reason='Invalid amount')
+            return None
+
+        return {
+            'line': line_number,
+            'row': row,
+            'control_number': control_number,
+            'provider_reference': provider_reference,
+            'amount': amount,
+        }
+
+    def process_batch(self, batch):
+        control_numbers = {entry['control_number'] for entry in batch if entry['control_number']}
+        references = {
+            entry['provider_reference'] for entry in batch
+            if entry['provider_reference'] and not entry['control_number']
+        }
+
+        by_control_number = {}
+        by_reference = {}
+        payments = PaymentRequest.objects.filter(
+            Q(control_number__in=control_numbers) | Q(provider_reference__in=references)
+        ).values('pk', 'control_number', 'provider_reference', 'amount', 'status', 'tax_account_id')
+        for payment in payments:
+            if payment['control_number'] in control_numbers:
+                by_control_number[payment['control_number']] = payment
+            if payment['provider_reference'] in references:
+                by_reference.setdefault(payment['provider_reference'], []).append(payment)
+
+        to_settle = {}
+        for entry in batch:
+            payment = self.match(entry, by_control_number, by_reference)
+            if payment is None:
+                continue
+
+            if payment['pk'] in self.seen_payment_ids or payment['pk'] in to_settle or payment['status'] == 'Completed':
+                self.report.add_problem('duplicate', entry['line'], entry['row'], payment_id=payment['pk'])
+            elif payment['status'] not in PaymentRequest.SETTLEABLE_STATUSES:
+                self.report.add_problem(
+                    'cancelled', entry['line'], entry['row'], payment_id=payment['pk'], status=payment['status']
+                )
+            elif payment['amount'] != entry['amount']:
+                self.report.add_problem(
+                    'amount_mismatch', entry['line'], entry['row'],
+                    payment_id=payment['pk'], expected_amount=str(payment['amount'])
+                )
+            else:
+                to_settle[payment['pk']] = (entry, payment)
+
+        self.seen_payment_ids.update(to_settle)
+        if to_settle and not self.dry_run:
+            self.settle(to_settle)
+        elif to_settle:
+            self.report.settled += len(to_settle)
+            self.report.settled_amount += sum(payment['amount'] for _, payment in to_settle.values())
+
+    def match(self, entry, by_control_number, by_reference):
+        if entry['control_number']:
+            payment = by_control_number.get(entry['control_number'])
+            if payment is None:
+                self.report.add_problem('unmatched', entry['line'], entry['row'])
+            return payment
+
+        candidates = by_reference.get(entry['provider_reference'], [])
+        if not candidates:
+            self.report.add_problem('unmatched', entry['line'], entry['row'])
+            return None
+        if len(candidates) > 1:
+            self.report.add_problem(
+                'ambiguous', entry['line'], entry['row'],
+                payment_ids=[payment['pk'] for payment in candidates]
+            )
+            return None
+        return candidates[0]
+
+    def settle(self, to_settle):
+        claimed, revenue = settle_payments(to_settle)
+        for pk in set(to_settle) - claimed:
+            entry, _ = to_settle[pk]
+            self.report.add_problem('duplicate', entry['line'], entry['row'], payment_id=pk)
+        self.report.settled += len(claimed)
+        self.report.settled_amount += revenue
+
+
+@transaction.atomic
+def settle_payments(payment_ids, now=None):
+    """
+    Complete payments and add them to their accounts in one set-based pass.
+
+    Payments already completed (for instance by a concurrent mark_paid) or
+    cancelled are skipped. Returns (ids of the payments settled, total amount settled).
+    """
+    now = now or timezone.now()
+
+    # Lock the payments and re-check their status: a concurrent mark_paid
+    # may have completed some of them since they were matched
+    claimable = list(
+        PaymentRequest.objects.select_for_update()
+        .filter(pk__in=payment_ids, status__in=PaymentRequest.SETTLEABLE_STATUSES)
+        .order_by('pk')
+        .values_list('pk', 'tax_account_id', 'amount')
+    )
+    if not claimable:
+        return set(), Decimal('0')
+
+    PaymentRequest.objects.filter(pk__in=[pk for pk, _, _ in claimable]).update(
+        status='Completed', completed_at=now, updated_at=now
+    )
+
+    amounts = {}
+    for _, account_id, amount in claimable:
+        amounts[account_id] = amounts.get(account_id, Decimal('0')) + amount
+    deltas = TaxAccount.apply_payments(amounts, now)
+    record_payments(claimable, now)
+
+    revenue = sum(amounts.values())
+    MetricsSummary.apply(total_revenue_collected=revenue, **deltas)
+    payments_settled([pk for pk, _, _ in claimable])
+    return {pk for pk, _, _ in claimable}, revenue
+
+
+def check_encoding(fileobj, encoding):
+    """
+    Decode a seekable binary file object through once and rewind it.
+
+    Raises SettlementFileError naming the first line that is not valid text,
+    so a bad file is rejected before any batch of it has been settled.
+    """
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)()
+    except LookupError:
+        raise SettlementFileError(f'Unknown encoding: {encoding}')
+    line_number = 1
+    try:
+        while True:
+            chunk = fileobj.read(CHUNK_SIZE)
+            line_number += decoder.decode(chunk, final=not chunk).count('\n')
+            if not chunk:
+                break
+    except UnicodeDecodeError as e:
+        # Count the lines of the chunk before the offending byte
+        line_number += e.object[:e.start].count(b'\n')
+        raise SettlementFileError(f'Line {line_number} is not valid {encoding} text')
+    fileobj.seek(0)
+
+
+def reconcile_file(fileobj, file_format, batch_size=1000, dry_run=False, encoding='utf-8'):
+    """Reconcile a binary settlement file object and return its report"""
+    check_encoding(fileobj, encoding)
+    stream = io.TextIOWrapper(fileobj, encoding=encoding, newline='')
+    try:
+        return SettlementReconciler(batch_size=batch_size, dry_run=dry_run).run(stream, file_format)
+    finally:
+        stream.detach()
@@ -0,0 +1,269 @@
+"""
+Slow-query log
+
+An execute wrapper on every database connection times each statement. One
+that takes longer than SLOW_QUERY_LOG['THRESHOLD_MS'] is logged to the
+'tax_app.slow_queries' logger with the URL name of the request running it
+(or the management command), the project frames that issued it,
+its parameters with strings redacted, and the row count reported by the
+driver (-1 for SELECTs on SQLite, so left out there).
+
+Slow statements are also aggregated in the process by fingerprint: the SQL
+with literals and placeholders replaced and IN lists collapsed, so the same
+ORM call with different values is one entry. With EXPLAIN on, the plan of
+each fingerprint that enters the top EXPLAIN_TOP by total time is captured
+once. Admins read the aggregate at /api/admin/slow-queries/.
+"""
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+
+logger = logging.getLogger('tax_app.slow_queries')
+
+DEFAULTS = {
+    'ENABLED': True,
+    'THRESHOLD_MS': 200,
+    'EXPLAIN': False,
+    'EXPLAIN_TOP': 10,
+    'MAX_FINGERPRINTS': 500,
+}
+
+# Distinct views and call sites kept per fingerprint
+MAX_ATTRIBUTIONS = 10
+
+# Project frames reported per call site
+CALL_SITE_DEPTH = 3
+
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_LISTS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_SPACE = re.compile(r'\s+')
+
+_SAFE_TYPES = (bool, int, float, Decimal, date, datetime, type(None))
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Modules whose execute wrappers sit between the caller and the database
+_WRAPPER_MODULES = tuple(os.path.join(_PACKAGE_DIR, name) for name in ('slow_queries.py', 'perf.py'))
+
+
+def slow_query_setting(name):
+    return getattr(settings, 'SLOW_QUERY_LOG', {}).get(name, DEFAULTS[name])
+
+
+def normalize(sql):
+    """SQL with literals replaced by '?' and lists of values collapsed to '(...)'"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _LIST.sub('(...)', sql)
+    sql = _LISTS.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def redact(params, many=False):
+    """Parameters safe to log: numbers, dates and NULLs kept, strings and bytes masked"""
+    if params is None:
+        return None
+    if many:
+        params = list(params)
+        return [redact(row) for row in params[:3]] + ([f'... {len(params) - 3} more'] if len(params) > 3 else [])
+    if isinstance(params, dict):
+        return {key: redact([value])[0] for key, value in params.items()}
+    redacted = [
+        value if isinstance(value, _SAFE_TYPES) else f'<{type(value).__name__}:{len(value) if hasattr(value, "__len__") else "?"}>'
+        for value in list(params)[:50]
+    ]
+    return redacted + ([f'... {len(params) - 50} more'] if len(params) > 50 else [])
+
+
+def call_site(depth=CALL_SITE_DEPTH):
+    """
+    'path:line in function' of the innermost project frames that issued the
+    statement, innermost first and joined with ' < ', so a helper such as
+    a paginator is shown with the view code that called it.
+    """
+    sites = []
+    frame = sys._getframe(1)
+    while frame is not None and len(sites) < depth:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if (filename.startswith(_PACKAGE_DIR) and filename not in _WRAPPER_MODULES
+                and 'site-packages' not in filename):
+            relative = os.path.relpath(filename, os.path.dirname(_PACKAGE_DIR))
+            sites.append(f'{relative}:{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return ' < '.join(sites) or None
+
+
+# The request being handled on this thread, set by SlowQueryMiddleware
+_local = threading.local()
+
+
+def current_view():
+    request = getattr(_local, 'request', None)
+    if request is not None:
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match is not None else request.path
+    if len(sys.argv) > 1 and os.path.basename(sys.argv[0]) == 'manage.py':
+        return f'command:{sys.argv[1]}'
+    return None
+
+
+class SlowQueryLog:
+    """Slow statements of this process, aggregated by fingerprint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = timezone.now()
+        self.entries = {}
+        self.dropped = 0
+
+    def record(self, sql, seconds, view, site, params, rows):
+        """Add a slow statement; returns its entry if a plan should be captured for it"""
+        normalized = normalize(sql)
+        key = hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if len(self.entries) >= slow_query_setting('MAX_FINGERPRINTS'):
+                    self.dropped += 1
+                    return None
+                entry = self.entries[key] = {
+                    'fingerprint': key, 'sql': normalized, 'count': 0, 'total_seconds': 0.0,
+                    'max_seconds': 0.0, 'max_rows': None, 'views': {}, 'call_sites': {},
+                    'example_params': None, 'last_seen': None, 'plan': None,
+                }
+            entry['count'] += 1
+            entry['total_seconds'] += seconds
+            if seconds >= entry['max_seconds']:
+                entry['max_seconds'] = seconds
+                entry['example_params'] = params
+            if rows is not None and (entry['max_rows'] is None or rows > entry['max_rows']):
+                entry['max_rows'] = rows
+            for name, value in (('views', view), ('call_sites', site)):
+                counts = entry[name]
+                if value in counts or len(counts) < MAX_ATTRIBUTIONS:
+                    counts[value] = counts.get(value, 0) + 1
+            entry['last_seen'] = timezone.now()
+
+            if entry['plan'] is not None or not slow_query_setting('EXPLAIN'):
+                return None
+            top = sorted(self.entries.values(), key=lambda item: item['total_seconds'], reverse=True)
+            if entry in top[:slow_query_setting('EXPLAIN_TOP')]:
+                # Claimed now so concurrent statements do not EXPLAIN it too
+                entry['plan'] = []
+                return entry
+        return None
+
+    def top(self, limit=20):
+        with self._lock:
+            entries = sorted(self.entries.values(), key=lambda item: item['total_seconds'], reverse=True)
+            return [
+                dict(entry, views=dict(entry['views']), call_sites=dict(entry['call_sites']))
+                for entry in entries[:limit]
+            ]
+
+    def reset(self):
+        with self._lock:
+            self.entries = {}
+            self.dropped = 0
+            self.started = timezone.now()
+
+
+slow_log = SlowQueryLog()
+
+
+def explain(connection, sql, params):
+    """Plan lines of a statement as the database would run it"""
+    prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        return [str(row[-1] if connection.vendor == 'sqlite' else row[0]) for row in cursor.fetchall()]
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    """Database execute wrapper installed on every connection"""
+    if getattr(_local, 'explaining', False):
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    succeeded = False
+    try:
+        result = execute(sql, params, many, context)
+        succeeded = True
+        return result
+    finally:
+        seconds = time.perf_counter() - started
+        if seconds * 1000 >= slow_query_setting('THRESHOLD_MS') and slow_query_setting('ENABLED'):
+            _report(sql, params, many, context, seconds, succeeded)
+
+
+def _report(sql, params, many, context, seconds, succeeded):
+    cursor = context.get('cursor')
+    rowcount = getattr(cursor, 'rowcount', -1)
+    rows = rowcount if rowcount is not None and rowcount >= 0 else None
+    view = current_view()
+    site = call_site()
+    redacted = redact(params, many)
+
+    logger.warning(
+        'Slow query %.1f ms%s in %s at %s%s: %s params=%s',
+        seconds * 1000, '' if succeeded else ' (failed)', view or '-', site or '-',
+        f' ({rows} rows)' if rows is not None and succeeded else '',
+        sql[:2000], redacted,
+        extra={'duration_ms': round(seconds * 1000, 1), 'view': view, 'call_site': site, 'rows': rows},
+    )
+
+    entry = slow_log.record(sql, seconds, view, site, redacted, rows if succeeded else None)
+    if entry is not None:
+        entry['plan'] = _capture_plan(context['connection'], sql, params, many, succeeded)
+
+
+def _capture_plan(connection, sql, params, many, succeeded):
+    if many or not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return ['(not explainable)']
+    if not succeeded or connection.needs_rollback:
+        # The transaction may be aborted; try again on the next slow run
+        return None
+    _local.explaining = True
+    try:
+        # In a savepoint, so a failing EXPLAIN cannot abort the caller's transaction
+        with transaction.atomic(using=connection.alias):
+            return explain(connection, sql, params)
+    except Exception as exc:
+        return [f'(EXPLAIN failed: {exc})']
+    finally:
+        _local.explaining = False
+
+
+def install(sender=None, connection=None, **kwargs):
+    """connection_created receiver adding the wrapper to each new connection"""
+    if log_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(log_slow_queries)
+
+
+class SlowQueryMiddleware:
+    """Let slow queries be attributed to the request that ran them"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.request = request
+        try:
+            return self.get_response(request)
+        finally:
+            _local.request = None
@@ -0,0 +1,93 @@
+"""
+Local stand-in for the Mobile Money and Pesapal payment APIs
+
+Answers `POST <prefix>/payments` with a JSON body holding a new provider
+reference (the same one again for a repeated Idempotency-Key), after a
+configurable delay, and fails a configurable share of calls with 503 so
+gateway retries can be exercised. Connections are kept
+alive. Used by tests, benchmarks and local development; never in production.
+"""
+import asyncio
+import json
+import random
+
+
+class StubProvider:
+    """Minimal asyncio HTTP/1.1 server imitating a payment provider"""
+
+    def __init__(self, latency=0.2, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.references = {}
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self, host='127.0.0.1', port=0):
+        await self.start(host, port)
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, payload = await self.respond(method, path, body, headers.get('idempotency-key'))
+                data = json.dumps(payload).encode('utf-8')
+                writer.write(
+                    f'HTTP/1.1 {status} {"OK" if status < 400 else "Error"}\r\n'
+                    f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n'.encode('latin-1')
+                    + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, path, body, idempotency_key=None):
+        if method != 'POST' or not path.rstrip('/').endswith('/payments'):
+            return 404, {'error': 'Not found'}
+        try:
+            request = json.loads(body)
+            amount = float(request['amount'])
+        except (ValueError, KeyError, TypeError):
+            return 400, {'error': 'Invalid payment'}
+        if amount <= 0:
+            return 400, {'error': 'Invalid amount'}
+
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+
+        if self.random.random() < self.failure_rate:
+            return 503, {'error': 'Provider busy'}
+        if idempotency_key in self.references:
+            return 200, {'reference': self.references[idempotency_key], 'status': 'accepted'}
+        reference = f'STUB{self.random.randint(10 ** 9, 10 ** 10 - 1)}'
+        if idempotency_key:
+            self.references[idempotency_key] = reference
+        return 201, {'reference': reference, 'status': 'accepted'}
@@ -0,0 +1,193 @@
+"""
+Deterministic synthetic taxpayer data for benchmark databases
+
+Taxpayer number i is always generated from the same random stream (the
+stream of its batch), so a given seed and batch size produce identical data
+whether batches run inline or across worker processes.
+"""
+import datetime
+import random
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .control_numbers import ControlNumberAllocator
+from .models import User, TaxpayerProfile, TaxAccount, PaymentRequest, BalanceSnapshot
+from .search import index_users
+
+
+FIRST_NAMES = {
+    'Male': ['John', 'Joseph', 'Emmanuel', 'Baraka', 'Juma', 'Hassan', 'Daudi', 'Peter', 'Musa', 'Salim',
+             'Godfrey', 'Amani', 'Rashidi', 'Frank', 'Ibrahim', 'Elia'],
+    'Female': ['Neema', 'Mary', 'Rehema', 'Upendo', 'Zawadi', 'Asha', 'Grace', 'Halima', 'Esther', 'Mwanaidi',
+               'Anna', 'Saida', 'Rose', 'Faraja', 'Joyce', 'Amina'],
+}
+LAST_NAMES = [
+    'Mushi', 'Mwakyusa', 'Kimaro', 'Massawe', 'Mollel', 'Swai', 'Lyimo', 'Mrema', 'Mbwambo', 'Shirima',
+    'Ngowi', 'Temba', 'Minja', 'Kweka', 'Urio', 'Makundi', 'Mfinanga', 'Mwakalinga', 'Nyirenda', 'Chande',
+]
+# Ward populations fall off roughly like a Zipf distribution
+WARDS = [
+    'Kariakoo', 'Kinondoni', 'Mikocheni', 'Sinza', 'Temeke', 'Ilala', 'Upanga', 'Mbezi', 'Tabata', 'Kimara',
+    'Ubungo', 'Magomeni', 'Buguruni', 'Kigamboni', 'Msasani', 'Oysterbay', 'Mwenge', 'Gongo la Mboto',
+]
+WARD_WEIGHTS = [1 / rank for rank in range(1, len(WARDS) + 1)]
+STREETS = ['Uhuru Street', 'Morogoro Road', 'Bagamoyo Road', 'Nyerere Road', 'Mandela Road', 'Market Street',
+           'Msimbazi Street', 'Kawawa Road', 'Shekilango Road', 'Mwinyijuma Road']
+BUSINESS_SUFFIXES = ['Traders', 'Enterprises', 'General Supplies', 'Hardware', 'Pharmacy', 'Hotel', 'Motors']
+ORGANIZATION_SUFFIXES = ['Cooperative Society', 'Foundation', 'Association', 'Academy', 'Health Centre']
+PHONE_PREFIXES = ['65', '67', '68', '69', '71', '74', '75', '76', '78']
+
+TAXPAYER_TYPES = ['Business', 'Organization']
+TAXPAYER_TYPE_WEIGHTS = [0.8, 0.2]
+PAYMENT_METHODS = ['Mobile Money', 'Pesapal', 'Generate Control Number']
+PAYMENT_METHOD_WEIGHTS = [0.6, 0.2, 0.2]
+PAYMENT_STATUSES = ['Completed', 'Pending', 'Processing', 'Failed', 'Cancelled']
+PAYMENT_STATUS_WEIGHTS = [0.7, 0.1, 0.03, 0.12, 0.05]
+
+CENTS = Decimal('0.01')
+
+
+def batch_random(seed, batch_index):
+    return random.Random(f'{seed}-{batch_index}')
+
+
+def synthetic_email_prefix(seed):
+    return f'synthetic-{seed}-'
+
+
+def synthetic_email(seed, i):
+    return f'{synthetic_email_prefix(seed)}{i}@example.com'
+
+
+def national_id_prefix(seed):
+    return f'S{seed % 1000:03d}'
+
+
+def generate_taxpayer(rng, seed, i, tax_type_ids, payments_per_account, today):
+    """Field values for taxpayer number i: (user, profile, account, payments)"""
+    gender = rng.choice(['Male', 'Female'])
+    first_name = rng.choice(FIRST_NAMES[gender])
+    last_name = rng.choice(LAST_NAMES)
+    ward = rng.choices(WARDS, WARD_WEIGHTS)[0]
+    street = rng.choice(STREETS)
+    taxpayer_type = rng.choices(TAXPAYER_TYPES, TAXPAYER_TYPE_WEIGHTS)[0]
+    if taxpayer_type == 'Business':
+        business_name = f'{last_name} {rng.choice(BUSINESS_SUFFIXES)}'
+    else:
+        business_name = f'{ward} {rng.choice(ORGANIZATION_SUFFIXES)}'
+
+    profile = {
+        'first_name': first_name,
+        'middle_name': rng.choice(FIRST_NAMES[gender]) if rng.random() < 0.5 else '',
+        'last_name': last_name,
+        'gender': gender,
+        'date_of_birth': today - datetime.timedelta(days=rng.randint(18 * 365, 75 * 365)),
+        'mobile_phone': f'+255{rng.choice(PHONE_PREFIXES)}{rng.randint(0, 9999999):07d}',
+        'national_id_number': f'{national_id_prefix(seed)}{i:010d}',
+        'ward': ward,
+        'street_village': street,
+        'house_number': str(rng.randint(1, 400)),
+        'taxpayer_type': taxpayer_type,
+        'property_location': f'Plot {rng.randint(1, 9999)}, {street}',
+        'business_name': business_name,
+    }
+
+    # Assessments are log-normal around roughly 440,000 TZS
+    total_due = Decimal(int(min(rng.lognormvariate(13, 0.7), 50_000_000)) // 1000 * 1000)
+    payments = []
+    paid = Decimal('0')
+    for _ in range(rng.randint(0, 2 * payments_per_account)):
+        status = rng.choices(PAYMENT_STATUSES, PAYMENT_STATUS_WEIGHTS)[0]
+        amount = (total_due * Decimal(rng.uniform(0.02, 0.25))).quantize(CENTS)
+        if status == 'Completed':
+            amount = min(amount, total_due - paid)
+            if amount <= 0:
+                status = 'Failed'
+                amount = (total_due / 10).quantize(CENTS) or Decimal('1000.00')
+            else:
+                paid += amount
+        payments.append({
+            'amount': amount,
+            'payment_method': rng.choices(PAYMENT_METHODS, PAYMENT_METHOD_WEIGHTS)[0],
+            'status': status,
+            'completed_at_days_ago': rng.randint(1, 365) if status == 'Completed' else None,
+            'reference': rng.randint(100000, 999999),
+        })
+
+    outstanding = total_due - paid
+    due_date = today + datetime.timedelta(days=rng.randint(-120, 120)) if outstanding > 0 else None
+    account = {
+        'tax_type_id': rng.choice(tax_type_ids),
+        'total_tax_due': total_due,
+        'paid_amount': paid,
+        'outstanding_balance': outstanding,
+        'next_payment_due_date': due_date,
+        'status': 'Overdue' if due_date is not None and due_date < today else 'Active',
+    }
+    return {'email': synthetic_email(seed, i)}, profile, account, payments
+
+
+def seed_batch(task):
+    """
+    Create taxpayers [start, end) of a synthetic dataset.
+
+    `task` is a dict (so it can be sent to worker processes) with seed,
+    batch_index, start, end, password_hash, tax_type_ids and
+    payments_per_account. Returns (taxpayers, payments) created.
+    """
+    rng = batch_random(task['seed'], task['batch_index'])
+    now = timezone.now()
+    rows = [
+        generate_taxpayer(rng, task['seed'], i, task['tax_type_ids'], task['payments_per_account'], now.date())
+        for i in range(task['start'], task['end'])
+    ]
+
+    # Control numbers are reserved before the batch transaction opens: the
+    # reservation commits on its own connection, which SQLite would block
+    control_count = sum(
+        1 for _, _, _, payments in rows for payment in payments
+        if payment['payment_method'] == 'Generate Control Number'
+    )
+    allocator = ControlNumberAllocator(block_size=control_count) if control_count else None
+    for _, _, _, payments in rows:
+        for payment in payments:
+            if payment['payment_method'] == 'Generate Control Number':
+                payment['references'] = {'control_number': allocator.allocate()}
+            else:
+                payment['references'] = {'provider_reference': f"REF{payment['reference']}"}
+
+    with transaction.atomic():
+        users = User.objects.bulk_create([
+            User(email=user['email'], password=task['password_hash'], role='Taxpayer')
+            for user, _, _, _ in rows
+        ])
+        TaxpayerProfile.objects.bulk_create([
+            TaxpayerProfile(user=user, **profile)
+            for user, (_, profile, _, _) in zip(users, rows)
+        ])
+        index_users([user.pk for user in users])
+        accounts = TaxAccount.objects.bulk_create([
+            TaxAccount(user=user, **account)
+            for user, (_, _, account, _) in zip(users, rows)
+        ])
+        BalanceSnapshot.open_accounts(accounts)
+        payments = PaymentRequest.objects.bulk_create([
+            PaymentRequest(
+                user=user,
+                tax_account=account,
+                amount=payment['amount'],
+                payment_method=payment['payment_method'],
+                status=payment['status'],
+                completed_at=(
+                    now - datetime.timedelta(days=payment['completed_at_days_ago'])
+                    if payment['completed_at_days_ago'] else None
+                ),
+                **payment['references']
+            )
+            for user, account, (_, _, _, user_payments) in zip(users, accounts, rows)
+            for payment in user_payments
+        ], batch_size=5000)
+
+    return len(users), len(payments)
@@ -0,0 +1,396 @@
+"""
+Tests for the tax app
+"""
+import datetime
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import skipIf
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tax_app.control_numbers import allocator
+from tax_app.exports import _xlsx_cell, iter_csv
+from tax_app.ledger import verify_accounts
+from tax_app.models import User, TaxType, TaxAccount, PaymentRequest, BalanceSnapshot, MetricsSummary
+from tax_app.search import search_backend
+from tax_app.synthetic import seed_batch, synthetic_email
+
+
+# API endpoints whose query counts must not grow with the data: (name, path,
+# role). Paths may reference the fixture's ids via str.format placeholders.
+ENDPOINTS = [
+    ('admin_tax_accounts', '/api/tax-accounts/', 'Administrator'),
+    ('admin_tax_account_detail', '/api/tax-accounts/{account_id}/', 'Administrator'),
+    ('admin_payments', '/api/payments/', 'Administrator'),
+    ('admin_payment_detail', '/api/payments/{payment_id}/', 'Administrator'),
+    ('admin_users', '/api/admin/users/', 'Administrator'),
+    ('admin_users_search', '/api/admin/users/?search={surname}', 'Administrator'),
+    ('admin_unpaid_users', '/api/admin/unpaid-users/', 'Administrator'),
+    ('admin_metrics', '/api/admin/metrics/', 'Administrator'),
+    ('tax_types', '/api/tax-types/', 'Taxpayer'),
+    ('tax_accounts', '/api/tax-accounts/', 'Taxpayer'),
+    ('payments', '/api/payments/', 'Taxpayer'),
+    ('me', '/api/auth/me/', 'Taxpayer'),
+    ('profile', '/api/profile/', 'Taxpayer'),
+    ('dashboard_summary', '/api/dashboard/summary/', 'Taxpayer'),
+    ('dashboard_bundle', '/api/dashboard/bundle/', 'Taxpayer'),
+]
+
+
+def in_memory_sqlite():
+    name = connection.settings_dict.get('TEST', {}).get('NAME') or ''
+    return connection.vendor == 'sqlite' and str(name) in ('', ':memory:')
+
+
+def assert_metrics_consistent(test):
+    """Check the incrementally kept MetricsSummary against a full recount."""
+    summary = MetricsSummary.current()
+    for field, expected in MetricsSummary.calculate().items():
+        test.assertEqual(getattr(summary, field), expected, field)
+
+
+class SyntheticTaxpayers:
+    """
+    An administrator and a taxpayer, plus a pool of synthetic taxpayers that can be grown.
+
+    Taxpayers come from tax_app.synthetic, so tests that use this fixture
+    must be TransactionTestCases: seed_batch reserves control numbers on a
+    connection of its own, which cannot commit inside a test's transaction.
+    """
+    seed = 1
+
+    def __init__(self, payments_per_account=2):
+        self.password = make_password(None)
+        self.tax_type = TaxType.objects.create(name='Test Tax')
+        self.admin = User.objects.create(email='admin@example.com', password=self.password, role='Administrator')
+        self.payments_per_account = payments_per_account
+        self.batches = 0
+        self.seeded = 0
+        self._seed(0, 1)
+        self.taxpayer = User.objects.select_related('tax_account').get(email=synthetic_email(self.seed, 0))
+        self.account = self.taxpayer.tax_account
+        # Build the metrics summary and detect the search backend up front so
+        # those one-off queries are not measured
+        MetricsSummary.rebuild()
+        search_backend()
+
+    def _seed(self, start, end):
+        seed_batch({
+            'seed': self.seed,
+            'batch_index': self.batches,
+            'start': start,
+            'end': end,
+            'password_hash': self.password,
+            'tax_type_ids': [self.tax_type.pk],
+            'payments_per_account': self.payments_per_account,
+        })
+        self.batches += 1
+
+    def grow(self, count):
+        """Seed synthetic taxpayers until `count` exist, adding payments to the taxpayer's account too"""
+        if count <= self.seeded:
+            return
+        self._seed(self.seeded + 1, count + 1)
+        self.seeded = count
+        PaymentRequest.objects.bulk_create([
+            PaymentRequest(
+                user=self.taxpayer,
+                tax_account=self.account,
+                amount=Decimal('100.00'),
+                payment_method='Mobile Money',
+                provider_reference=f'REFTEST{self.account.pk}-{count}-{n}',
+            )
+            for n in range(self.payments_per_account)
+        ])
+
+    def client_for(self, role):
+        # A fresh user instance per client so related-object caches from an
+        # earlier request cannot hide queries from a later one
+        user = self.admin if role == 'Administrator' else self.taxpayer
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=user.pk))
+        return client
+
+    def path_kwargs(self):
+        return {
+            'account_id': self.account.pk,
+            'payment_id': PaymentRequest.objects.filter(user=self.taxpayer).values_list('pk', flat=True).first(),
+            'surname': self.taxpayer.profile.last_name,
+        }
+
+
+class PaymentCreateTests(TestCase):
+    def test_out_of_range_account_id_is_rejected(self):
+        user = User.objects.create(email='payer@example.com', role='Taxpayer')
+        client = APIClient()
+        client.force_authenticate(user)
+        for tax_account in (0, 2 ** 63, 10 ** 30):
+            response = client.post('/api/payments/', {
+                'tax_account': tax_account, 'amount': '100.00', 'payment_method': 'Mobile Money',
+            }, format='json')
+            self.assertEqual(response.status_code, 400, tax_account)
+            self.assertIn('tax_account', response.data)
+
+
+class IdempotencyTests(TransactionTestCase):
+    """
+    Payments created with an Idempotency-Key, including control numbers that need a new block.
+
+    Requests run outside any transaction of the test, as under a real
+    server, so the control number block reservation meets the request's
+    own transaction as it would in production.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(email='idempotency@example.com', role='Taxpayer')
+        self.account = TaxAccount.objects.create(user=self.user, tax_type=TaxType.objects.create(name='Test Tax'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.payment = {
+            'tax_account': self.account.pk, 'amount': '100.00', 'payment_method': 'Generate Control Number',
+        }
+
+    def post(self, path, body, key):
+        started = time.monotonic()
+        response = self.client.post(path, body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        return response, time.monotonic() - started
+
+    def test_create_is_replayed(self):
+        allocator.drop_block()
+        first, seconds = self.post('/api/payments/', self.payment, 'single')
+        self.assertEqual(first.status_code, 201)
+        self.assertLess(seconds, 2)
+
+        retry, _ = self.post('/api/payments/', self.payment, 'single')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.get('Idempotent-Replayed'), 'true')
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(PaymentRequest.objects.filter(tax_account=self.account).count(), 1)
+
+    def test_batch_is_replayed(self):
+        allocator.drop_block()
+        batch, seconds = self.post('/api/payments/batch/', {'payments': [self.payment] * 3}, 'batch')
+        self.assertEqual(batch.status_code, 201)
+        self.assertLess(seconds, 2)
+
+        retry, _ = self.post('/api/payments/batch/', {'payments': [self.payment] * 3}, 'batch')
+        self.assertEqual(retry.get('Idempotent-Replayed'), 'true')
+        self.assertEqual(PaymentRequest.objects.filter(tax_account=self.account).count(), 3)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.post('/api/payments/', self.payment, 'reused')
+        reused, _ = self.post('/api/payments/', dict(self.payment, amount='5.00'), 'reused')
+        self.assertEqual(reused.status_code, 422)
+        self.assertEqual(PaymentRequest.objects.filter(tax_account=self.account).count(), 1)
+
+
+class QueryBudgetTests(TransactionTestCase):
+    """Endpoints run the same number of queries however many rows there are, so N+1 lookups cannot creep back in"""
+    sizes = [5, 50]
+
+    def count_queries(self, client, path):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(path)
+        self.assertEqual(response.status_code, 200, path)
+        return len(context.captured_queries)
+
+    def test_query_counts_are_flat(self):
+        fixture = SyntheticTaxpayers()
+        counts = {name: [] for name, _, _ in ENDPOINTS}
+        for size in self.sizes:
+            fixture.grow(size)
+            kwargs = fixture.path_kwargs()
+            for name, path, role in ENDPOINTS:
+                counts[name].append(self.count_queries(fixture.client_for(role), path.format(**kwargs)))
+
+        for name, samples in counts.items():
+            with self.subTest(name):
+                self.assertEqual(len(set(samples)), 1, f'queries at {self.sizes} rows: {samples}')
+
+
+@skipIf(in_memory_sqlite(), 'Concurrent settlement needs a file or server database')
+@override_settings(SLOW_QUERY_LOG={'ENABLED': False})  # lock waits are the point here
+class SettlementConcurrencyTests(TransactionTestCase):
+    """Concurrent mark_paid calls against a single tax account."""
+    payments = 300
+    threads = 32
+    repeat = 2
+    amount = Decimal('10.00')
+
+    def setUp(self):
+        total_due = self.amount * self.payments * 2
+        self.user = User.objects.create(
+            email='stress@example.com', password=make_password(None), role='Taxpayer',
+        )
+        self.account = TaxAccount.objects.create(
+            user=self.user,
+            tax_type=TaxType.objects.create(name='Stress Tax'),
+            total_tax_due=total_due,
+            outstanding_balance=total_due,
+            next_payment_due_date=timezone.localdate() - datetime.timedelta(days=30),
+            status='Overdue',
+        )
+        BalanceSnapshot.open_accounts([self.account])
+        MetricsSummary.rebuild()
+        self.payment_ids = [
+            payment.pk for payment in PaymentRequest.objects.bulk_create([
+                PaymentRequest(
+                    user=self.user, tax_account=self.account, amount=self.amount, payment_method='Mobile Money',
+                )
+                for _ in range(self.payments)
+            ])
+        ]
+
+    def settle(self, payment_id):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        try:
+            return client.post(f'/api/payments/{payment_id}/mark_paid/').status_code
+        finally:
+            connection.close()
+
+    def test_concurrent_mark_paid(self):
+        calls = [pk for pk in self.payment_ids for _ in range(self.repeat)]
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            statuses = list(pool.map(self.settle, calls))
+
+        self.assertEqual([status for status in statuses if status != 200], [])
+
+        expected_paid = self.amount * self.payments
+        completed = PaymentRequest.objects.filter(pk__in=self.payment_ids, status='Completed')
+        self.assertEqual(completed.count(), self.payments)
+        self.assertEqual(completed.aggregate(total=Sum('amount'))['total'], expected_paid)
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.paid_amount, expected_paid)
+        self.assertEqual(self.account.outstanding_balance, self.account.total_tax_due - expected_paid)
+        self.assertEqual(self.account.status, 'Overdue')
+        self.assertEqual(verify_accounts(self.account.pk, self.account.pk + 1), [])
+        assert_metrics_consistent(self)
+
+
+# Small tables that are fine to scan: lookups and the metrics summary shards
+SCANNABLE_TABLES = {'tax_app_taxtype', 'tax_app_metricssummary'}
+
+# Endpoints whose sorts are bounded by their filters rather than an index
+SORTED_ENDPOINTS = {
+    'tax_accounts': 'a taxpayer has at most one account',
+    'admin_users_search': 'matches are ranked by relevance, which no index can order',
+}
+
+# Extra paths that exercise filters the budget endpoints do not use
+EXTRA_ENDPOINTS = [
+    ('admin_users_by_role', '/api/admin/users/?role=Taxpayer', 'Administrator'),
+    ('admin_overdue_accounts', '/api/admin/unpaid-users/?status=Overdue', 'Administrator'),
+    ('export_unpaid_accounts', '/api/admin/exports/unpaid-accounts/', 'Administrator'),
+    ('export_payments_by_status', '/api/admin/exports/payments/?status=Pending', 'Administrator'),
+]
+
+_SQLITE_SCAN = re.compile(r'\bSCAN (?P<table>\S+)(?P<rest>.*)$')
+_POSTGRESQL_SCAN = re.compile(r'Seq Scan on (?P<table>\S+)')
+
+
+def capture_selects(client, path):
+    """SELECT statements run by a GET of `path`, plus the next page's path"""
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(path)
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+    next_path = None
+    data = getattr(response, 'data', None)
+    if isinstance(data, dict) and data.get('next'):
+        next_path = data['next']
+
+    statements = [
+        query['sql'] for query in context.captured_queries
+        if query['sql'].lstrip().upper().startswith('SELECT')
+    ]
+    return response.status_code, statements, next_path
+
+
+def explain(sql):
+    """Query plan of `sql` as a list of lines"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+        if connection.vendor == 'postgresql':
+            # With sequential scans priced out the planner only picks one
+            # when no index can serve the query, whatever the table sizes
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute(f'EXPLAIN {sql}')
+        return [row[0] for row in cursor.fetchall()]
+
+
+def plan_problems(plan, allow_sort=False):
+    """
+    Full table scans and unindexed sorts found in a query plan.
+
+    Sorts are only reported on SQLite; PostgreSQL plans sort small inputs
+    even when an index could order them.
+    """
+    problems = []
+    for line in plan:
+        if connection.vendor == 'sqlite':
+            match = _SQLITE_SCAN.search(line)
+            if match and 'USING' not in match.group('rest') and 'VIRTUAL TABLE' not in match.group('rest'):
+                table = match.group('table')
+                if table not in SCANNABLE_TABLES and table != 'CONSTANT':
+                    problems.append(f'full scan of {table}')
+            if 'USE TEMP B-TREE FOR ORDER BY' in line and not allow_sort:
+                problems.append('unindexed sort')
+        else:
+            match = _POSTGRESQL_SCAN.search(line)
+            if match and match.group('table') not in SCANNABLE_TABLES:
+                problems.append(f"full scan of {match.group('table')}")
+    return problems
+
+
+class QueryPlanTests(TransactionTestCase):
+    """
+    EXPLAIN every query the API endpoints run on their first two pages, so a
+    hot query that loses its index and falls back to a full table scan or an
+    unindexed sort is caught before it reaches production data volumes.
+    """
+    page_size = 10
+
+    def test_queries_are_served_by_indexes(self):
+        fixture = SyntheticTaxpayers()
+        fixture.grow(30)
+        kwargs = fixture.path_kwargs()
+        for name, path, role in ENDPOINTS + EXTRA_ENDPOINTS:
+            path = path.format(**kwargs)
+            separator = '&' if '?' in path else '?'
+            page_path = f'{path}{separator}page_size={self.page_size}'
+
+            for _ in range(2):
+                status_code, statements, next_path = capture_selects(fixture.client_for(role), page_path)
+                self.assertEqual(status_code, 200, page_path)
+                for sql in statements:
+                    plan = explain(sql)
+                    with self.subTest(name, path=page_path, sql=sql):
+                        problems = plan_problems(plan, allow_sort=name in SORTED_ENDPOINTS)
+                        self.assertEqual(problems, [], '\n'.join(plan))
+                if not next_path:
+                    break
+                page_path = next_path
+
+
+class ExportCellTests(SimpleTestCase):
+    def test_csv_quotes_formula_prefixes(self):
+        content = b''.join(iter_csv(['value'], [['+255700000000'], ['=1+1'], ['Neema'], [5]]))
+        self.assertEqual(content, b"value\r\n'+255700000000\r\n'=1+1\r\nNeema\r\n5\r\n")
+
+    def test_xlsx_text_is_written_as_is(self):
+        self.assertIn('<t xml:space="preserve">+255700000000</t>', _xlsx_cell('+255700000000'))
+        self.assertIn('<t xml:space="preserve">=1+1</t>', _xlsx_cell('=1+1\x00'))
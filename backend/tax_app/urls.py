@@ -5,8 +5,10 @@ from rest_framework_simplejwt.views import TokenRefreshView
 
 from .views import (
     RegisterView, LoginView, RefreshTokenView, MeView, ProfileView,
-    DashboardSummaryView, PaymentRequestViewSet, AdminMetricsView,
-    AdminUserListView, AdminUnpaidUsersView, TaxTypeViewSet, TaxAccountViewSet
+    DashboardSummaryView, DashboardBundleView, BatchView, PaymentRequestViewSet, AdminMetricsView,
+    AdminUserListView, AdminUnpaidUsersView, AdminSettlementUploadView, UnpaidAccountsExportView,
+    ProviderCallbackView, AdminPerfView, AdminSlowQueriesView,
+    PaymentsExportView, TaxpayersExportView, TaxTypeViewSet, TaxAccountViewSet
 )
 
 router = DefaultRouter()
@@ -26,11 +28,26 @@ urlpatterns = [
     
     # Dashboard endpoints
     path('dashboard/summary/', DashboardSummaryView.as_view(), name='dashboard_summary'),
+    path('dashboard/bundle/', DashboardBundleView.as_view(), name='dashboard_bundle'),
+    
+    # Batched GET requests
+    path('batch/', BatchView.as_view(), name='batch'),
     
     # Admin endpoints
     path('admin/metrics/', AdminMetricsView.as_view(), name='admin_metrics'),
     path('admin/users/', AdminUserListView.as_view(), name='admin_users'),
     path('admin/unpaid-users/', AdminUnpaidUsersView.as_view(), name='admin_unpaid_users'),
+    path('admin/settlements/', AdminSettlementUploadView.as_view(), name='admin_settlements'),
+    path('admin/perf/', AdminPerfView.as_view(), name='admin_perf'),
+    path('admin/slow-queries/', AdminSlowQueriesView.as_view(), name='admin_slow_queries'),
+    
+    # Provider callbacks (signed by the provider, no user token)
+    path('payments/callbacks/<slug:provider>/', ProviderCallbackView.as_view(), name='provider_callback'),
+    
+    # Export endpoints
+    path('admin/exports/unpaid-accounts/', UnpaidAccountsExportView.as_view(), name='export_unpaid_accounts'),
+    path('admin/exports/payments/', PaymentsExportView.as_view(), name='export_payments'),
+    path('admin/exports/taxpayers/', TaxpayersExportView.as_view(), name='export_taxpayers'),
     
     # Include router URLs
     path('', include(router.urls)),
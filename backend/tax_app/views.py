@@ -1,35 +1,122 @@
 """
 API views for Municipal Tax System
 """
+import hmac
+import os
+import random
+
+from django.conf import settings
+from django.http import HttpResponse
 from rest_framework import generics, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.db.models import Sum, Count, Q
+from django.db import transaction
+from django.db.models import Sum, Count, Max
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 
-from .models import User, TaxpayerProfile, TaxType, TaxAccount, PaymentRequest
+from .models import User, TaxpayerProfile, TaxType, TaxAccount, PaymentRequest, MetricsSummary
 from .serializers import (
     UserSerializer, TaxpayerProfileSerializer, TaxpayerProfileCreateSerializer,
     TaxTypeSerializer, TaxAccountSerializer, PaymentRequestSerializer,
     PaymentRequestCreateSerializer, LoginSerializer, DashboardSummarySerializer,
-    AdminMetricsSerializer
+    AdminMetricsSerializer, LedgerEntrySerializer, PenaltySerializer
 )
 from .permissions import IsAdministrator, IsTaxpayer, IsOwnerOrAdministrator, CanAccessAdmin
+from .settlement import FORMATS as SETTLEMENT_FORMATS, SettlementFileError, detect_format, reconcile_file
+from .exports import FORMATS as EXPORT_FORMATS, streaming_export
+from .pagination import (
+    PaymentPagination, TaxAccountPagination, UserPagination, UnpaidAccountPagination, RankedPagination,
+    LedgerPagination
+)
+from .search import search_user_ids
+from .conditional import ConditionalRetrieveMixin, conditional_get, make_etag, validators_for
+from .batch import parse_item, run_subrequest
+from .ledger import record_adjustment, charge_penalty, reverse_payment
+from .provider_gateway import gateway
+from .jobs import enqueue
+from .idempotency import idempotent
+from .control_numbers import reserve_control_numbers
+from .perf import perf_setting, registry as perf_registry
+from .slow_queries import slow_log, slow_query_setting
+from .callbacks import SIGNATURE_HEADER as CALLBACK_SIGNATURE_HEADER, CallbackError, record_callback
 
 
-class TaxAccountViewSet(viewsets.ModelViewSet):
+class TaxAccountViewSet(ConditionalRetrieveMixin, viewsets.ModelViewSet):
     """Tax account endpoints"""
     
     serializer_class = TaxAccountSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TaxAccountPagination
     
     def get_queryset(self):
+        queryset = TaxAccount.objects.select_related('user', 'tax_type')
         if self.request.user.role == 'Administrator':
-            return TaxAccount.objects.all()
-        return TaxAccount.objects.filter(user=self.request.user)
+            return queryset.all()
+        return queryset.filter(user=self.request.user)
+    
+    def get_permissions(self):
+        # Taxpayers can read their account; only administrators change balances
+        if self.action in ('create', 'update', 'partial_update', 'destroy'):
+            return [IsAuthenticated(), IsAdministrator()]
+        return super().get_permissions()
+    
+    def get_validators(self, account):
+        # The serializer also shows the owner's email and the tax type name
+        return validators_for(account, account.user, account.tax_type)
+    
+    @transaction.atomic
+    def perform_create(self, serializer):
+        account = serializer.save()
+        record_adjustment(account.pk, account.total_tax_due, account.paid_amount, 'Opening balance')
+        MetricsSummary.record_account_change(None, account.metrics_snapshot())
+    
+    @transaction.atomic
+    def perform_update(self, serializer):
+        # Edit a locked copy, so the ledger entries match the change exactly
+        serializer.instance = TaxAccount.objects.select_for_update(of=('self',)).select_related('user', 'tax_type').get(
+            pk=serializer.instance.pk
+        )
+        before = serializer.instance.metrics_snapshot()
+        due, paid = serializer.instance.total_tax_due, serializer.instance.paid_amount
+        account = serializer.save()
+        record_adjustment(account.pk, account.total_tax_due - due, account.paid_amount - paid)
+        MetricsSummary.record_account_change(before, account.metrics_snapshot())
+    
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        before = instance.metrics_snapshot()
+        revenue = instance.payments.filter(status='Completed').aggregate(total=Sum('amount'))['total'] or 0
+        instance.delete()
+        MetricsSummary.record_account_change(before, None)
+        MetricsSummary.apply(total_revenue_collected=-revenue)
+    
+    @action(detail=True, methods=['get'], pagination_class=LedgerPagination)
+    def ledger(self, request, pk=None):
+        """Ledger entries of the account, most recent first"""
+        account = self.get_object()
+        page = self.paginate_queryset(account.ledger_entries.all())
+        return self.get_paginated_response(LedgerEntrySerializer(page, many=True).data)
+    
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, CanAccessAdmin])
+    def penalty(self, request, pk=None):
+        """Charge a penalty on the account"""
+        account = self.get_object()
+        serializer = PenaltySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        charge_penalty(account.pk, serializer.validated_data['amount'], serializer.validated_data['description'])
+        account.refresh_from_db()
+        
+        return Response({
+            'message': 'Penalty charged',
+            'account': TaxAccountSerializer(account).data
+        }, status=status.HTTP_200_OK)
 
 
 class RegisterView(generics.CreateAPIView):
@@ -38,23 +125,35 @@ class RegisterView(generics.CreateAPIView):
     serializer_class = TaxpayerProfileCreateSerializer
     permission_classes = [AllowAny]
     
+    @idempotent
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         profile = serializer.save()
         
-        # Generate tokens
         user = profile.user
-        refresh = RefreshToken.for_user(user)
-        
         return Response({
             'message': 'Registration successful',
             'user': UserSerializer(user).data,
-            'tokens': {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            }
+            'tokens': self.issue_tokens(user),
         }, status=status.HTTP_201_CREATED)
+    
+    def issue_tokens(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }
+    
+    def idempotent_stored_data(self, data):
+        # Tokens are never stored; a replay gets new ones
+        return {key: value for key, value in data.items() if key != 'tokens'}
+    
+    def idempotent_replayed_data(self, data):
+        user = User.objects.filter(pk=data['user']['id'], is_active=True).first()
+        if user is None:
+            return data
+        return {**data, 'tokens': self.issue_tokens(user)}
 
 
 class LoginView(APIView):
@@ -110,17 +209,23 @@ class MeView(APIView):
     
     def get(self, request):
         user = request.user
-        data = UserSerializer(user).data
         
         # Add profile data if taxpayer
+        profile = None
         if user.role == 'Taxpayer':
             try:
                 profile = user.profile
-                data['profile'] = TaxpayerProfileSerializer(profile).data
             except TaxpayerProfile.DoesNotExist:
                 pass
         
-        return Response(data, status=status.HTTP_200_OK)
+        def render():
+            data = UserSerializer(user).data
+            if profile is not None:
+                data['profile'] = TaxpayerProfileSerializer(profile).data
+            return Response(data, status=status.HTTP_200_OK)
+        
+        instances = [user] if profile is None else [user, profile]
+        return conditional_get(request, validators_for(*instances), render)
 
 
 class ProfileView(generics.RetrieveUpdateAPIView):
@@ -135,6 +240,17 @@ class ProfileView(generics.RetrieveUpdateAPIView):
         except TaxpayerProfile.DoesNotExist:
             return None
     
+    def retrieve(self, request, *args, **kwargs):
+        profile = self.get_object()
+        if profile is None:
+            return super().retrieve(request, *args, **kwargs)
+        
+        return conditional_get(
+            request,
+            validators_for(profile, request.user),
+            lambda: Response(self.get_serializer(profile).data)
+        )
+    
     def update(self, request, *args, **kwargs):
         profile = self.get_object()
         if not profile:
@@ -163,74 +279,234 @@ class DashboardSummaryView(APIView):
         try:
             tax_account = user.tax_account
         except TaxAccount.DoesNotExist:
-            return Response({
+            return conditional_get(request, (make_etag('no-account'), None), lambda: Response({
                 'total_tax_due': 0,
                 'paid_amount': 0,
                 'outstanding_balance': 0,
                 'next_payment_due_date': None,
                 'status': 'Active'
-            }, status=status.HTTP_200_OK)
+            }, status=status.HTTP_200_OK))
+        
+        def render():
+            data = {
+                'total_tax_due': tax_account.total_tax_due,
+                'paid_amount': tax_account.paid_amount,
+                'outstanding_balance': tax_account.outstanding_balance,
+                'next_payment_due_date': tax_account.next_payment_due_date,
+                'status': tax_account.status
+            }
+            serializer = DashboardSummarySerializer(data)
+            return Response(serializer.data, status=status.HTTP_200_OK)
         
-        data = {
-            'total_tax_due': tax_account.total_tax_due,
-            'paid_amount': tax_account.paid_amount,
-            'outstanding_balance': tax_account.outstanding_balance,
-            'next_payment_due_date': tax_account.next_payment_due_date,
-            'status': tax_account.status
-        }
+        return conditional_get(request, validators_for(tax_account), render)
+
+
+class DashboardBundleView(APIView):
+    """Everything the taxpayer dashboard shows, in one response"""
+    
+    permission_classes = [IsAuthenticated]
+    
+    # Newest payments included in the bundle
+    recent_payments = 10
+    
+    def get(self, request):
+        # Profile, account and tax type in one query, payments in another
+        user = User.objects.select_related('profile', 'tax_account__tax_type').get(pk=request.user.pk)
         
-        serializer = DashboardSummarySerializer(data)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = UserSerializer(user).data
+        profile = getattr(user, 'profile', None)
+        if user.role == 'Taxpayer' and profile is not None:
+            data['profile'] = TaxpayerProfileSerializer(profile).data
+        
+        tax_account = getattr(user, 'tax_account', None)
+        if tax_account is None:
+            summary = {
+                'total_tax_due': 0,
+                'paid_amount': 0,
+                'outstanding_balance': 0,
+                'next_payment_due_date': None,
+                'status': 'Active'
+            }
+            tax_accounts = []
+        else:
+            summary = DashboardSummarySerializer({
+                'total_tax_due': tax_account.total_tax_due,
+                'paid_amount': tax_account.paid_amount,
+                'outstanding_balance': tax_account.outstanding_balance,
+                'next_payment_due_date': tax_account.next_payment_due_date,
+                'status': tax_account.status
+            }).data
+            tax_accounts = TaxAccountSerializer([tax_account], many=True).data
+        
+        payments = PaymentRequest.objects.filter(user=user).order_by('-created_at', '-pk')[:self.recent_payments]
+        
+        return Response({
+            'user': data,
+            'summary': summary,
+            'tax_accounts': tax_accounts,
+            'recent_payments': PaymentRequestSerializer(payments, many=True).data,
+        }, status=status.HTTP_200_OK)
 
 
-class PaymentRequestViewSet(viewsets.ModelViewSet):
+class BatchView(APIView):
+    """
+    Run several GET requests in one round trip.
+    
+    The body is {"requests": [...]} where each item is an API path or
+    {"path": ..., "etag": ...}; the response lists each sub-request's status,
+    body and ETag in the same order.
+    """
+    
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        items = request.data.get('requests') if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Expected a non-empty list of requests'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.BATCH_MAX_REQUESTS:
+            return Response(
+                {'error': f'A batch may contain at most {settings.BATCH_MAX_REQUESTS} requests'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        responses = []
+        for item in items:
+            path, etag = parse_item(item)
+            if path is None:
+                responses.append({'path': None, 'status': 400, 'body': {'error': 'Invalid request item'}})
+            else:
+                responses.append(run_subrequest(request, path, etag, excluded_views={'batch'}))
+        
+        return Response({'responses': responses}, status=status.HTTP_200_OK)
+
+
+class PaymentRequestViewSet(ConditionalRetrieveMixin, viewsets.ModelViewSet):
     """Payment request endpoints"""
     
     serializer_class = PaymentRequestSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PaymentPagination
     
     def get_queryset(self):
         if self.request.user.role == 'Administrator':
             return PaymentRequest.objects.all().order_by('-created_at')
         return PaymentRequest.objects.filter(user=self.request.user).order_by('-created_at')
     
+    def build_payment(self, validated_data):
+        """Unsaved payment with its control number or provider reference already set"""
+        payment = PaymentRequest(
+            user=self.request.user,
+            tax_account_id=validated_data['tax_account'],
+            amount=validated_data['amount'],
+            payment_method=validated_data['payment_method']
+        )
+        
+        # Generate control number if selected
+        if validated_data['payment_method'] == 'Generate Control Number':
+            payment.generate_control_number()
+        elif not gateway.handles(payment.payment_method):
+            # Simulate provider reference
+            payment.provider_reference = f"REF{random.randint(100000, 999999)}"
+        # Otherwise the provider gateway fills in the reference after the INSERT
+        
+        return payment
+    
+    def before_idempotent_transaction(self, request):
+        """
+        Reserve the control numbers the request may need before its
+        transaction opens: on SQLite the block reservation commits on a second
+        connection, which that transaction would block.
+        """
+        data = request.data
+        items = data.get('payments', [data]) if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return
+        count = sum(
+            1 for item in items[:getattr(settings, 'PAYMENT_BATCH_MAX_SIZE', 100)]
+            if isinstance(item, dict) and item.get('payment_method') == 'Generate Control Number'
+        )
+        if count:
+            reserve_control_numbers(count)
+    
+    @idempotent
     def create(self, request, *args, **kwargs):
         serializer = PaymentRequestCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        # Get tax account
+        # Check the tax account belongs to the user
         tax_account_id = serializer.validated_data['tax_account']
-        try:
-            tax_account = TaxAccount.objects.get(id=tax_account_id, user=request.user)
-        except TaxAccount.DoesNotExist:
+        if not TaxAccount.objects.filter(id=tax_account_id, user=request.user).exists():
             return Response({'error': 'Tax account not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        # Create payment request
-        payment = PaymentRequest.objects.create(
-            user=request.user,
-            tax_account=tax_account,
-            amount=serializer.validated_data['amount'],
-            payment_method=serializer.validated_data['payment_method']
-        )
-        
-        # Generate control number if selected
-        if serializer.validated_data['payment_method'] == 'Generate Control Number':
-            control_number = payment.generate_control_number()
-            return Response({
-                'message': 'Payment request created',
-                'payment': PaymentRequestSerializer(payment).data,
-                'control_number': control_number
-            }, status=status.HTTP_201_CREATED)
-        
-        # Simulate provider reference
-        import random
-        payment.provider_reference = f"REF{random.randint(100000, 999999)}"
+        # Everything is assigned before the INSERT, so this is the only write
+        payment = self.build_payment(serializer.validated_data)
         payment.save()
+        gateway.initiate_after_commit([payment])
         
-        return Response({
+        data = {
             'message': 'Payment request created',
             'payment': PaymentRequestSerializer(payment).data
-        }, status=status.HTTP_201_CREATED)
+        }
+        if payment.control_number:
+            data['control_number'] = payment.control_number
+        
+        return Response(data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    @idempotent
+    def batch(self, request):
+        """Create several payment requests with a single bulk insert"""
+        items = request.data.get('payments') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'A non-empty list of payments is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        max_size = getattr(settings, 'PAYMENT_BATCH_MAX_SIZE', 100)
+        if len(items) > max_size:
+            return Response(
+                {'error': f'At most {max_size} payments can be submitted at once'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            serializer = PaymentRequestCreateSerializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {'index': index, 'status': 'error', 'errors': serializer.errors}
+        
+        # One query for every account referenced by the batch
+        own_accounts = set(TaxAccount.objects.filter(
+            user=request.user,
+            id__in={data['tax_account'] for _, data in valid}
+        ).values_list('id', flat=True))
+        
+        to_create = []
+        for index, data in valid:
+            if data['tax_account'] not in own_accounts:
+                results[index] = {'index': index, 'status': 'error', 'errors': {'tax_account': ['Tax account not found']}}
+            else:
+                to_create.append((index, self.build_payment(data)))
+        
+        PaymentRequest.objects.bulk_create([payment for _, payment in to_create])
+        gateway.initiate_after_commit([payment for _, payment in to_create])
+        
+        for index, payment in to_create:
+            results[index] = {
+                'index': index,
+                'status': 'created',
+                'payment': PaymentRequestSerializer(payment).data,
+            }
+            if payment.control_number:
+                results[index]['control_number'] = payment.control_number
+        
+        return Response({
+            'message': f'{len(to_create)} of {len(items)} payment requests created',
+            'created': len(to_create),
+            'failed': len(items) - len(to_create),
+            'results': results
+        }, status=status.HTTP_201_CREATED if to_create else status.HTTP_400_BAD_REQUEST)
     
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def mark_paid(self, request, pk=None):
@@ -238,13 +514,46 @@ class PaymentRequestViewSet(viewsets.ModelViewSet):
         payment = self.get_object()
         
         # Only admin or owner can mark as paid
-        if payment.user != request.user and request.user.role != 'Administrator':
+        if payment.user_id != request.user.id and request.user.role != 'Administrator':
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
-        payment.mark_as_paid()
+        if payment.status not in PaymentRequest.SETTLEABLE_STATUSES and payment.status != 'Completed':
+            return Response(
+                {'error': f'{payment.status} payments cannot be marked as paid'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if getattr(settings, 'DEFER_PAYMENT_SETTLEMENT', False) and payment.status != 'Completed':
+            job = enqueue('settle_payment', {'payment_id': payment.pk})
+            return Response({
+                'message': 'Payment settlement queued',
+                'job_id': job.pk,
+                'payment': PaymentRequestSerializer(payment).data
+            }, status=status.HTTP_202_ACCEPTED)
+        
+        settled = payment.mark_as_paid()
+        if not settled and payment.status != 'Completed':
+            # Cancelled or reversed while this request was running
+            return Response(
+                {'error': f'{payment.status} payments cannot be marked as paid'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         return Response({
-            'message': 'Payment marked as paid',
+            'message': 'Payment marked as paid' if settled else 'Payment already marked as paid',
+            'payment': PaymentRequestSerializer(payment).data
+        }, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, CanAccessAdmin])
+    def reverse(self, request, pk=None):
+        """Reverse a completed payment"""
+        payment = self.get_object()
+        
+        if not reverse_payment(payment, str(request.data.get('reason', ''))[:200]):
+            return Response({'error': 'Only completed payments can be reversed'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'message': 'Payment reversed',
             'payment': PaymentRequestSerializer(payment).data
         }, status=status.HTTP_200_OK)
 
@@ -255,52 +564,90 @@ class AdminMetricsView(APIView):
     permission_classes = [IsAuthenticated, CanAccessAdmin]
     
     def get(self, request):
-        # Total taxpayers
-        total_taxpayers = User.objects.filter(role='Taxpayer').count()
-        
-        # Total properties/businesses
-        total_properties = TaxpayerProfile.objects.filter(
-            taxpayer_type__in=['Business', 'Organization']
-        ).count()
-        
-        # Total tax assessed
-        total_tax_assessed = TaxAccount.objects.aggregate(
-            total=Sum('total_tax_due')
-        )['total'] or 0
-        
-        # Total revenue collected
-        total_revenue = PaymentRequest.objects.filter(
-            status='Completed'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        # Outstanding tax
-        outstanding = TaxAccount.objects.aggregate(
-            total=Sum('outstanding_balance')
-        )['total'] or 0
-        
-        # Overdue accounts
-        overdue_accounts = TaxAccount.objects.filter(
-            Q(status='Overdue') | Q(outstanding_balance__gt=0)
-        ).count()
-        
-        data = {
-            'total_registered_taxpayers': total_taxpayers,
-            'total_properties_businesses': total_properties,
-            'total_tax_assessed': total_tax_assessed,
-            'total_revenue_collected': total_revenue,
-            'outstanding_tax_amount': outstanding,
-            'overdue_accounts': overdue_accounts
-        }
+        # Totals are maintained incrementally by MetricsSummary
+        data = MetricsSummary.current()
         
         serializer = AdminMetricsSerializer(data)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class AdminPerfView(APIView):
+    """
+    Per-endpoint performance histograms of this server process (admin only).
+    
+    DELETE clears them.
+    """
+    
+    permission_classes = [IsAuthenticated, CanAccessAdmin]
+    
+    def get(self, request):
+        return Response({
+            'pid': os.getpid(),
+            'since': perf_registry.started,
+            'sample_rate': perf_setting('SAMPLE_RATE') if perf_setting('ENABLED') else 0,
+            'endpoints': perf_registry.summary(),
+        }, status=status.HTTP_200_OK)
+    
+    def delete(self, request):
+        perf_registry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AdminSlowQueriesView(APIView):
+    """
+    Slowest statements of this server process by total time, with the views
+    and call sites that ran them (admin only). DELETE clears them.
+    
+    Supports ?limit=N (default 20, at most 500).
+    """
+    
+    permission_classes = [IsAuthenticated, CanAccessAdmin]
+    
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 500)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'pid': os.getpid(),
+            'since': slow_log.started,
+            'threshold_ms': slow_query_setting('THRESHOLD_MS'),
+            'dropped': slow_log.dropped,
+            'queries': slow_log.top(limit),
+        }, status=status.HTTP_200_OK)
+    
+    def delete(self, request):
+        slow_log.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class PrometheusMetricsView(APIView):
+    """
+    Performance histograms in the Prometheus text format.
+    
+    Scrapers authenticate with "Authorization: Bearer <PERF_METRICS['METRICS_TOKEN']>";
+    without a token configured the endpoint is only served with DEBUG on.
+    """
+    
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    
+    def get(self, request):
+        token = perf_setting('METRICS_TOKEN')
+        if not token and not settings.DEBUG:
+            return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+        return HttpResponse(perf_registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 class AdminUserListView(generics.ListAPIView):
     """List all users (admin only)"""
     
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated, CanAccessAdmin]
+    pagination_class = UserPagination
     queryset = User.objects.all().order_by('-date_joined')
     
     def get_queryset(self):
@@ -311,16 +658,24 @@ class AdminUserListView(generics.ListAPIView):
         if role:
             queryset = queryset.filter(role=role)
         
-        # Search by email or name
-        search = self.request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(email__icontains=search) |
-                Q(profile__first_name__icontains=search) |
-                Q(profile__last_name__icontains=search)
-            )
-        
         return queryset
+    
+    def list(self, request, *args, **kwargs):
+        # Searches run against the taxpayer search index and are ranked by
+        # relevance rather than paginated by join date
+        search = request.query_params.get('search')
+        if not search:
+            return super().list(request, *args, **kwargs)
+        
+        role = request.query_params.get('role')
+        paginator = RankedPagination()
+        page = paginator.paginate_ranked(
+            lambda offset, limit: search_user_ids(search, role=role, offset=offset, limit=limit),
+            User.objects.all(),
+            request
+        )
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class AdminUnpaidUsersView(generics.ListAPIView):
@@ -328,16 +683,207 @@ class AdminUnpaidUsersView(generics.ListAPIView):
     
     serializer_class = TaxAccountSerializer
     permission_classes = [IsAuthenticated, CanAccessAdmin]
+    pagination_class = UnpaidAccountPagination
+    
+    def get_queryset(self):
+        queryset = TaxAccount.objects.select_related('user', 'tax_type').filter(outstanding_balance__gt=0)
+        
+        # Filter by status, e.g. ?status=Overdue for accounts past their due date
+        account_status = self.request.query_params.get('status')
+        if account_status:
+            queryset = queryset.filter(status=account_status)
+        
+        return queryset.order_by('-outstanding_balance')
+
+
+class AdminSettlementUploadView(APIView):
+    """Upload a provider settlement file and settle the payments it lists (admin only)"""
+    
+    permission_classes = [IsAuthenticated, CanAccessAdmin]
+    parser_classes = [MultiPartParser]
+    
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': 'A settlement file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        file_format = request.data.get('format') or detect_format(upload.name)
+        if file_format not in SETTLEMENT_FORMATS:
+            return Response({'error': f'Unsupported format: {file_format}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        try:
+            report = reconcile_file(upload.file, file_format, dry_run=dry_run)
+        except SettlementFileError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'message': 'Settlement file checked' if dry_run else 'Settlement file reconciled',
+            'dry_run': dry_run,
+            'report': report.as_dict()
+        }, status=status.HTTP_200_OK)
+
+
+class ProviderCallbackView(APIView):
+    """
+    Payment confirmations posted by a provider.
+    
+    Authenticated by the request signature, not a user token; the callback is
+    stored and settled later by the settle_callbacks command.
+    """
+    
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    
+    def post(self, request, provider):
+        try:
+            record_callback(provider, request.body, request.META.get(CALLBACK_SIGNATURE_HEADER))
+        except CallbackError as exc:
+            return Response({'error': str(exc)}, status=exc.status)
+        return Response({'status': 'received'}, status=status.HTTP_200_OK)
+
+
+class AdminExportView(APIView):
+    """
+    Base for streaming admin exports.
+    
+    Supports ?file_format=csv|xlsx plus ward, tax_type (id or name) and
+    date_from/date_to filters on `date_field`.
+    """
+    
+    permission_classes = [IsAuthenticated, CanAccessAdmin]
+    columns = []
+    filename = 'export'
+    date_field = 'created_at'
+    ward_field = 'user__profile__ward'
+    tax_type_field = 'user__tax_account__tax_type'
     
     def get_queryset(self):
-        return TaxAccount.objects.filter(
-            Q(outstanding_balance__gt=0) | Q(status='Overdue')
-        ).order_by('-outstanding_balance')
+        raise NotImplementedError
+    
+    def filter_queryset(self, queryset):
+        params = self.request.query_params
+        
+        ward = params.get('ward')
+        if ward:
+            queryset = queryset.filter(**{self.ward_field: ward})
+        
+        tax_type = params.get('tax_type')
+        if tax_type:
+            lookup = self.tax_type_field if tax_type.isdigit() else f'{self.tax_type_field}__name'
+            queryset = queryset.filter(**{lookup: tax_type})
+        
+        for param, lookup in (('date_from', 'gte'), ('date_to', 'lte')):
+            value = params.get(param)
+            if value:
+                date = parse_date(value)
+                if date is None:
+                    raise ValidationError({param: 'Use the YYYY-MM-DD format.'})
+                queryset = queryset.filter(**{f'{self.date_field}__date__{lookup}': date})
+        
+        return queryset
+    
+    def get(self, request):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            raise ValidationError({'file_format': f'Choose one of: {", ".join(EXPORT_FORMATS)}.'})
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        filename = f'{self.filename}-{timezone.now():%Y%m%d}'
+        return streaming_export(queryset, self.columns, filename, file_format)
+
+
+class UnpaidAccountsExportView(AdminExportView):
+    """Export unpaid accounts for printing"""
+    
+    filename = 'unpaid-accounts'
+    tax_type_field = 'tax_type'
+    columns = [
+        ('Email', 'user__email'),
+        ('First Name', 'user__profile__first_name'),
+        ('Last Name', 'user__profile__last_name'),
+        ('Business Name', 'user__profile__business_name'),
+        ('Mobile Phone', 'user__profile__mobile_phone'),
+        ('Ward', 'user__profile__ward'),
+        ('Tax Type', 'tax_type__name'),
+        ('Total Due', 'total_tax_due'),
+        ('Paid', 'paid_amount'),
+        ('Outstanding', 'outstanding_balance'),
+        ('Next Payment Due', 'next_payment_due_date'),
+        ('Status', 'status'),
+    ]
+    
+    def get_queryset(self):
+        return TaxAccount.objects.filter(outstanding_balance__gt=0).order_by('-outstanding_balance', '-id')
+
 
+class PaymentsExportView(AdminExportView):
+    """Export payment history"""
+    
+    filename = 'payments'
+    tax_type_field = 'tax_account__tax_type'
+    columns = [
+        ('Payment ID', 'id'),
+        ('Email', 'user__email'),
+        ('Ward', 'user__profile__ward'),
+        ('Tax Type', 'tax_account__tax_type__name'),
+        ('Amount', 'amount'),
+        ('Method', 'payment_method'),
+        ('Status', 'status'),
+        ('Control Number', 'control_number'),
+        ('Provider Reference', 'provider_reference'),
+        ('Created', 'created_at'),
+        ('Completed', 'completed_at'),
+    ]
+    
+    def get_queryset(self):
+        queryset = PaymentRequest.objects.order_by('-created_at', '-id')
+        payment_status = self.request.query_params.get('status')
+        if payment_status:
+            queryset = queryset.filter(status=payment_status)
+        return queryset
+
+
+class TaxpayersExportView(AdminExportView):
+    """Export the taxpayer register"""
+    
+    filename = 'taxpayers'
+    date_field = 'registration_date'
+    ward_field = 'ward'
+    columns = [
+        ('Email', 'user__email'),
+        ('First Name', 'first_name'),
+        ('Middle Name', 'middle_name'),
+        ('Last Name', 'last_name'),
+        ('Gender', 'gender'),
+        ('Mobile Phone', 'mobile_phone'),
+        ('National ID', 'national_id_number'),
+        ('Ward', 'ward'),
+        ('Street/Village', 'street_village'),
+        ('House Number', 'house_number'),
+        ('Taxpayer Type', 'taxpayer_type'),
+        ('Business Name', 'business_name'),
+        ('Property Location', 'property_location'),
+        ('Registered', 'registration_date'),
+    ]
+    
+    def get_queryset(self):
+        return TaxpayerProfile.objects.order_by('-registration_date', '-id')
 
-class TaxTypeViewSet(viewsets.ModelViewSet):
+
+class TaxTypeViewSet(ConditionalRetrieveMixin, viewsets.ModelViewSet):
     """Tax type CRUD - Read access for all authenticated users, write only for admin"""
     
     serializer_class = TaxTypeSerializer
     permission_classes = [IsAuthenticated]
     queryset = TaxType.objects.all()
+    
+    def list(self, request, *args, **kwargs):
+        # The newest updated_at and the row count change whenever a tax type
+        # is added, edited or deleted
+        versions = self.filter_queryset(self.get_queryset()).aggregate(latest=Max('updated_at'), count=Count('id'))
+        return conditional_get(
+            request,
+            (make_etag('TaxType', versions['count'], versions['latest']), versions['latest']),
+            lambda: super(TaxTypeViewSet, self).list(request, *args, **kwargs)
+        )
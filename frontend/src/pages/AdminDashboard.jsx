@@ -5,6 +5,8 @@ const AdminDashboard = () => {
   const [metrics, setMetrics] = useState(null)
   const [users, setUsers] = useState([])
   const [unpaidUsers, setUnpaidUsers] = useState([])
+  const [usersNext, setUsersNext] = useState(null)
+  const [unpaidNext, setUnpaidNext] = useState(null)
   const [loading, setLoading] = useState(true)
   const [activeTab, setActiveTab] = useState('overview')
   const [searchTerm, setSearchTerm] = useState('')
@@ -23,7 +25,9 @@ const AdminDashboard = () => {
       
       setMetrics(metricsRes.data)
       setUsers(usersRes.data.results || usersRes.data)
+      setUsersNext(usersRes.data.next || null)
       setUnpaidUsers(unpaidRes.data.results || unpaidRes.data)
+      setUnpaidNext(unpaidRes.data.next || null)
     } catch (error) {
       console.error('Error fetching admin data:', error)
     } finally {
@@ -34,13 +38,34 @@ const AdminDashboard = () => {
   const handleSearch = async (e) => {
     e.preventDefault()
     try {
-      const response = await api.get(`/admin/users/?search=${searchTerm}`)
+      const response = await api.get('/admin/users/', { params: { search: searchTerm } })
       setUsers(response.data.results || response.data)
+      setUsersNext(response.data.next || null)
     } catch (error) {
       console.error('Error searching users:', error)
     }
   }
 
+  const loadMoreUsers = async () => {
+    try {
+      const response = await api.get(usersNext)
+      setUsers(prev => [...prev, ...response.data.results])
+      setUsersNext(response.data.next)
+    } catch (error) {
+      console.error('Error loading more users:', error)
+    }
+  }
+
+  const loadMoreUnpaid = async () => {
+    try {
+      const response = await api.get(unpaidNext)
+      setUnpaidUsers(prev => [...prev, ...response.data.results])
+      setUnpaidNext(response.data.next)
+    } catch (error) {
+      console.error('Error loading more unpaid accounts:', error)
+    }
+  }
+
   const handlePrint = () => {
     window.print()
   }
@@ -191,6 +216,11 @@ const AdminDashboard = () => {
                 </tbody>
               </table>
             </div>
+            {usersNext && (
+              <div className="text-center">
+                <button className="btn btn-outline-primary" onClick={loadMoreUsers}>Load more</button>
+              </div>
+            )}
           </div>
         </div>
       )}
@@ -243,13 +273,18 @@ const AdminDashboard = () => {
                 </tbody>
               </table>
             </div>
+            {unpaidNext && (
+              <div className="text-center no-print">
+                <button className="btn btn-outline-primary" onClick={loadMoreUnpaid}>Load more</button>
+              </div>
+            )}
             
             {/* Summary Footer */}
-            {unpaidUsers.length > 0 && (
+            {unpaidUsers.length > 0 && metrics && (
               <div className="mt-4 p-3 bg-light rounded">
                 <h5>Summary</h5>
-                <p className="mb-1">Total Unpaid Accounts: {unpaidUsers.length}</p>
-                <p className="mb-0">Total Outstanding: TZS {unpaidUsers.reduce((sum, acc) => sum + parseFloat(acc.outstanding_balance || 0), 0).toLocaleString()}</p>
+                <p className="mb-1">Total Unpaid Accounts: {metrics.unpaid_accounts}</p>
+                <p className="mb-0">Total Outstanding: TZS {parseFloat(metrics.unpaid_amount).toLocaleString()}</p>
               </div>
             )}
           </div>
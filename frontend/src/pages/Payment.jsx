@@ -4,6 +4,7 @@ import api from '../api/axios'
 const Payment = () => {
   const [taxAccounts, setTaxAccounts] = useState([])
   const [payments, setPayments] = useState([])
+  const [paymentsNext, setPaymentsNext] = useState(null)
   const [loading, setLoading] = useState(true)
   const [showPaymentForm, setShowPaymentForm] = useState(false)
   const [paymentData, setPaymentData] = useState({
@@ -27,6 +28,7 @@ const Payment = () => {
       
       setTaxAccounts(accountsRes.data.results || accountsRes.data)
       setPayments(paymentsRes.data.results || paymentsRes.data)
+      setPaymentsNext(paymentsRes.data.next || null)
     } catch (error) {
       console.error('Error fetching payment data:', error)
     } finally {
@@ -34,6 +36,16 @@ const Payment = () => {
     }
   }
 
+  const loadMorePayments = async () => {
+    try {
+      const response = await api.get(paymentsNext)
+      setPayments(prev => [...prev, ...response.data.results])
+      setPaymentsNext(response.data.next)
+    } catch (error) {
+      console.error('Error loading more payments:', error)
+    }
+  }
+
   const handlePaymentSubmit = async (e) => {
     e.preventDefault()
     setPaymentError('')
@@ -225,6 +237,11 @@ const Payment = () => {
                 </tbody>
               </table>
             </div>
+            {paymentsNext && (
+              <div className="text-center">
+                <button className="btn btn-outline-primary" onClick={loadMorePayments}>Load more</button>
+              </div>
+            )}
           </div>
         </div>
       </div>